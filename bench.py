@@ -0,0 +1,966 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import signal
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from functools import partial
+from typing import Awaitable, Callable, Dict, List
+
+from aiogram.client.session.base import BaseSession
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
+from aiogram.methods import SendMessage
+
+from callbacks import pack, unpack
+
+# the prefix filters set.py used before the dispatch table, in registration order
+LEGACY_FILTERS = [
+    lambda d: d.startswith('edit_'),
+    lambda d: d == "back_to_reminders",
+    lambda d: d.startswith('calendar_day_'),
+    lambda d: d.startswith('time_'),
+    lambda d: d == 'back_to_hours',
+    lambda d: d.startswith('full_time_'),
+    lambda d: d.startswith('type_'),
+    lambda d: d.startswith('select_del_'),
+    lambda d: d == "select_all_del",
+    lambda d: d == "deselect_all_del",
+    lambda d: d == "confirm_delete",
+    lambda d: d.startswith(('delete_', 'edit_')),
+    lambda d: d == 'ignore',
+    lambda d: d.startswith('show_months_'),
+    lambda d: d.startswith(('prev_year_', 'next_year_')),
+    lambda d: d.startswith('select_month_'),
+    lambda d: d.startswith(('prev_', 'next_')),
+    lambda d: d == "back_to_calendar",
+    lambda d: d == 'ignore',
+]
+
+LEGACY_DATA = [
+    'calendar_day_2026_10_18', 'time_09_00', 'full_time_09_30', 'type_birthday', 'next_2026_11',
+    'select_del_1760000000.123456', 'confirm_delete', 'back_to_calendar', 'ignore', 'delete_1760000000.123456',
+]
+
+TABLE_DATA = [
+    pack('day', 2026, 10, 18), pack('hour', '09'), pack('minute', '09', '30'), pack('type', 'birthday'),
+    pack('calendar', 2026, 11), pack('select_del', '1760000000.123456'), pack('confirm_delete'),
+    pack('back_to_calendar'), pack('ignore'), pack('delete', '1760000000.123456'),
+]
+
+
+def per_call(func: Callable[[], None], iterations: int) -> float:
+    started = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - started) / iterations
+
+
+def bench_callbacks(iterations: int) -> Dict[str, float]:
+    from set import callback
+
+    handlers = callback.handlers
+
+    def legacy():
+        for data in LEGACY_DATA:
+            for check in LEGACY_FILTERS:
+                if check(data):
+                    break
+
+    def table():
+        for data in TABLE_DATA:
+            action, args = unpack(data)
+            handlers.get(action)
+
+    return {
+        'legacy_ns_per_callback': per_call(legacy, iterations) / len(LEGACY_DATA) * 1e9,
+        'table_ns_per_callback': per_call(table, iterations) / len(TABLE_DATA) * 1e9,
+    }
+
+
+def bench_keyboards(iterations: int) -> Dict[str, float]:
+    from keyboard import create_calendar_keyboard, create_minutes_keyboard, create_time_keyboard
+
+    def build(cached: bool):
+        calendar = create_calendar_keyboard if cached else create_calendar_keyboard.__wrapped__
+        minutes = create_minutes_keyboard if cached else create_minutes_keyboard.__wrapped__
+        hours = create_time_keyboard if cached else create_time_keyboard.__wrapped__
+
+        def run():
+            calendar(2026, 10)
+            minutes('09')
+            hours()
+        return run
+
+    iterations = max(iterations // 100, 1)
+    return {
+        'uncached_us_per_callback': per_call(build(False), iterations) / 3 * 1e6,
+        'cached_us_per_callback': per_call(build(True), iterations) / 3 * 1e6,
+    }
+
+
+def traced_bytes(build: Callable[[], object]) -> int:
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        kept = build()
+        used = tracemalloc.get_traced_memory()[0] - before
+    finally:
+        tracemalloc.stop()
+    del kept
+    return used
+
+
+def bench_memory(iterations: int) -> Dict[str, float]:
+    from reminder import Reminder, ReminderType
+    from storage import MemoryStorage
+
+    count = iterations
+    users = max(count // 10, 1)
+    kinds = list(ReminderType)
+    base = int(time.time()) + 86400
+
+    def legacy():
+        # the Dict[str, list[dict]] layout reminders.json was loaded into
+        state = {}
+        for i in range(count):
+            state.setdefault(str(i % users), []).append({
+                'time': time.strftime("%d.%m.%Y %H:%M", time.localtime(base + i * 60)),
+                'text': f"reminder {i}",
+                'type': kinds[i % len(kinds)].value,
+                'id': str(base + i / 1000000)
+            })
+        return state
+
+    def current():
+        storage = MemoryStorage()
+
+        async def fill():
+            for i in range(count):
+                await storage.add(i % users, Reminder(base * 1000000 + i, base + i * 60, f"reminder {i}", kinds[i % len(kinds)]))
+        asyncio.run(fill())
+        return storage
+
+    return {
+        'reminders': count,
+        'legacy_bytes_per_reminder': traced_bytes(legacy) / count,
+        'slotted_bytes_per_reminder': traced_bytes(current) / count,
+    }
+
+
+def bench_recurrence(iterations: int) -> Dict[str, float]:
+    from recurrence import next_occurrence, parse_rule
+
+    # a month boundary: yearly and monthly reminders spread over the 1st, re-armed as they fire
+    base = time.mktime((2030, 1, 1, 0, 0, 0, 0, 0, -1))
+    rules = [f"{i % 60} {i // 60 % 24} 1 * *" if i % 2 else f"{i % 60} {i // 60 % 24} 1 1 *" for i in range(iterations)]
+    dues = [base + i * 86400 // iterations for i in range(iterations)]
+    # rules are parsed up front so both passes time the same next_occurrence call
+    recurrences = [parse_rule(rule) for rule in rules]
+
+    def rearm(cache: bool) -> float:
+        for recurrence in recurrences:
+            recurrence._next_date.clear()
+        started = time.perf_counter()
+        for rule, due, recurrence in zip(rules, dues, recurrences):
+            if not cache:
+                recurrence._next_date.clear()
+            next_occurrence(rule, due)
+        return (time.perf_counter() - started) / iterations
+
+    uncached = rearm(cache=False)
+    cached = rearm(cache=True)
+
+    return {
+        'reminders': iterations,
+        'uncached_us_per_rearm': uncached * 1e6,
+        'cached_us_per_rearm': cached * 1e6,
+    }
+
+
+def legacy_confirmation(moment: datetime, rem_type: str, text: str) -> str:
+    # how schedule_reminder built the message before render.py
+    from keyboard import REMINDER_EMOJI, REMINDER_TYPES
+
+    type_name = next((name for name, callback in REMINDER_TYPES if callback == rem_type), 'Обычное')
+    formatted_date = moment.strftime("%d %B %Y")
+    month_translations = {
+        'January': 'января', 'February': 'февраля', 'March': 'марта',
+        'April': 'апреля', 'May': 'мая', 'June': 'июня',
+        'July': 'июля', 'August': 'августа', 'September': 'сентября',
+        'October': 'октября', 'November': 'ноября', 'December': 'декабря'
+    }
+    for eng, rus in month_translations.items():
+        formatted_date = formatted_date.replace(eng, rus)
+    return (
+        f"✅ Напоминание создано\n\n"
+        f"📅 <b>Дата:</b> {formatted_date}\n"
+        f"⏰ <b>Время:</b> {moment.strftime('%H:%M')}\n"
+        f"{REMINDER_EMOJI[rem_type]} <b>Тип:</b> {type_name}\n"
+        f"📝 <b>Текст:</b> {text}\n"
+        f"\n<i>Я напомню вам об этом {formatted_date} в {moment.strftime('%H:%M')}</i>"
+    )
+
+
+def bench_render(iterations: int) -> Dict[str, float]:
+    from reminder import Reminder, ReminderType
+    from render import get_locale, render_confirmation, render_fired, render_list
+    from timezones import get_zone
+
+    locale = get_locale()
+    zone = get_zone()
+    moment = datetime(2030, 1, 24, 9, 30)
+    page = [Reminder(i, 1900000000 + i * 3600, f"reminder {i}", ReminderType('task')) for i in range(10)]
+
+    return {
+        'legacy_confirmation_us': per_call(lambda: legacy_confirmation(moment, 'task', "text"), iterations) * 1e6,
+        'confirmation_us': per_call(lambda: render_confirmation(locale, moment, 'task', "text"), iterations) * 1e6,
+        'list_page_us': per_call(lambda: render_list(locale, page, zone, 10, 200), iterations // 10) * 1e6,
+        'fired_us': per_call(lambda: render_fired(locale, page[0], zone), iterations) * 1e6,
+    }
+
+
+async def run_pages(sizes: List[int], views: int) -> Dict[str, float]:
+    from aiogram.types import User
+    import set as handlers
+    from reminder import Reminder
+    from storage import MemoryStorage
+    from timezones import get_zone
+
+    handlers.storage = MemoryStorage()
+    zone = get_zone()
+    results = {}
+    for user_id, size in enumerate(sizes, 1):
+        user = User(id=user_id, is_bot=False, first_name='bench', language_code='ru')
+        for i in range(size):
+            await handlers.storage.add(user_id, Reminder(i, 1900000000 + i * 60, f"reminder {i}"))
+        # a page from the middle of the list, reached through its cursor
+        cursor = (1900000000 + size // 2 * 60, size // 2)
+
+        started = time.perf_counter()
+        for _ in range(views):
+            await handlers.render_list_page(user, await handlers.storage.list_user(user_id), zone)
+        results[f'full_list_us_{size}'] = (time.perf_counter() - started) / views * 1e6
+
+        started = time.perf_counter()
+        for _ in range(views):
+            items, _, _ = await handlers.storage.page_user(user_id, cursor, handlers.PAGE_SIZE)
+            await handlers.render_list_page(user, items, zone)
+        results[f'page_us_{size}'] = (time.perf_counter() - started) / views * 1e6
+    return results
+
+
+def bench_pages(iterations: int) -> Dict[str, float]:
+    return asyncio.run(run_pages([100, 10000], max(iterations // 1000, 10)))
+
+
+class FakeSession(BaseSession):
+    # answers every Bot API call with True instead of going to Telegram
+    async def make_request(self, bot, method, timeout=None):
+        return True
+
+    async def stream_content(self, url, headers=None, timeout=30, chunk_size=65536, raise_for_status=True):
+        yield b''
+
+    async def close(self):
+        pass
+
+
+class RecordingSession(FakeSession):
+    # prints every sent message so the parent process can count deliveries per reminder
+    async def make_request(self, bot, method, timeout=None):
+        if isinstance(method, SendMessage):
+            print('sent', json.dumps(method.text, ensure_ascii=False), flush=True)
+        return True
+
+
+def message_update(update_id: int, user_id: int, text: str) -> dict:
+    user = {'id': user_id, 'is_bot': False, 'first_name': 'bench', 'language_code': 'ru'}
+    return {'update_id': update_id, 'message': {
+        'message_id': update_id, 'date': 0, 'chat': {'id': user_id, 'type': 'private'}, 'from': user, 'text': text
+    }}
+
+
+def callback_update(update_id: int, user_id: int, data: str) -> dict:
+    user = {'id': user_id, 'is_bot': False, 'first_name': 'bench', 'language_code': 'ru'}
+    return {'update_id': update_id, 'callback_query': {
+        'id': str(update_id), 'chat_instance': 'bench', 'from': user, 'data': data, 'message': {
+            'message_id': update_id, 'date': 0, 'chat': {'id': user_id, 'type': 'private'}, 'from': user,
+            'text': 'bench'
+        }
+    }}
+
+
+def synthetic_updates(count: int, users: int = 1000) -> List[dict]:
+    flows = [
+        ('message', 'Установить напоминание'), ('callback', 'type:task'), ('callback', 'calendar:2030:11'),
+        ('callback', 'day:2030:11:18'), ('callback', 'hour:09'), ('message', 'Мои напоминания'),
+    ]
+    updates = []
+    for i in range(count):
+        kind, data = flows[i // users % len(flows)]
+        build = message_update if kind == 'message' else callback_update
+        updates.append(build(i, i % users + 1, data))
+    return updates
+
+
+async def shard_worker() -> None:
+    from aiogram import Bot, Dispatcher
+    from fsm import TTLMemoryStorage
+    from set import router
+    from shards import serve_updates, stdin_reader
+
+    bot = Bot('1:bench', session=FakeSession())
+    dp = Dispatcher(storage=TTLMemoryStorage())
+    dp.include_router(router)
+    reader = await stdin_reader()
+    print('ready', flush=True)
+    await serve_updates(bot, dp, reader)
+
+
+async def run_shards(shards: int, updates: List[dict]) -> float:
+    from aiogram.types import Update
+    from shards import ShardRouter
+
+    router = ShardRouter([sys.executable, os.path.abspath(__file__)], shards, stdout=asyncio.subprocess.PIPE)
+    await router.start()
+    for process in router.processes:
+        await process.stdout.readline()
+    parsed = [Update.model_validate(update) for update in updates]
+
+    started = time.perf_counter()
+    for update in parsed:
+        await router.forward(update, update.event.from_user)
+    await router.stop()
+    return len(parsed) / (time.perf_counter() - started)
+
+
+def bench_shards(iterations: int) -> Dict[str, float]:
+    # workers write their per-shard reminder files into the current directory
+    os.chdir(tempfile.mkdtemp(prefix='bench-shards-'))
+    updates = synthetic_updates(max(iterations // 10, 1))
+    results = {'cpus': os.cpu_count(), 'updates': len(updates)}
+    for shards in (1, 2, 4):
+        results[f'{shards}_workers_updates_per_s'] = asyncio.run(run_shards(shards, updates))
+    return results
+
+
+FAILOVER_TTL = 2.0
+FAILOVER_SPREAD = 6.0
+
+
+async def replica_worker() -> None:
+    from aiogram import Bot
+    from lease import Lease
+    from set import delivery, lead_scheduler, reminder_delivered, storage
+
+    bot = Bot('1:bench', session=RecordingSession())
+    delivery.start(bot, on_status=reminder_delivered)
+    await storage.open()
+    print('ready', flush=True)
+    await lead_scheduler(bot, Lease(storage.path, ttl=FAILOVER_TTL), heartbeat=FAILOVER_TTL / 3)
+
+
+async def seed_reminders(path: str, count: int, start: float) -> None:
+    from reminder import Reminder
+    from storage import SQLiteStorage
+
+    storage = SQLiteStorage(path, None)
+    await storage.open()
+    for i in range(count):
+        # one chat per reminder so the per-chat rate limit does not spread sends out
+        await storage.add(i + 1, Reminder(i + 1, int(start + i * FAILOVER_SPREAD / count), f"failover-{i}"))
+    await storage.close()
+
+
+async def run_failover(count: int) -> Dict[str, float]:
+    env = {**os.environ, 'REMINDER_STORAGE': 'sqlite'}
+    command = [sys.executable, os.path.abspath(__file__), '--replica']
+    sent: Dict[int, List[str]] = {}
+    acquired: Dict[str, float] = {}
+    ready: Dict[str, asyncio.Event] = {'first': asyncio.Event(), 'second': asyncio.Event()}
+
+    async def watch(name: str, process: asyncio.subprocess.Process) -> None:
+        async for line in process.stdout:
+            line = line.decode('utf-8')
+            if line.startswith('ready'):
+                ready[name].set()
+            if line.startswith('Acquired scheduler lease'):
+                acquired[name] = time.time()
+            match = re.search(r'failover-(\d+)', line) if line.startswith('sent') else None
+            if match:
+                sent.setdefault(int(match.group(1)), []).append(name)
+
+    first = await asyncio.create_subprocess_exec(*command, stdout=asyncio.subprocess.PIPE, env=env)
+    watchers = [asyncio.create_task(watch('first', first))]
+    while 'first' not in acquired:
+        await asyncio.sleep(0.05)
+    second = await asyncio.create_subprocess_exec(*command, stdout=asyncio.subprocess.PIPE, env=env)
+    watchers.append(asyncio.create_task(watch('second', second)))
+    await ready['second'].wait()
+    # written behind the leader's back, the way another replica's handlers would, so it finds them by syncing
+    start = time.time() + 2
+    await seed_reminders('reminders.db', count, start)
+
+    # the leader dies without releasing the lease halfway through the run
+    await asyncio.sleep(max(start + FAILOVER_SPREAD / 2 - time.time(), 0))
+    first.send_signal(signal.SIGKILL)
+    killed = time.time()
+    await first.wait()
+
+    deadline = start + FAILOVER_SPREAD + FAILOVER_TTL + 10
+    while len(sent) < count and time.time() < deadline:
+        await asyncio.sleep(0.1)
+    second.terminate()
+    await second.wait()
+    await asyncio.gather(*watchers)
+
+    return {
+        'reminders': count,
+        'lease_ttl_s': FAILOVER_TTL,
+        'failover_s': acquired['second'] - killed if 'second' in acquired else None,
+        'sent_by_first': sum(1 for senders in sent.values() if 'first' in senders),
+        'sent_by_second': sum(1 for senders in sent.values() if 'second' in senders),
+        'duplicates': sum(len(senders) - 1 for senders in sent.values()),
+        'missing': count - len(sent),
+    }
+
+
+def bench_failover(iterations: int) -> Dict[str, float]:
+    os.chdir(tempfile.mkdtemp(prefix='bench-failover-'))
+    return asyncio.run(run_failover(max(iterations // 1000, 10)))
+
+
+async def run_torn_log(count: int) -> Dict[str, float]:
+    from reminder import Reminder
+    from storage import MemoryStorage, ReminderLog
+
+    async def session(ids: List[int], torn: bytes = b'') -> None:
+        storage = MemoryStorage(ReminderLog())
+        await storage.open()
+        for rem_id in ids:
+            await storage.add(1, Reminder(rem_id, int(time.time()) + 3600, f"torn-{rem_id}"))
+        await storage.close()
+        if torn:
+            # the process dies partway through writing its last record
+            with open('reminders.log', 'ab') as f:
+                f.write(torn)
+
+    before = list(range(1, count + 1))
+    after = list(range(count + 1, 2 * count + 1))
+    await session(before, torn=b'["+",1,{"id":0,"du')
+    await session(after)
+    storage = MemoryStorage(ReminderLog())
+    await storage.open()
+    recovered = {rem.id async for _, rem in storage.iter_all()}
+    await storage.close()
+    return {
+        'written': len(before) + len(after),
+        'recovered': len(recovered),
+        'missing_after_crash': len(set(after) - recovered),
+        'missing_before_crash': len(set(before) - recovered),
+    }
+
+
+def bench_torn_log(iterations: int) -> Dict[str, float]:
+    os.chdir(tempfile.mkdtemp(prefix='bench-torn-'))
+    return asyncio.run(run_torn_log(max(iterations // 1000, 10)))
+
+
+OUTBOX_SPREAD = 10.0
+OUTBOX_CRASHES = 5
+OUTBOX_UNREACHABLE = 10
+
+
+class FlakySession(RecordingSession):
+    # every OUTBOX_UNREACHABLE-th chat rejects messages, like a user who blocked the bot
+    async def make_request(self, bot, method, timeout=None):
+        if isinstance(method, SendMessage) and method.chat_id % OUTBOX_UNREACHABLE == 0:
+            raise TelegramBadRequest(method=method, message="Bad Request: chat not found")
+        return await super().make_request(bot, method, timeout)
+
+
+async def outbox_worker() -> None:
+    from aiogram import Bot
+    import set as handlers
+
+    # short retries so dead-lettering finishes within the run
+    handlers.RETRY_DELAY = 0.1
+    bot = Bot('1:bench', session=FlakySession())
+    handlers.delivery.start(bot, on_status=handlers.reminder_delivered)
+    await handlers.storage.open()
+    await handlers.restore_reminders(bot)
+    handlers.scheduler.start(partial(handlers.reminder_task, bot))
+    print('ready', flush=True)
+    await asyncio.Event().wait()
+
+
+async def run_outbox(count: int, crashes: int) -> Dict[str, float]:
+    from reminder import DEAD, Reminder
+    from storage import create_storage
+
+    storage = create_storage('memory')
+    await storage.open()
+    start = time.time() + 5
+    for i in range(count):
+        await storage.add(i + 1, Reminder(i + 1, int(start + i * OUTBOX_SPREAD / count), f"outbox-{i}"))
+    await storage.close()
+
+    sent: Dict[int, int] = {}
+    unreachable = {i for i in range(count) if (i + 1) % OUTBOX_UNREACHABLE == 0}
+    dead_lettered = 0
+
+    async def run_worker(lifetime: float) -> None:
+        process = await asyncio.create_subprocess_exec(
+            sys.executable, os.path.abspath(__file__), '--outbox', stdout=asyncio.subprocess.PIPE
+        )
+
+        ready = asyncio.Event()
+
+        async def watch():
+            nonlocal dead_lettered
+            async for line in process.stdout:
+                line = line.decode('utf-8')
+                if line.startswith('ready'):
+                    ready.set()
+                match = re.search(r'outbox-(\d+)', line) if line.startswith('sent') else None
+                if match:
+                    sent[int(match.group(1))] = sent.get(int(match.group(1)), 0) + 1
+                dead_lettered += 'dead-lettered after' in line
+
+        watcher = asyncio.create_task(watch())
+        await asyncio.wait_for(ready.wait(), 60)
+        deadline = time.time() + lifetime
+        while time.time() < deadline and (len(sent) < count - len(unreachable) or dead_lettered < len(unreachable)):
+            await asyncio.sleep(0.05)
+        # give the log its coalescing window before the last worker goes down
+        await asyncio.sleep(0.2 if lifetime > OUTBOX_SPREAD else 0)
+        process.send_signal(signal.SIGKILL)
+        await process.wait()
+        await watcher
+
+    # each worker is killed at a random moment, mid-firing, mid-send or mid-write
+    rng = random.Random(0)
+    for _ in range(crashes):
+        await run_worker(rng.uniform(0.5, 2.0))
+    await run_worker(OUTBOX_SPREAD + 30)
+
+    storage = create_storage('memory')
+    await storage.open()
+    left = [rem async for _, rem in storage.iter_all()]
+    await storage.close()
+    return {
+        'reminders': count,
+        'crashes': crashes,
+        'unreachable': len(unreachable),
+        'sent': len(sent),
+        'duplicates': sum(sent.values()) - len(sent),
+        'missing': count - len(unreachable) - len(sent.keys() - unreachable),
+        'dead_lettered': sum(rem.status == DEAD for rem in left),
+        'left_undelivered': sum(rem.status != DEAD for rem in left),
+    }
+
+
+def bench_outbox(iterations: int) -> Dict[str, float]:
+    os.chdir(tempfile.mkdtemp(prefix='bench-outbox-'))
+    return asyncio.run(run_outbox(max(iterations // 1000, 10), OUTBOX_CRASHES))
+
+
+FIRING_DELAY = 40
+FIRING_TIMEOUT = 600
+LISTING_SIZES = (1, 100, 10000)
+DELETE_SEEDED = 20
+# Telegram's default max_connections for a webhook
+INGRESS_CONCURRENCY = 40
+LOAD_OPTIONS = {'api_latency': 0.0, 'rate_limit_every': 0}
+
+
+class ApiSession(FakeSession):
+    # a stand-in for the Bot API: counts calls by method, can answer each one after a delay,
+    # and can turn every rate_limit_every-th sendMessage into a 429
+    def __init__(self, latency: float = 0.0, rate_limit_every: int = 0, retry_after: int = 1):
+        super().__init__()
+        self.latency = latency
+        self.rate_limit_every = rate_limit_every
+        self.retry_after = retry_after
+        self.calls: Dict[str, int] = {}
+        self.rate_limited = 0
+        self.last_send = 0.0
+
+    async def make_request(self, bot, method, timeout=None):
+        name = type(method).__name__
+        count = self.calls[name] = self.calls.get(name, 0) + 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if isinstance(method, SendMessage):
+            if self.rate_limit_every and count % self.rate_limit_every == 0:
+                self.rate_limited += 1
+                raise TelegramRetryAfter(method=method, message="Too Many Requests", retry_after=self.retry_after)
+            self.last_send = time.time()
+        return True
+
+
+def percentile(ordered: List[float], p: float) -> float:
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))] if ordered else 0.0
+
+
+def peak_rss_mb() -> float:
+    import resource
+    # kilobytes on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def load_bot(session: ApiSession):
+    from aiogram import Bot, Dispatcher
+    from fsm import TTLMemoryStorage
+    from set import router
+
+    dp = Dispatcher(storage=TTLMemoryStorage())
+    dp.include_router(router)
+    return Bot('1:bench', session=session), dp
+
+
+async def drive(bot, dp, updates: List[dict]) -> Dict[str, float]:
+    from aiogram.types import Update
+
+    parsed = [Update.model_validate(update, context={'bot': bot}) for update in updates]
+    latencies = []
+    errors = 0
+    started = time.perf_counter()
+    for update in parsed:
+        before = time.perf_counter()
+        try:
+            await dp.feed_update(bot, update)
+        except Exception:
+            errors += 1
+        latencies.append(time.perf_counter() - before)
+    return latency_stats(latencies, time.perf_counter() - started, errors)
+
+
+async def drive_users(send: Callable[[dict], Awaitable[None]], flows: List[List[dict]],
+                      concurrency: int) -> Dict[str, float]:
+    # users run side by side, each one's updates in order, at most concurrency updates in flight
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = 0
+
+    async def run_user(updates: List[dict]) -> None:
+        nonlocal errors
+        for update in updates:
+            async with semaphore:
+                before = time.perf_counter()
+                try:
+                    await send(update)
+                except Exception:
+                    errors += 1
+                latencies.append(time.perf_counter() - before)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(run_user(updates) for updates in flows))
+    return latency_stats(latencies, time.perf_counter() - started, errors)
+
+
+def latency_stats(latencies: List[float], elapsed: float, errors: int) -> Dict[str, float]:
+    latencies.sort()
+    return {
+        'updates': len(latencies),
+        'updates_per_s': len(latencies) / elapsed,
+        'p50_ms': percentile(latencies, 50) * 1e3,
+        'p99_ms': percentile(latencies, 99) * 1e3,
+        'errors': errors,
+    }
+
+
+async def seed_user(user_id: int, count: int, start: int) -> List[int]:
+    from set import scheduler, storage
+    from reminder import Reminder
+
+    ids = [user_id * 100000 + i for i in range(count)]
+    for i, rem_id in enumerate(ids):
+        await storage.add(user_id, Reminder(rem_id, start + i * 60, f"reminder {i}"))
+        scheduler.schedule(rem_id, start + i * 60, user_id)
+    return ids
+
+
+CREATE_FLOW = [
+    (message_update, 'Установить напоминание'), (callback_update, 'type:task'),
+    (callback_update, 'calendar:2030:11'), (callback_update, 'day:2030:11:18'), (callback_update, 'hour:09'),
+    (callback_update, 'minute:09:30'), (callback_update, 'repeat:none'), (message_update, 'bench reminder'),
+]
+
+
+def create_updates(user_id: int) -> List[dict]:
+    return [build(len(CREATE_FLOW) * user_id + i, user_id, data) for i, (build, data) in enumerate(CREATE_FLOW)]
+
+
+async def load_create(session: ApiSession, iterations: int) -> Dict[str, float]:
+    from set import storage
+
+    bot, dp = load_bot(session)
+    users = max(iterations // 100, 1)
+    updates = [update for user_id in range(1, users + 1) for update in create_updates(user_id)]
+    results = await drive(bot, dp, updates)
+    results['created'] = sum([await storage.count_user(user_id) for user_id in range(1, users + 1)])
+    return results
+
+
+async def load_calendar(session: ApiSession, iterations: int) -> Dict[str, float]:
+    bot, dp = load_bot(session)
+    flow = ['type:task'] + [f'calendar:2030:{month}' for month in range(1, 13)] + ['months:2030', 'months:2031']
+    users = max(iterations // 100, 1)
+    updates = [
+        callback_update(user_id * len(flow) + i, user_id, data)
+        for user_id in range(1, users + 1) for i, data in enumerate(flow)
+    ]
+    return await drive(bot, dp, updates)
+
+
+async def load_listing(session: ApiSession, iterations: int) -> Dict[str, float]:
+    bot, dp = load_bot(session)
+    views = max(iterations // 1000, 10)
+    results = {}
+    for user_id, size in enumerate(LISTING_SIZES, 1):
+        ids = await seed_user(user_id, size, 1900000000)
+        # the first page, then one from the middle of the list reached through its cursor
+        middle = size // 2
+        page = f'page:list:next:{1900000000 + middle * 60}:{ids[middle]}'
+        updates = []
+        for i in range(views):
+            updates.append(message_update(2 * i, user_id, 'Мои напоминания'))
+            updates.append(callback_update(2 * i + 1, user_id, page))
+        for key, value in (await drive(bot, dp, updates)).items():
+            results[f'{key}_{size}'] = value
+    return results
+
+
+async def load_delete(session: ApiSession, iterations: int) -> Dict[str, float]:
+    from set import storage
+
+    bot, dp = load_bot(session)
+    users = max(iterations // 100, 1)
+    updates = []
+    for user_id in range(1, users + 1):
+        ids = await seed_user(user_id, DELETE_SEEDED, 1900000000)
+        # picks a few, gives up on them, then takes the whole page
+        updates.append(message_update(len(updates), user_id, 'Удалить напоминания'))
+        for data in [f'select_del:{rem_id}' for rem_id in ids[:3]] + ['deselect_all_del', 'select_all_del',
+                                                                       'confirm_delete']:
+            updates.append(callback_update(len(updates), user_id, data))
+    results = await drive(bot, dp, updates)
+    left = sum([await storage.count_user(user_id) for user_id in range(1, users + 1)])
+    results['deleted'] = users * DELETE_SEEDED - left
+    return results
+
+
+async def load_webhook(session: ApiSession, iterations: int) -> Dict[str, float]:
+    # the same create flows fed the way polling does and posted through the webhook handler run.py serves
+    from aiogram.types import Update
+    from aiogram.webhook.aiohttp_server import SimpleRequestHandler
+    from aiohttp import web
+    from aiohttp.test_utils import TestClient, TestServer
+    from set import storage
+
+    bot, dp = load_bot(session)
+    users = max(iterations // 100, 1)
+
+    async def feed(update: dict) -> None:
+        await dp.feed_update(bot, Update.model_validate(update, context={'bot': bot}))
+
+    app = web.Application()
+    SimpleRequestHandler(dispatcher=dp, bot=bot, handle_in_background=False).register(app, path='/webhook')
+    client = TestClient(TestServer(app))
+    await client.start_server()
+
+    async def post(update: dict) -> None:
+        async with client.post('/webhook', json=update) as response:
+            await response.read()
+            if response.status != 200:
+                raise RuntimeError(f"webhook answered {response.status}")
+
+    results = {}
+    try:
+        # separate users for each ingress, so neither finds the other's dialogue state
+        for name, send, first in (('polling', feed, 1), ('webhook', post, users + 1)):
+            flows = [create_updates(user_id) for user_id in range(first, first + users)]
+            for key, value in (await drive_users(send, flows, INGRESS_CONCURRENCY)).items():
+                results[f'{name}_{key}'] = value
+            created = [await storage.count_user(user_id) for user_id in range(first, first + users)]
+            results[f'{name}_created'] = sum(created)
+    finally:
+        await client.close()
+    return results
+
+
+async def load_firing(session: ApiSession, iterations: int) -> Dict[str, float]:
+    from aiogram import Bot
+    from delivery import DeliveryQueue
+    from reminder import Reminder
+    import set as handlers
+
+    # everyone picked the same minute; one chat per reminder so only the global limit applies, and that is
+    # lifted too: at Telegram's 30 messages a second this burst would take the best part of an hour
+    handlers.delivery = DeliveryQueue(global_rate=iterations, chat_rate=1)
+    bot = Bot('1:bench', session=session)
+    due = int(time.time()) + FIRING_DELAY
+    started = time.perf_counter()
+    for i in range(iterations):
+        await handlers.storage.add(i + 1, Reminder(i + 1, due, f"firing {i}"))
+    await handlers.storage.flush()
+    seed_s = time.perf_counter() - started
+
+    handlers.delivery.start(bot, on_status=handlers.reminder_delivered)
+    await handlers.restore_reminders(bot)
+    handlers.scheduler.start(partial(handlers.reminder_task, bot))
+    delivery = handlers.delivery
+    deadline = due + FIRING_TIMEOUT
+    while delivery.sent + delivery.failed < iterations and time.time() < deadline:
+        await asyncio.sleep(0.1)
+    await handlers.scheduler.stop()
+    await delivery.stop()
+    await handlers.storage.flush()
+    return {
+        'reminders': iterations,
+        'seed_s': seed_s,
+        'sent': delivery.sent,
+        'failed': delivery.failed,
+        'rate_limited': session.rate_limited,
+        'drain_s': session.last_send - due if delivery.sent else None,
+        'sent_per_s': delivery.sent / max(session.last_send - due, 1e-3) if delivery.sent else 0.0,
+        'p50_lag_ms': delivery.latency.percentile(50) * 1e3 if delivery.sent else None,
+        'p99_lag_ms': delivery.latency.percentile(99) * 1e3 if delivery.sent else None,
+    }
+
+
+LOAD_SCENARIOS = {
+    'create': load_create,
+    'calendar': load_calendar,
+    'listing': load_listing,
+    'delete': load_delete,
+    'webhook': load_webhook,
+    'firing': load_firing,
+}
+
+
+async def load_worker(name: str, iterations: int, api_latency: float, rate_limit_every: int) -> None:
+    from set import storage
+
+    session = ApiSession(api_latency, rate_limit_every)
+    await storage.open()
+    base_rss = peak_rss_mb()
+    results = await LOAD_SCENARIOS[name](session, iterations)
+    await storage.close()
+    results.update(api_calls=sum(session.calls.values()), base_rss_mb=base_rss, peak_rss_mb=peak_rss_mb())
+    print(json.dumps(results), flush=True)
+
+
+def run_load(name: str, iterations: int) -> Dict[str, float]:
+    # each scenario gets a fresh process, so peak RSS is its own, and a fresh directory for the reminder files
+    import subprocess
+
+    command = [
+        sys.executable, os.path.abspath(__file__), '--load', name, '--iterations', str(iterations),
+        '--api-latency', str(LOAD_OPTIONS['api_latency']), '--rate-limit-every', str(LOAD_OPTIONS['rate_limit_every'])
+    ]
+    output = subprocess.run(
+        command, cwd=tempfile.mkdtemp(prefix=f'bench-{name}-'), stdout=subprocess.PIPE, check=True, text=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def git_commit() -> str:
+    import subprocess
+
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=os.path.dirname(os.path.abspath(__file__)),
+            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True
+        ).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def compare(previous: Dict[str, dict], results: Dict[str, dict]) -> None:
+    for name, values in results.items():
+        for key, value in values.items():
+            old = previous.get(name, {}).get(key)
+            if isinstance(value, (int, float)) and isinstance(old, (int, float)) and old:
+                print(f"{name}.{key}: {old:.4g} -> {value:.4g} ({(value / old - 1) * 100:+.1f}%)")
+
+
+SCENARIOS = {
+    'callbacks': bench_callbacks,
+    'keyboards': bench_keyboards,
+    'memory': bench_memory,
+    'recurrence': bench_recurrence,
+    'pages': bench_pages,
+    'render': bench_render,
+    'shards': bench_shards,
+    'failover': bench_failover,
+    'outbox': bench_outbox,
+    'torn': bench_torn_log,
+    # end-to-end runs of the real router through a Dispatcher, one process each
+    **{name: partial(run_load, name) for name in LOAD_SCENARIOS},
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reminder bot micro-benchmarks")
+    parser.add_argument('scenarios', nargs='*', help=f"any of: {', '.join(SCENARIOS)} (default: all)")
+    parser.add_argument('--iterations', type=int, default=100000)
+    parser.add_argument('--shard', type=int, default=None, help=argparse.SUPPRESS)
+    parser.add_argument('--replica', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--outbox', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--load', default=None, help=argparse.SUPPRESS)
+    parser.add_argument('--api-latency', type=float, default=0.0,
+                        help="seconds the fake Bot API takes to answer each call in the load scenarios")
+    parser.add_argument('--rate-limit-every', type=int, default=0,
+                        help="answer every N-th sendMessage with a 429 in the load scenarios (0: never)")
+    parser.add_argument('--output', default=None, help="also write the results to this JSON file")
+    parser.add_argument('--compare', default=None, help="print the change against results saved with --output")
+    args = parser.parse_args()
+    if args.shard is not None:
+        asyncio.run(shard_worker())
+        return
+    if args.replica:
+        asyncio.run(replica_worker())
+        return
+    if args.outbox:
+        asyncio.run(outbox_worker())
+        return
+    if args.load is not None:
+        asyncio.run(load_worker(args.load, args.iterations, args.api_latency, args.rate_limit_every))
+        return
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+    args.scenarios = args.scenarios or list(SCENARIOS)
+
+    LOAD_OPTIONS.update(api_latency=args.api_latency, rate_limit_every=args.rate_limit_every)
+    # some scenarios move into a scratch directory; the output paths are relative to where we started
+    output = os.path.abspath(args.output) if args.output else None
+    previous = None
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            previous = json.load(f)['results']
+
+    results = {name: SCENARIOS[name](args.iterations) for name in args.scenarios}
+    print(json.dumps(results, indent=4))
+    if output:
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump({
+                'commit': git_commit(), 'python': sys.version.split()[0], 'iterations': args.iterations,
+                'api_latency': args.api_latency, 'rate_limit_every': args.rate_limit_every,
+                'time': datetime.now().isoformat(timespec='seconds'), 'results': results,
+            }, f, indent=4)
+    if previous is not None:
+        compare(previous, results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from aiogram import types
+
+SEP = ':'
+MAX_CALLBACK_BYTES = 64
+
+CallbackHandler = Callable[..., Awaitable[Any]]
+
+
+def pack(action: str, *args: Any) -> str:
+    data = SEP.join((action, *map(str, args)))
+    if len(data.encode('utf-8')) > MAX_CALLBACK_BYTES:
+        raise ValueError(f"Callback data is longer than {MAX_CALLBACK_BYTES} bytes: {data}")
+    return data
+
+
+def unpack(data: str) -> Tuple[str, List[str]]:
+    action, *args = data.split(SEP)
+    return action, args
+
+
+class CallbackTable:
+    def __init__(self):
+        self.handlers: Dict[str, CallbackHandler] = {}
+        self._converters: Dict[str, List[Callable[[str], Any]]] = {}
+        self._context: Dict[str, Tuple[str, ...]] = {}
+
+    def __call__(self, action: str) -> Callable[[CallbackHandler], CallbackHandler]:
+        def register(handler: CallbackHandler) -> CallbackHandler:
+            if action in self.handlers:
+                raise ValueError(f"Callback action {action!r} is already handled by {self.handlers[action].__name__}")
+            self.handlers[action] = handler
+            # arguments annotated as int (reminder ids) are converted before the handler runs
+            code = handler.__code__
+            names = code.co_varnames[1:code.co_argcount]
+            self._converters[action] = [handler.__annotations__.get(name, str) for name in names]
+            # keyword-only arguments (e.g. state) are taken from the context passed to dispatch
+            self._context[action] = code.co_varnames[code.co_argcount:code.co_argcount + code.co_kwonlyargcount]
+            return handler
+        return register
+
+    async def dispatch(self, callback_query: types.CallbackQuery, **context: Any) -> None:
+        action, args = unpack(callback_query.data or '')
+        handler = self.handlers.get(action)
+        values = self._convert(action, args) if handler is not None else None
+        if values is None:
+            # buttons from an older message layout or a stale keyboard
+            await callback_query.answer()
+            return
+        await handler(callback_query, *values, **{name: context[name] for name in self._context[action]})
+
+    def handler_name(self, callback_query: types.CallbackQuery) -> str:
+        # a bounded label for metrics: the handler's name, or 'unknown' for actions nobody handles
+        handler = self.handlers.get((callback_query.data or '').split(SEP, 1)[0])
+        return handler.__name__ if handler is not None else 'unknown'
+
+    def _convert(self, action: str, args: List[str]) -> Optional[List[Any]]:
+        converters = self._converters[action]
+        if len(converters) != len(args):
+            return None
+        try:
+            return [convert(arg) for convert, arg in zip(converters, args)]
+        except ValueError:
+            return None
@@ -0,0 +1,251 @@
+import asyncio
+import heapq
+import time
+from collections import deque
+from typing import Awaitable, Callable, Dict, Hashable, List, Optional, Set
+
+from aiogram.exceptions import (
+    TelegramAPIError, TelegramBadRequest, TelegramNetworkError, TelegramRetryAfter, TelegramServerError
+)
+
+from metrics import FIRE_LAG
+from stalls import log_event
+
+DELIVERY_WORKERS = 8
+DELIVERY_QUEUE_SIZE = 10000
+GLOBAL_RATE = 30
+CHAT_RATE = 1
+MAX_ATTEMPTS = 5
+MAX_BACKOFF = 60
+LATENCY_SAMPLES = 100000
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def reserve(self) -> float:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+
+class ChatLimiter:
+    def __init__(self, rate: float, max_chats: int = 10000):
+        self.interval = 1 / rate
+        self.max_chats = max_chats
+        self._next: Dict[int, float] = {}
+
+    def reserve(self, chat_id: int) -> float:
+        now = time.monotonic()
+        slot = max(now, self._next.get(chat_id, 0.0))
+        self._next[chat_id] = slot + self.interval
+        if len(self._next) > self.max_chats:
+            self._next = {chat: ts for chat, ts in self._next.items() if ts > now}
+        return slot - now
+
+
+class LatencyWindow:
+    def __init__(self, maxlen: int = LATENCY_SAMPLES):
+        self.samples = deque(maxlen=maxlen)
+
+    def observe(self, seconds: float) -> None:
+        self.samples.append(seconds)
+
+    def percentile(self, p: float) -> float:
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+
+class Delivery:
+    __slots__ = ('chat_id', 'text', 'parse_mode', 'fallback', 'key', 'attempts', 'due', 'cancelled')
+
+    def __init__(self, chat_id: int, text: str, parse_mode: Optional[str] = None,
+                 fallback: Optional[str] = None, key: Hashable = None, due: Optional[float] = None):
+        self.chat_id = chat_id
+        self.text = text
+        self.parse_mode = parse_mode
+        self.fallback = fallback
+        self.key = key
+        self.attempts = 0
+        self.due = due if due is not None else time.time()
+        self.cancelled = False
+
+
+class DeliveryQueue:
+    def __init__(self, workers: int = DELIVERY_WORKERS, maxsize: int = DELIVERY_QUEUE_SIZE,
+                 global_rate: float = GLOBAL_RATE, chat_rate: float = CHAT_RATE, max_attempts: int = MAX_ATTEMPTS):
+        self.workers = workers
+        self.maxsize = maxsize
+        self.max_attempts = max_attempts
+        self.global_limit = TokenBucket(global_rate, global_rate)
+        self.chat_limit = ChatLimiter(chat_rate)
+        self.sent = 0
+        self.failed = 0
+        self.retries = 0
+        self.rate_limited = 0
+        self.latency = LatencyWindow()
+        # sends this many seconds past due are logged one by one; None keeps only the histogram
+        self.late_after: Optional[float] = None
+        self._bot = None
+        self._on_status: Optional[Callable[[Hashable, str, int], Awaitable[None]]] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._paused_until = 0.0
+        self._tasks: List[asyncio.Task] = []
+        self._staged: List[list] = []
+        self._staged_keys: Dict[Hashable, Delivery] = {}
+        # every key from put() until its status is reported; a second put with the same key is dropped
+        self._keys: Set[Hashable] = set()
+        self._counter = 0
+        self._release: Optional[asyncio.Event] = None
+
+    def __len__(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    @property
+    def staged(self) -> int:
+        return len(self._staged_keys)
+
+    def start(self, bot, on_status: Optional[Callable[[Hashable, str, int], Awaitable[None]]] = None) -> None:
+        if self._tasks:
+            return
+        self._bot = bot
+        self._on_status = on_status
+        self._queue = asyncio.Queue(self.maxsize)
+        self._release = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._releaser()))
+
+    async def stop(self, timeout: float = 10) -> None:
+        if not self._tasks:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            print(f"Delivery queue stopped with {self._queue.qsize()} messages undelivered")
+        if self._staged_keys:
+            print(f"Delivery queue stopped with {len(self._staged_keys)} staged messages unreleased")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def put(self, chat_id: int, text: str, parse_mode: Optional[str] = None,
+                  fallback: Optional[str] = None, key: Hashable = None, release_at: float = 0.0) -> bool:
+        if key is not None:
+            if key in self._keys:
+                return False
+            self._keys.add(key)
+        item = Delivery(chat_id, text, parse_mode, fallback, key, release_at or None)
+        if release_at <= time.time():
+            await self._queue.put(item)
+            return True
+
+        self._counter += 1
+        entry = [release_at, self._counter, item]
+        heapq.heappush(self._staged, entry)
+        if key is not None:
+            self._staged_keys[key] = item
+        if self._staged[0] is entry:
+            self._release.set()
+        return True
+
+    def cancel(self, key: Hashable) -> bool:
+        item = self._staged_keys.pop(key, None)
+        if item is None:
+            return False
+        item.cancelled = True
+        self._keys.discard(key)
+        return True
+
+    async def _releaser(self) -> None:
+        while True:
+            self._release.clear()
+            now = time.time()
+            while self._staged and self._staged[0][0] <= now:
+                _, _, item = heapq.heappop(self._staged)
+                if item.cancelled:
+                    continue
+                if item.key is not None:
+                    self._staged_keys.pop(item.key, None)
+                await self._queue.put(item)
+                now = time.time()
+
+            timeout = None
+            if self._staged:
+                timeout = max(self._staged[0][0] - time.time(), 0)
+            try:
+                await asyncio.wait_for(self._release.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _worker(self) -> None:
+        while True:
+            item = await self._queue.get()
+            try:
+                status = await self._deliver(item)
+            except Exception as e:
+                print(f"Error in delivery worker: {e}")
+                status = 'failed'
+            # released before the status callback, which may put the same key back for a retry
+            self._keys.discard(item.key)
+            try:
+                if self._on_status is not None and item.key is not None:
+                    await self._on_status(item.key, status, item.attempts)
+            except Exception as e:
+                print(f"Error in delivery worker: {e}")
+            finally:
+                self._queue.task_done()
+
+    async def _deliver(self, item: Delivery) -> str:
+        while True:
+            item.attempts += 1
+            await self._wait_for_slot(item.chat_id)
+            try:
+                await self._bot.send_message(item.chat_id, item.text, parse_mode=item.parse_mode)
+                self.sent += 1
+                lag = time.time() - item.due
+                self.latency.observe(lag)
+                FIRE_LAG.observe(lag)
+                if self.late_after is not None and lag > self.late_after:
+                    log_event('late_delivery', key=item.key, chat_id=item.chat_id, lag=round(lag, 3),
+                              attempts=item.attempts)
+                return 'sent'
+            except TelegramRetryAfter as e:
+                self.rate_limited += 1
+                self._paused_until = max(self._paused_until, time.monotonic() + e.retry_after)
+            except TelegramBadRequest as e:
+                if item.fallback is None:
+                    print(f"Error delivering to {item.chat_id}: {e}")
+                    self.failed += 1
+                    return 'failed'
+                item.text, item.parse_mode, item.fallback = item.fallback, None, None
+            except (TelegramNetworkError, TelegramServerError) as e:
+                if item.attempts >= self.max_attempts:
+                    print(f"Error delivering to {item.chat_id}: {e}")
+                    self.failed += 1
+                    return 'failed'
+                await asyncio.sleep(min(2 ** item.attempts, MAX_BACKOFF))
+            except TelegramAPIError as e:
+                print(f"Error delivering to {item.chat_id}: {e}")
+                self.failed += 1
+                return 'failed'
+            if item.attempts >= self.max_attempts:
+                self.failed += 1
+                return 'failed'
+            self.retries += 1
+
+    async def _wait_for_slot(self, chat_id: int) -> None:
+        pause = self._paused_until - time.monotonic()
+        if pause > 0:
+            await asyncio.sleep(pause)
+        delay = max(self.chat_limit.reserve(chat_id), self.global_limit.reserve())
+        if delay > 0:
+            await asyncio.sleep(delay)
@@ -0,0 +1,133 @@
+import sys
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Mapping, Optional
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+
+SESSION_TTL = 3600
+MAX_SESSIONS = 100000
+
+
+class Session:
+    __slots__ = ('state', 'data', 'expires')
+
+    def __init__(self):
+        self.state: Optional[str] = None
+        self.data: Dict[str, Any] = {}
+        self.expires = 0.0
+
+
+class TTLMemoryStorage(BaseStorage):
+    # sessions stay in least-recently-used order; each access pushes the expiry forward,
+    # so expired and evictable sessions are always at the front
+    def __init__(self, ttl: float = SESSION_TTL, max_sessions: int = MAX_SESSIONS):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.expired = 0
+        self.evicted = 0
+        self._sessions: 'OrderedDict[StorageKey, Session]' = OrderedDict()
+
+    @property
+    def sessions(self) -> int:
+        # not __len__: an empty storage would be falsy and Dispatcher would swap in its own
+        return len(self._sessions)
+
+    def memory_usage(self) -> int:
+        total = sys.getsizeof(self._sessions)
+        for session in self._sessions.values():
+            total += sys.getsizeof(session) + sys.getsizeof(session.data)
+            total += sum(sys.getsizeof(value) for value in session.data.values())
+        return total
+
+    async def close(self) -> None:
+        self._sessions.clear()
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        state = state.state if isinstance(state, State) else state
+        session = self._session(key, create=state is not None)
+        if session is None:
+            return
+        session.state = state
+        self._drop_if_empty(key, session)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        session = self._session(key)
+        return session.state if session is not None else None
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        session = self._session(key, create=bool(data))
+        if session is None:
+            return
+        session.data = dict(data)
+        self._drop_if_empty(key, session)
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        session = self._session(key)
+        return dict(session.data) if session is not None else {}
+
+    def _session(self, key: StorageKey, create: bool = False) -> Optional[Session]:
+        now = time.monotonic()
+        self.expire(now)
+        session = self._sessions.get(key)
+        if session is None:
+            if not create:
+                return None
+            session = self._sessions[key] = Session()
+            if len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+                self.evicted += 1
+        else:
+            self._sessions.move_to_end(key)
+        session.expires = now + self.ttl
+        return session
+
+    def expire(self, now: Optional[float] = None) -> None:
+        now = time.monotonic() if now is None else now
+        sessions = self._sessions
+        while sessions:
+            key, session = next(iter(sessions.items()))
+            if session.expires > now:
+                return
+            del sessions[key]
+            self.expired += 1
+
+    def _drop_if_empty(self, key: StorageKey, session: Session) -> None:
+        if session.state is None and not session.data:
+            del self._sessions[key]
+
+
+def create_fsm_storage(backend: str = 'memory', url: Optional[str] = None, ttl: int = SESSION_TTL) -> BaseStorage:
+    if backend == 'memory':
+        return TTLMemoryStorage(ttl)
+    if backend == 'redis':
+        # needs the optional redis package; any server speaking the Redis protocol will do
+        from aiogram.fsm.storage.redis import RedisStorage
+        return RedisStorage.from_url(url or 'redis://localhost:6379/0', state_ttl=ttl, data_ttl=ttl)
+    raise ValueError(f"Unknown FSM storage backend: {backend}")
+
+
+async def session_stats(storage: BaseStorage) -> Dict[str, int]:
+    if isinstance(storage, TTLMemoryStorage):
+        storage.expire()
+        return {
+            'sessions': storage.sessions,
+            'memory_bytes': storage.memory_usage(),
+            'expired': storage.expired,
+            'evicted': storage.evicted,
+        }
+    redis = getattr(storage, 'redis', None)
+    if redis is None:
+        return {}
+    prefix = getattr(storage.key_builder, 'prefix', 'fsm')
+    sessions = 0
+    async for _ in redis.scan_iter(match=f"{prefix}:*:state", count=1000):
+        sessions += 1
+    from redis.exceptions import ResponseError
+    try:
+        info = await redis.info('memory')
+    except ResponseError:
+        # minimal Redis-protocol stand-ins may not implement INFO
+        return {'sessions': sessions}
+    return {'sessions': sessions, 'memory_bytes': int(info.get('used_memory', 0))}
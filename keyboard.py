@@ -0,0 +1,227 @@
+from calendar import monthcalendar
+from functools import lru_cache
+from aiogram import types
+
+from callbacks import pack
+from timezones import TIMEZONE_OPTIONS
+
+CALENDAR_CACHE_SIZE = 128
+HOUR_CACHE_SIZE = 32
+YEAR_CACHE_SIZE = 16
+
+REMINDER_EMOJI = {
+    'default': '⏰',
+    'birthday': '🎂',
+    'meeting': '👥',
+    'holiday': '🎉',
+    'task': '📝'
+}
+
+REMINDER_TYPES = [
+    ('Обычное', 'default'),
+    ('День рождения', 'birthday'),
+    ('Встреча', 'meeting'),
+    ('Праздник', 'holiday'),
+    ('Задача', 'task')
+]
+
+REPEAT_OPTIONS = [
+    ('Не повторять', 'none'),
+    ('Каждый день', 'daily'),
+    ('Каждую неделю', 'weekly'),
+    ('Каждый месяц', 'monthly'),
+    ('Каждый год', 'yearly')
+]
+
+@lru_cache(maxsize=None)
+def create_time_keyboard() -> types.InlineKeyboardMarkup:
+    keyboard = []
+    for hour in range(0, 24, 3):
+        row = []
+        for h in range(hour, min(hour + 3, 24)):
+            row.append(types.InlineKeyboardButton(
+                text=f"{h:02d}:00",
+                callback_data=pack("hour", f"{h:02d}")
+            ))
+        keyboard.append(row)
+    
+    keyboard.append([
+        types.InlineKeyboardButton(
+            text="« Назад к календарю",
+            callback_data=pack("back_to_calendar")
+        )
+    ])
+    
+    return types.InlineKeyboardMarkup(inline_keyboard=keyboard)
+
+@lru_cache(maxsize=HOUR_CACHE_SIZE)
+def create_minutes_keyboard(hour: str) -> types.InlineKeyboardMarkup:
+    keyboard = []
+    for i in range(0, 60, 15):
+        row = []
+        for j in range(0, 3):
+            minute = i + (j * 5)
+            if minute < 60:
+                row.append(types.InlineKeyboardButton(
+                    text=f"{hour}:{minute:02d}",
+                    callback_data=pack("minute", hour, f"{minute:02d}")
+                ))
+        keyboard.append(row)
+    
+    keyboard.append([
+        types.InlineKeyboardButton(
+            text="« Назад к выбору часа",
+            callback_data=pack("back_to_hours")
+        )
+    ])
+    keyboard.append([
+        types.InlineKeyboardButton(
+            text="« Назад к календарю",
+            callback_data=pack("back_to_calendar")
+        )
+    ])
+    
+    return types.InlineKeyboardMarkup(inline_keyboard=keyboard)
+
+@lru_cache(maxsize=YEAR_CACHE_SIZE)
+def create_year_month_keyboard(current_year: int) -> types.InlineKeyboardMarkup:
+    keyboard = []
+    month_names = ['Январь', 'Февраль', 'Март', 'Апрель', 'Май', 'Июнь', 
+                   'Июль', 'Август', 'Сентябрь', 'Октябрь', 'Ноябрь', 'Декабрь']
+    
+    keyboard.append([
+        types.InlineKeyboardButton(text='⬅️', callback_data=pack('months', current_year - 1)),
+        types.InlineKeyboardButton(text=f"📅 {current_year}", callback_data=pack('ignore')),
+        types.InlineKeyboardButton(text='➡️', callback_data=pack('months', current_year + 1))
+    ])
+    
+    for i in range(0, 12, 3):
+        row = []
+        for j in range(3):
+            if i + j < 12:
+                month_num = i + j + 1
+                row.append(types.InlineKeyboardButton(
+                    text=month_names[i + j],
+                    callback_data=pack('calendar', current_year, month_num)
+                ))
+        keyboard.append(row)
+    
+    return types.InlineKeyboardMarkup(inline_keyboard=keyboard)
+
+@lru_cache(maxsize=CALENDAR_CACHE_SIZE)
+def create_calendar_keyboard(year: int, month: int) -> types.InlineKeyboardMarkup:
+    keyboard = []
+    month_names = [
+        'Январь', 'Февраль', 'Март', 'Апрель', 'Май', 'Июнь',
+        'Июль', 'Август', 'Сентябрь', 'Октябрь', 'Ноябрь', 'Декабрь'
+    ]
+    
+    keyboard.append([
+        types.InlineKeyboardButton(
+            text=f"📅 {month_names[month-1]} {year}",
+            callback_data=pack('months', year)
+        )
+    ])
+    
+    days_of_week = ['Пн', 'Вт', 'Ср', 'Чт', 'Пт', 'Сб', 'Вс']
+    keyboard.append([
+        types.InlineKeyboardButton(text=day, callback_data=pack('ignore'))
+        for day in days_of_week
+    ])
+    
+    month_calendar = monthcalendar(year, month)
+    
+    for week in month_calendar:
+        row = []
+        for day in week:
+            if day == 0:
+                row.append(types.InlineKeyboardButton(text=' ', callback_data=pack('ignore')))
+            else:
+                row.append(types.InlineKeyboardButton(
+                    text=str(day),
+                    callback_data=pack('day', year, month, day)
+                ))
+        keyboard.append(row)
+    
+    nav_row = []
+    
+    prev_month = month - 1
+    prev_year = year
+    if prev_month == 0:
+        prev_month = 12
+        prev_year -= 1
+    
+    next_month = month + 1
+    next_year = year
+    if next_month == 13:
+        next_month = 1
+        next_year += 1
+    
+    nav_row.extend([
+        types.InlineKeyboardButton(
+            text='⬅️',
+            callback_data=pack('calendar', prev_year, prev_month)
+        ),
+        types.InlineKeyboardButton(
+            text='➡️',
+            callback_data=pack('calendar', next_year, next_month)
+        )
+    ])
+    keyboard.append(nav_row)
+    
+    return types.InlineKeyboardMarkup(inline_keyboard=keyboard)
+
+@lru_cache(maxsize=None)
+def create_reminder_type_keyboard() -> types.InlineKeyboardMarkup:
+    keyboard = []
+    for name, callback in REMINDER_TYPES:
+        keyboard.append([
+            types.InlineKeyboardButton(
+                text=f"{REMINDER_EMOJI[callback]} {name}",
+                callback_data=pack("type", callback)
+            )
+        ])
+    return types.InlineKeyboardMarkup(inline_keyboard=keyboard)
+
+@lru_cache(maxsize=len(TIMEZONE_OPTIONS) + 1)
+def create_timezone_keyboard(current: str) -> types.InlineKeyboardMarkup:
+    keyboard = [
+        [types.InlineKeyboardButton(text=f"✅ {name}" if tz == current else name, callback_data=pack("tz", tz))]
+        for name, tz in TIMEZONE_OPTIONS
+    ]
+    return types.InlineKeyboardMarkup(inline_keyboard=keyboard)
+
+@lru_cache(maxsize=None)
+def create_repeat_keyboard() -> types.InlineKeyboardMarkup:
+    keyboard = [
+        [types.InlineKeyboardButton(text=f"🔁 {name}" if kind != 'none' else name, callback_data=pack("repeat", kind))]
+        for name, kind in REPEAT_OPTIONS
+    ]
+    keyboard.append([
+        types.InlineKeyboardButton(
+            text="« Назад к календарю",
+            callback_data=pack("back_to_calendar")
+        )
+    ])
+    return types.InlineKeyboardMarkup(inline_keyboard=keyboard)
+
+@lru_cache(maxsize=None)
+def create_main_keyboard() -> types.ReplyKeyboardMarkup:
+    keyboard = [
+        [
+            types.KeyboardButton(text="Установить напоминание")
+        ],
+        [
+            types.KeyboardButton(text="Мои напоминания"),
+            types.KeyboardButton(text="Часовой пояс")
+        ],
+        [
+            types.KeyboardButton(text="Изменить напоминание"),
+            types.KeyboardButton(text="Удалить напоминания")
+        ]
+    ]
+    
+    return types.ReplyKeyboardMarkup(
+        keyboard=keyboard,
+        resize_keyboard=True
+    )
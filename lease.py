@@ -0,0 +1,117 @@
+import asyncio
+import os
+import socket
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+LEASE_TTL = 15
+LEASE_HEARTBEAT = 5
+
+
+class Lease:
+    # a lock row shared by replicas through one SQLite file: whoever holds an unexpired row
+    # owns the scheduler, and only the holder may move the "fired up to" watermark
+    def __init__(self, path: str = 'reminders.db', name: str = 'scheduler', owner: Optional[str] = None,
+                 ttl: float = LEASE_TTL):
+        self.path = path
+        self.name = name
+        self.owner = owner or f"{socket.gethostname()}:{os.getpid()}"
+        self.ttl = ttl
+        self.fired_up_to: Optional[int] = None
+        self._deadline = 0.0
+        self._conn: Optional[sqlite3.Connection] = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='lease')
+
+    @property
+    def held(self) -> bool:
+        # judged on the local monotonic clock from when the last renewal was sent,
+        # so the holder gives up before any other replica can see the row as expired
+        return time.monotonic() < self._deadline
+
+    async def acquire(self) -> bool:
+        started = time.monotonic()
+        fired_up_to = await self._call(self._acquire)
+        if fired_up_to is None:
+            self._deadline = 0.0
+            return False
+        self._deadline = started + self.ttl
+        # 0 means no leader has fired anything yet
+        self.fired_up_to = fired_up_to or None
+        return True
+
+    async def renew(self, fired_up_to: Optional[float] = None) -> bool:
+        started = time.monotonic()
+        try:
+            renewed = await self._call(self._renew, int(fired_up_to or 0))
+        except sqlite3.OperationalError as e:
+            # a busy or locked database is retried on the next heartbeat while the lease lasts
+            print(f"Error renewing scheduler lease: {e}")
+            return self.held
+        self._deadline = started + self.ttl if renewed else 0.0
+        return renewed
+
+    async def release(self) -> None:
+        self._deadline = 0.0
+        try:
+            await self._call(self._release)
+        except sqlite3.Error as e:
+            print(f"Error releasing scheduler lease: {e}")
+
+    async def close(self) -> None:
+        if self._conn is not None:
+            await self._call(self._conn.close)
+            self._conn = None
+        self._executor.shutdown(wait=True)
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, timeout=self.ttl / 3, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS scheduler_lease (
+                    name TEXT PRIMARY KEY,
+                    owner TEXT NOT NULL,
+                    expires_at REAL NOT NULL,
+                    fired_up_to INTEGER NOT NULL DEFAULT 0
+                )
+                """
+            )
+        return self._conn
+
+    def _acquire(self) -> Optional[int]:
+        conn = self._connect()
+        now = time.time()
+        with conn:
+            claimed = conn.execute(
+                "INSERT INTO scheduler_lease (name, owner, expires_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at "
+                "WHERE scheduler_lease.owner = excluded.owner OR scheduler_lease.expires_at <= ?",
+                (self.name, self.owner, now + self.ttl, now)
+            ).rowcount
+            if not claimed:
+                return None
+            return conn.execute("SELECT fired_up_to FROM scheduler_lease WHERE name = ?", (self.name,)).fetchone()[0]
+
+    def _renew(self, fired_up_to: int) -> bool:
+        conn = self._connect()
+        now = time.time()
+        with conn:
+            return conn.execute(
+                "UPDATE scheduler_lease SET expires_at = ?, fired_up_to = max(fired_up_to, ?) "
+                "WHERE name = ? AND owner = ? AND expires_at > ?",
+                (now + self.ttl, fired_up_to, self.name, self.owner, now)
+            ).rowcount > 0
+
+    def _release(self) -> None:
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                "UPDATE scheduler_lease SET expires_at = 0 WHERE name = ? AND owner = ?",
+                (self.name, self.owner)
+            )
+
+    async def _call(self, func: Callable, *args) -> Any:
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
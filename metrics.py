@@ -0,0 +1,206 @@
+import bisect
+import inspect
+import time
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+from aiohttp import web
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+LAG_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300, 900, 3600)
+SIZE_BUCKETS = (1, 10, 100, 1000, 10000, 100000)
+DRIFT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+BYTES_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+Sample = Tuple[str, Tuple[Tuple[str, str], ...], float]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(pairs: Sequence[Tuple[str, str]]) -> str:
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _number(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Metric:
+    kind = 'untyped'
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values: Dict[Tuple[str, ...], Any] = {}
+        REGISTRY.register(self)
+
+    def samples(self) -> Iterator[Sample]:
+        for values, value in sorted(self._values.items()):
+            yield self.name, tuple(zip(self.labels, values)), value
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        self._values[labels] = self._values.get(labels, 0.0) + amount
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def set(self, value: float, *labels: str) -> None:
+        self._values[labels] = value
+
+
+class Histogram(Metric):
+    # per label set: [bucket counts (the last one past every bound), sum, count]; made cumulative only when scraped
+    kind = 'histogram'
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, *labels: str) -> None:
+        state = self._values.get(labels)
+        if state is None:
+            state = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        state[0][bisect.bisect_left(self.buckets, value)] += 1
+        state[1] += value
+        state[2] += 1
+
+    def samples(self) -> Iterator[Sample]:
+        for values, (counts, total, count) in sorted(self._values.items()):
+            labels = tuple(zip(self.labels, values))
+            cumulative = 0
+            for bound, bucket in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket
+                yield self.name + '_bucket', labels + (('le', _number(bound)),), cumulative
+            yield self.name + '_sum', labels, total
+            yield self.name + '_count', labels, count
+
+
+class Collector:
+    # a metric read from existing state at scrape time, so the hot path pays nothing for it;
+    # read returns one value or {label values: value}, and may be a coroutine
+    def __init__(self, name: str, help: str, kind: str, read: Callable[[], Any], labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.kind = kind
+        self.read = read
+        self.labels = tuple(labels)
+
+    async def collect(self) -> List[Sample]:
+        values = self.read()
+        if inspect.isawaitable(values):
+            values = await values
+        if not isinstance(values, dict):
+            values = {(): values}
+        return [(self.name, tuple(zip(self.labels, key)), value) for key, value in values.items()]
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, Union[Metric, Collector]] = {}
+
+    def register(self, metric: Union[Metric, Collector]) -> None:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name!r} is already registered")
+        self._metrics[metric.name] = metric
+
+    def collector(self, name: str, help: str, kind: str, read: Callable[[], Any], labels: Sequence[str] = ()) -> None:
+        # replaces an earlier collector of the same name, e.g. when a process instruments a new dispatcher
+        self._metrics.pop(name, None)
+        self.register(Collector(name, help, kind, read, labels))
+
+    async def render(self) -> str:
+        lines = []
+        for metric in list(self._metrics.values()):
+            try:
+                samples = await metric.collect() if isinstance(metric, Collector) else list(metric.samples())
+            except Exception as e:
+                print(f"Error collecting metric {metric.name}: {e}")
+                continue
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(f"{name}{_labels(labels)} {_number(value)}" for name, labels, value in samples)
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+UPDATES = Counter('reminder_bot_updates_total', "Updates received, by update type", ['type'])
+HANDLER_SECONDS = Histogram('reminder_bot_handler_seconds', "Handler run time, by handler function", ['handler'])
+HANDLER_ERRORS = Counter('reminder_bot_handler_errors_total', "Handlers that raised, by handler function", ['handler'])
+FIRE_LAG = Histogram(
+    'reminder_bot_fire_lag_seconds', "Time from a reminder's due time to its message being sent", buckets=LAG_BUCKETS
+)
+STAGE_LAG = Histogram(
+    'reminder_bot_stage_lag_seconds', "How late the scheduler handed a reminder over for sending",
+    buckets=LAG_BUCKETS
+)
+LOOP_DRIFT = Histogram(
+    'reminder_bot_loop_drift_seconds', "How late each event loop heartbeat woke up", buckets=DRIFT_BUCKETS
+)
+LOOP_STALLS = Counter('reminder_bot_loop_stalls_total', "Heartbeats delayed past the stall threshold")
+PERSISTENCE_WAIT = Histogram(
+    'reminder_bot_persistence_wait_seconds', "Time a storage call kept its caller waiting on persistence", ['backend']
+)
+PERSISTENCE_SECONDS = Histogram(
+    'reminder_bot_persistence_write_seconds', "Duration of one storage write batch", ['backend']
+)
+PERSISTENCE_RECORDS = Histogram(
+    'reminder_bot_persistence_write_records', "Records in one storage write batch", ['backend'], SIZE_BUCKETS
+)
+PERSISTENCE_BYTES = Histogram(
+    'reminder_bot_persistence_write_bytes', "Bytes appended to the reminder log in one write", buckets=BYTES_BUCKETS
+)
+
+
+class UpdateMetrics:
+    # outer update middleware: counts every update before routing decides what handles it
+    async def __call__(self, handler: Callable[[Any, Dict[str, Any]], Awaitable[Any]], event: Any,
+                       data: Dict[str, Any]) -> Any:
+        UPDATES.inc(event.event_type)
+        return await handler(event, data)
+
+
+class HandlerMetrics:
+    # inner middleware for a router observer; handlers are labelled by function name, never by message
+    # text or callback data, and resolve maps a dispatching handler to the one it dispatches to
+    def __init__(self, resolve: Optional[Callable[[Any], Optional[str]]] = None):
+        self.resolve = resolve
+
+    async def __call__(self, handler: Callable[[Any, Dict[str, Any]], Awaitable[Any]], event: Any,
+                       data: Dict[str, Any]) -> Any:
+        name = data['handler'].callback.__name__
+        if self.resolve is not None:
+            name = self.resolve(event) or name
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception:
+            HANDLER_ERRORS.inc(name)
+            raise
+        finally:
+            HANDLER_SECONDS.observe(time.perf_counter() - started, name)
+
+
+async def start_metrics_server(host: str, port: int, registry: Registry = REGISTRY) -> web.AppRunner:
+    async def handle(request: web.Request) -> web.Response:
+        return web.Response(body=(await registry.render()).encode('utf-8'), headers={'Content-Type': CONTENT_TYPE})
+
+    app = web.Application()
+    app.router.add_get('/metrics', handle)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    print(f"Metrics on http://{host}:{port}/metrics")
+    return runner
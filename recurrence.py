@@ -0,0 +1,127 @@
+from datetime import date, datetime, time
+from functools import lru_cache
+from typing import Dict, FrozenSet, List, Optional, Tuple
+
+from timezones import get_zone, local_time, local_to_epoch
+
+RULE_CACHE_SIZE = 4096
+# a rule that matches nothing (e.g. 31 February) stops the search instead of looping forever
+MAX_SEARCH_DAYS = 8 * 366
+
+
+def _field(value: str, low: int, high: int) -> Optional[FrozenSet[int]]:
+    # None stands for "*"; lists, ranges and steps as in cron ("1,15", "1-5", "*/2")
+    if value == '*':
+        return None
+    result = set()
+    for part in value.split(','):
+        part, _, step = part.partition('/')
+        if part == '*':
+            start, end = low, high
+        elif '-' in part:
+            start, end = map(int, part.split('-'))
+        else:
+            start = end = int(part)
+        if not low <= start <= end <= high:
+            raise ValueError(f"Value {value!r} is out of range {low}-{high}")
+        result.update(range(start, end + 1, int(step or 1)))
+    return frozenset(result)
+
+
+class Recurrence:
+    # a cron rule "minute hour day-of-month month day-of-week" in local time;
+    # next dates are cached per day, so reminders sharing a rule are re-armed with dict lookups
+    __slots__ = ('rule', 'times', 'days', 'months', 'weekdays', '_next_date')
+
+    def __init__(self, rule: str):
+        fields = rule.split()
+        if len(fields) != 5:
+            raise ValueError(f"Recurrence rule needs 5 fields, got {rule!r}")
+        minutes = _field(fields[0], 0, 59)
+        hours = _field(fields[1], 0, 23)
+        self.rule = rule
+        self.times: List[Tuple[int, int]] = sorted(
+            (hour, minute) for hour in (hours or range(24)) for minute in (minutes or range(60))
+        )
+        self.days = _field(fields[2], 1, 31)
+        self.months = _field(fields[3], 1, 12)
+        weekdays = _field(fields[4], 0, 7)
+        # cron counts Sunday as 0 or 7; isoweekday() % 7 gives the same numbering
+        self.weekdays = frozenset(day % 7 for day in weekdays) if weekdays is not None else None
+        self._next_date: Dict[int, int] = {}
+
+    def matches(self, day: date) -> bool:
+        if self.months is not None and day.month not in self.months:
+            return False
+        if self.days is None and self.weekdays is None:
+            return True
+        # cron semantics: when both day fields are restricted, matching either one is enough
+        return (
+            (self.days is not None and day.day in self.days)
+            or (self.weekdays is not None and day.isoweekday() % 7 in self.weekdays)
+        )
+
+    def next_date(self, ordinal: int) -> int:
+        # first matching day strictly after the given one
+        cached = self._next_date.get(ordinal)
+        if cached is not None:
+            return cached
+        for candidate in range(ordinal + 1, ordinal + MAX_SEARCH_DAYS):
+            if self.matches(date.fromordinal(candidate)):
+                if len(self._next_date) >= RULE_CACHE_SIZE:
+                    self._next_date.clear()
+                self._next_date[ordinal] = candidate
+                return candidate
+        raise ValueError(f"Recurrence rule {self.rule!r} never matches")
+
+    def after(self, moment: datetime) -> datetime:
+        day = moment.date()
+        if self.matches(day):
+            current = (moment.hour, moment.minute)
+            for hour, minute in self.times:
+                if (hour, minute) > current:
+                    return datetime.combine(day, time(hour, minute))
+        hour, minute = self.times[0]
+        return datetime.combine(date.fromordinal(self.next_date(day.toordinal())), time(hour, minute))
+
+
+@lru_cache(maxsize=RULE_CACHE_SIZE)
+def parse_rule(rule: str) -> Recurrence:
+    return Recurrence(rule)
+
+
+def next_occurrence(rule: str, after: float, tz: Optional[str] = None) -> int:
+    # rules follow the wall clock of the zone the reminder was set in, so 09:00 stays 09:00 across DST
+    zone = get_zone(tz)
+    recurrence = parse_rule(rule)
+    moment = local_time(int(after), zone)
+    while True:
+        moment = recurrence.after(moment)
+        due = local_to_epoch(moment, zone)
+        # when clocks go back, the earlier reading of a repeated hour can lie before `after`
+        if due > after:
+            return due
+
+
+def make_rule(kind: str, moment: datetime) -> Optional[str]:
+    if kind == 'daily':
+        return f"{moment.minute} {moment.hour} * * *"
+    if kind == 'weekly':
+        return f"{moment.minute} {moment.hour} * * {moment.isoweekday() % 7}"
+    if kind == 'monthly':
+        return f"{moment.minute} {moment.hour} {moment.day} * *"
+    if kind == 'yearly':
+        return f"{moment.minute} {moment.hour} {moment.day} {moment.month} *"
+    return None
+
+
+def rule_kind(rule: str) -> str:
+    # the make_rule preset a rule corresponds to; render.py holds the names shown for each
+    _, _, days, months, weekdays = rule.split()
+    if weekdays != '*':
+        return 'weekly'
+    if months != '*':
+        return 'yearly'
+    if days != '*':
+        return 'monthly'
+    return 'daily'
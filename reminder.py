@@ -0,0 +1,86 @@
+import time
+from enum import Enum
+from typing import Optional
+
+ID_EPOCH_MS = 1704067200000
+NODE_BITS = 10
+SEQUENCE_BITS = 12
+MAX_NODE = (1 << NODE_BITS) - 1
+SEQUENCE_MASK = (1 << SEQUENCE_BITS) - 1
+
+# delivery states: waiting to fire, fired and awaiting a confirmed send, given up on
+PENDING = 'pending'
+OUTBOX = 'outbox'
+DEAD = 'dead'
+
+
+class ReminderType(str, Enum):
+    DEFAULT = 'default'
+    BIRTHDAY = 'birthday'
+    MEETING = 'meeting'
+    HOLIDAY = 'holiday'
+    TASK = 'task'
+
+
+class Reminder:
+    __slots__ = ('id', 'due', 'text', 'type', 'tz', 'status', 'attempts', 'repeat')
+
+    def __init__(self, id: int, due: int, text: str, type: ReminderType = ReminderType.DEFAULT,
+                 tz: Optional[str] = None, status: str = PENDING, attempts: int = 0, repeat: Optional[str] = None):
+        self.id = id
+        self.due = due
+        self.text = text
+        self.type = type
+        self.tz = tz
+        self.status = status
+        self.attempts = attempts
+        # cron-style rule for recurring reminders; due is always just the next occurrence
+        self.repeat = repeat
+
+    def __lt__(self, other: 'Reminder') -> bool:
+        # per-user indexes keep reminders ordered by due time, ties broken by id
+        return (self.due, self.id) < (other.due, other.id)
+
+    def __repr__(self) -> str:
+        return f"Reminder(id={self.id}, due={self.due}, type={self.type.value}, text={self.text!r})"
+
+    def to_dict(self) -> dict:
+        data = {'id': self.id, 'due': self.due, 'text': self.text, 'type': self.type.value}
+        if self.tz is not None:
+            data['tz'] = self.tz
+        if self.repeat is not None:
+            data['repeat'] = self.repeat
+        if self.status != PENDING:
+            data['status'] = self.status
+            data['attempts'] = self.attempts
+        return data
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'Reminder':
+        return cls(
+            data['id'], data['due'], data['text'], ReminderType(data.get('type', 'default')),
+            data.get('tz'), data.get('status', PENDING), data.get('attempts', 0), data.get('repeat')
+        )
+
+
+class IdGenerator:
+    # snowflake layout: milliseconds since 2024-01-01 UTC | node | per-millisecond sequence
+    def __init__(self, node: int = 0):
+        if not 0 <= node <= MAX_NODE:
+            raise ValueError(f"Node id must be between 0 and {MAX_NODE}, got {node}")
+        self.node = node
+        self._last = 0
+        self._sequence = 0
+
+    def next(self) -> int:
+        now = time.time_ns() // 1000000 - ID_EPOCH_MS
+        if now <= self._last:
+            # same millisecond or the clock stepped back: keep counting on from the last id
+            now = self._last
+            self._sequence = (self._sequence + 1) & SEQUENCE_MASK
+            if self._sequence == 0:
+                now += 1
+        else:
+            self._sequence = 0
+        self._last = now
+        return (now << (NODE_BITS + SEQUENCE_BITS)) | (self.node << SEQUENCE_BITS) | self._sequence
@@ -0,0 +1,181 @@
+from datetime import datetime
+from typing import Dict, Iterable, Optional
+from zoneinfo import ZoneInfo
+
+from keyboard import REMINDER_EMOJI, REMINDER_TYPES
+from recurrence import rule_kind
+from reminder import DEAD, Reminder
+
+DEFAULT_LANGUAGE = 'ru'
+
+RU = {
+    # genitive month names as used in dates ("24 января 2030"), index 0 unused
+    'months': (
+        '', 'января', 'февраля', 'марта', 'апреля', 'мая', 'июня',
+        'июля', 'августа', 'сентября', 'октября', 'ноября', 'декабря'
+    ),
+    'types': {callback: name for name, callback in REMINDER_TYPES},
+    'repeats': {
+        'daily': 'каждый день',
+        'weekly': 'каждую неделю',
+        'monthly': 'каждый месяц',
+        'yearly': 'каждый год',
+    },
+    'created': 'создано',
+    'updated': 'изменено',
+    'confirmation': (
+        "✅ Напоминание {action}\n\n"
+        "📅 <b>Дата:</b> {date}\n"
+        "⏰ <b>Время:</b> {time}\n"
+        "{emoji} <b>Тип:</b> {type_name}\n"
+        "📝 <b>Текст:</b> {text}\n"
+        "{repeat}{note}"
+        "\n<i>Я напомню вам об этом {date} в {time}</i>"
+    ),
+    'confirmation_repeat': "🔁 <b>Повтор:</b> {repeat}\n",
+    'skipped_note': "⚠️ В этот день часы переводятся вперёд, и {time} не наступит\n",
+    'ambiguous_note': "⚠️ В этот день часы переводятся назад, напомню при первом наступлении {time}\n",
+    'list_header': "📋 <b>Ваши напоминания</b>\n\nВсего напоминаний: {total}\n\n",
+    'list_date': "📅 <b>{date}</b>\n",
+    'list_item': "┌ <b>{time}</b>\n├ {emoji} <i>{type_name}</i>{repeat}{dead}\n└ {text}\n\n",
+    'list_repeat': " · 🔁 {repeat}",
+    'list_dead': " · ⚠️ не доставлено",
+    'repeat_line': "Повтор: {repeat} 🔁\n",
+    'list_footer': (
+        "\n<i>💡 Управление напоминаниями:</i>\n"
+        "• Изменить напоминание - нажмите соответствующую кнопку\n"
+        "• Удалить напоминание - используйте кнопку удаления"
+    ),
+    'fired': (
+        "🔔 <b>Напоминание!</b>\n\n"
+        "{emoji} <b>Тип:</b> {type_name}\n"
+        "📝 <b>Сообщение:</b> {text}\n\n"
+        "<i>Установлено на: {when}</i>"
+    ),
+    'fired_fallback': "⏰ Напоминание: {text}",
+    'help': (
+        "❓ Добро пожаловать в справочник бота!\n\n"
+        "<b>Основные команды:</b>\n"
+        "• /start - Запустить бота\n"
+        "• /help - Показать это сообщение\n"
+        "• /timezone - Выбрать часовой пояс (или /timezone Europe/Berlin)\n\n"
+        "<b>Типы напоминаний:</b>\n"
+        "• {default} Обычное - повседневные дела\n"
+        "• {birthday} День рождения - праздники друзей\n"
+        "• {meeting} Встреча - деловые встречи\n"
+        "• {holiday} Праздник - особые события\n"
+        "• {task} Задача - важные дела\n\n"
+        "<b>Как установить напоминание:</b>\n"
+        "1. Нажмите \"Установить напоминание\"\n"
+        "2. Выберите тип напоминания\n"
+        "3. Укажите дату в календаре\n"
+        "4. Выберите время с помощью кнопок\n"
+        "5. Выберите, повторять ли напоминание (каждый день, неделю, месяц или год)\n"
+        "6. Введите текст напоминания\n\n"
+        "<b>Управление напоминаниями:</b>\n"
+        "• 📋 \"Мои напоминания\" - список всех напоминаний\n"
+        "• ✏️ \"Изменить напоминание\" - редактирование\n"
+        "• 🗑 \"Удалить напоминание\" - удаление\n\n"
+        "💡 Совет дня: Используйте разные типы напоминаний для лучшей организации задач."
+    ),
+}
+
+
+class Locale:
+    # everything a message needs, resolved once: lookup tables and the bound format method of each template,
+    # so rendering never touches strftime, the process locale or a linear search
+    def __init__(self, table: dict):
+        self.months = table['months']
+        self.types: Dict[str, str] = table['types']
+        self.default_type = self.types['default']
+        self.repeats: Dict[str, str] = table['repeats']
+        self.created = table['created']
+        self.updated = table['updated']
+        self.confirmation = table['confirmation'].format
+        self.confirmation_repeat = table['confirmation_repeat'].format
+        self.skipped_note = table['skipped_note'].format
+        self.ambiguous_note = table['ambiguous_note'].format
+        self.list_header = table['list_header'].format
+        self.list_date = table['list_date'].format
+        self.list_item = table['list_item'].format
+        self.list_repeat = table['list_repeat'].format
+        self.list_dead = table['list_dead']
+        self.list_footer = table['list_footer']
+        self.repeat_line = table['repeat_line'].format
+        self.fired = table['fired'].format
+        self.fired_fallback = table['fired_fallback'].format
+        self.help = table['help'].format(**REMINDER_EMOJI)
+
+    def type_name(self, rem_type: str) -> str:
+        return self.types.get(rem_type, self.default_type)
+
+    def repeat_name(self, rule: str) -> str:
+        return self.repeats[rule_kind(rule)]
+
+    def date(self, moment: datetime) -> str:
+        return f"{moment.day:02d} {self.months[moment.month]} {moment.year}"
+
+
+# a language is added by writing its table and registering it here
+LOCALES: Dict[str, Locale] = {
+    'ru': Locale(RU),
+}
+
+
+def get_locale(language: Optional[str] = None) -> Locale:
+    # Telegram's language_code may carry a region ("ru-RU"); unknown languages get the default
+    return LOCALES.get((language or DEFAULT_LANGUAGE)[:2], LOCALES[DEFAULT_LANGUAGE])
+
+
+def clock(moment: datetime) -> str:
+    return f"{moment.hour:02d}:{moment.minute:02d}"
+
+
+def render_confirmation(locale: Locale, moment: datetime, rem_type: str, text: str, repeat: Optional[str] = None,
+                        note: str = "", updated: bool = False) -> str:
+    return locale.confirmation(
+        action=locale.updated if updated else locale.created,
+        date=locale.date(moment),
+        time=clock(moment),
+        emoji=REMINDER_EMOJI[rem_type],
+        type_name=locale.type_name(rem_type),
+        text=text,
+        repeat=locale.confirmation_repeat(repeat=locale.repeat_name(repeat)) if repeat else "",
+        note=note,
+    )
+
+
+def render_list(locale: Locale, items: Iterable[Reminder], zone: ZoneInfo, total: int, text_limit: int,
+                footer: bool = True) -> str:
+    parts = [locale.list_header(total=total)]
+    last_date = None
+    for rem in items:
+        # only the fields are read, so the aware datetime is used as is
+        moment = datetime.fromtimestamp(rem.due, zone)
+        day = moment.date()
+        if day != last_date:
+            last_date = day
+            parts.append(locale.list_date(date=locale.date(moment)))
+        text = rem.text
+        parts.append(locale.list_item(
+            time=clock(moment),
+            emoji=REMINDER_EMOJI.get(rem.type, '⏰'),
+            type_name=locale.type_name(rem.type),
+            repeat=locale.list_repeat(repeat=locale.repeat_name(rem.repeat)) if rem.repeat else "",
+            # delivery gave up on it; it stays listed so the user can see it and edit or delete it
+            dead=locale.list_dead if rem.status == DEAD else "",
+            text=text[:text_limit] + ('...' if len(text) > text_limit else ''),
+        ))
+    if footer:
+        parts.append(locale.list_footer)
+    return ''.join(parts)
+
+
+def render_fired(locale: Locale, reminder: Reminder, zone: ZoneInfo) -> str:
+    moment = datetime.fromtimestamp(reminder.due, zone)
+    return locale.fired(
+        emoji=REMINDER_EMOJI[reminder.type],
+        type_name=locale.type_name(reminder.type),
+        text=reminder.text,
+        when=f"{moment.day:02d}.{moment.month:02d}.{moment.year} {clock(moment)}",
+    )
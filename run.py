@@ -1,17 +1,264 @@
-import asyncio
-from aiogram import Bot, Dispatcher
-
-from set import router
-
-from config import TOKEN
-
-async def main():
-    bot = Bot(token=TOKEN)
-    dp = Dispatcher()
-    dp.include_router(router)
-    
-    await dp.start_polling(bot)
-    
-
-if __name__ == "__main__":
-    asyncio.run(main())
+import argparse
+import asyncio
+import os
+import signal
+import sys
+import time
+from functools import partial
+from typing import Optional
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from aiohttp import web
+
+from fsm import create_fsm_storage, session_stats
+from lease import Lease
+from metrics import REGISTRY, HandlerMetrics, UpdateMetrics, start_metrics_server
+from shards import ShardRouter, serve_updates, stdin_reader
+from stalls import HEARTBEAT_INTERVAL, STALL_THRESHOLD, LoopWatchdog
+from set import (
+    router, callback, scheduler, storage, delivery, in_flight, reminder_task, reminder_delivered, restore_reminders,
+    lead_scheduler
+)
+
+import config
+from config import TOKEN
+
+WEBHOOK_PATH = getattr(config, 'WEBHOOK_PATH', '/webhook')
+WEBHOOK_URL = getattr(config, 'WEBHOOK_URL', None)
+WEBHOOK_SECRET = getattr(config, 'WEBHOOK_SECRET', None)
+WEBHOOK_HOST = getattr(config, 'WEBHOOK_HOST', '0.0.0.0')
+WEBHOOK_PORT = getattr(config, 'WEBHOOK_PORT', 8080)
+WEBHOOK_CONCURRENCY = 100
+WEBHOOK_MAX_BODY = 1024 * 1024
+WEBHOOK_DRAIN_TIMEOUT = 30
+METRICS_HOST = getattr(config, 'METRICS_HOST', '127.0.0.1')
+# clear of 9100 and the ports after it, which node_exporter and the other Prometheus exporters take
+DEFAULT_METRICS_PORT = 19100
+METRICS_PORT = getattr(config, 'METRICS_PORT', None)
+WATCHDOG = getattr(config, 'WATCHDOG', os.getenv('REMINDER_WATCHDOG') == '1')
+LATE_THRESHOLD = 5
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Telegram reminder bot")
+    parser.add_argument('--webhook', action='store_true', help="receive updates through a webhook instead of polling")
+    parser.add_argument('--webhook-url', default=WEBHOOK_URL, help="public URL Telegram should post updates to")
+    parser.add_argument('--host', default=WEBHOOK_HOST)
+    parser.add_argument('--port', type=int, default=WEBHOOK_PORT)
+    parser.add_argument('--path', default=WEBHOOK_PATH)
+    parser.add_argument('--secret', default=WEBHOOK_SECRET, help="value expected in X-Telegram-Bot-Api-Secret-Token")
+    parser.add_argument('--max-concurrency', type=int, default=WEBHOOK_CONCURRENCY)
+    parser.add_argument('--max-body-size', type=int, default=WEBHOOK_MAX_BODY)
+    parser.add_argument('--drain-timeout', type=float, default=WEBHOOK_DRAIN_TIMEOUT)
+    parser.add_argument('--local', action='store_true', help="serve the webhook without registering it with Telegram")
+    parser.add_argument('--workers', type=int, default=1, help="shard users across this many worker processes")
+    parser.add_argument('--shard', type=int, default=None, help=argparse.SUPPRESS)
+    parser.add_argument('--replica', action='store_true',
+                        help="share reminders.db with other replicas; only the scheduler lease holder sends reminders")
+    parser.add_argument('--metrics-host', default=METRICS_HOST)
+    parser.add_argument('--metrics-port', type=int, default=METRICS_PORT,
+                        help=f"serve /metrics on this port (default {DEFAULT_METRICS_PORT}, 0 disables); "
+                             "shard workers use the following ports")
+    parser.add_argument('--watchdog', action='store_true', default=WATCHDOG,
+                        help="log event loop stalls with the blocking stack, and reminders sent late")
+    parser.add_argument('--stall-threshold', type=float, default=STALL_THRESHOLD,
+                        help="seconds the event loop may be blocked before a stall is logged")
+    parser.add_argument('--late-threshold', type=float, default=LATE_THRESHOLD,
+                        help="seconds past due after which a sent reminder is logged")
+    args = parser.parse_args()
+    # a port asked for must be served; the default one is best effort
+    args.metrics_required = args.metrics_port is not None
+    if args.metrics_port is None:
+        args.metrics_port = DEFAULT_METRICS_PORT
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+    if not 1 <= args.max_concurrency <= 100:
+        # also sent to Telegram as max_connections, which only accepts 1-100
+        parser.error("--max-concurrency must be between 1 and 100")
+    if args.replica and os.getenv('REMINDER_STORAGE') != 'sqlite':
+        parser.error("--replica needs REMINDER_STORAGE=sqlite, the only storage replicas can share")
+    if args.replica and args.workers > 1:
+        parser.error("--replica cannot be combined with --workers")
+    if args.replica and not args.webhook:
+        # replicas polling with one token keep taking getUpdates from each other
+        parser.error("--replica needs --webhook")
+    if args.webhook and not args.local and not args.webhook_url:
+        parser.error("--webhook needs --webhook-url (or WEBHOOK_URL in config.py) unless --local is given")
+    return args
+
+def concurrency_limit(limit: int):
+    semaphore = asyncio.Semaphore(limit)
+
+    @web.middleware
+    async def middleware(request: web.Request, handler):
+        async with semaphore:
+            return await handler(request)
+
+    return middleware
+
+def instrument(dp: Dispatcher):
+    dp.update.outer_middleware(UpdateMetrics())
+    router.message.middleware(HandlerMetrics())
+    # every button goes through route_callback, so the label comes from the callback table instead
+    router.callback_query.middleware(HandlerMetrics(callback.handler_name))
+
+    fsm = {'at': 0.0, 'stats': {}}
+
+    async def fsm_stat(name: str):
+        # both FSM gauges come from one session_stats call per scrape; it walks every session
+        if time.monotonic() - fsm['at'] > 1:
+            fsm.update(at=time.monotonic(), stats=await session_stats(dp.storage))
+        return fsm['stats'].get(name, 0)
+
+    REGISTRY.collector('reminder_bot_pending_reminders', "Reminders waiting in the scheduler", 'gauge',
+                       lambda: len(scheduler))
+    REGISTRY.collector('reminder_bot_firing_reminders', "Reminders handed to delivery and not yet confirmed", 'gauge',
+                       lambda: len(in_flight))
+    REGISTRY.collector('reminder_bot_delivery_queue', "Messages waiting for a delivery worker", 'gauge',
+                       lambda: {('queued',): len(delivery), ('staged',): delivery.staged}, ['state'])
+    REGISTRY.collector('reminder_bot_deliveries_total', "Delivery attempts by outcome", 'counter',
+                       lambda: {('sent',): delivery.sent, ('failed',): delivery.failed,
+                                ('rate_limited',): delivery.rate_limited, ('retry',): delivery.retries}, ['status'])
+    REGISTRY.collector('reminder_bot_fsm_sessions', "Users with an active dialogue state", 'gauge',
+                       partial(fsm_stat, 'sessions'))
+    REGISTRY.collector('reminder_bot_fsm_memory_bytes', "Memory held by dialogue state", 'gauge',
+                       partial(fsm_stat, 'memory_bytes'))
+
+async def start_metrics(host: str, port: int, required: bool = False) -> Optional[web.AppRunner]:
+    if not port:
+        return None
+    try:
+        return await start_metrics_server(host, port)
+    except OSError as e:
+        if required:
+            raise SystemExit(f"Error starting metrics server: {e}")
+        # the default port is not worth refusing to start the bot over
+        print(f"Error starting metrics server: {e}")
+        return None
+
+async def run_webhook(bot: Bot, dp: Dispatcher, args: argparse.Namespace):
+    app = web.Application(client_max_size=args.max_body_size, middlewares=[concurrency_limit(args.max_concurrency)])
+    SimpleRequestHandler(
+        dispatcher=dp,
+        bot=bot,
+        handle_in_background=False,
+        secret_token=args.secret
+    ).register(app, path=args.path)
+    setup_application(app, dp, bot=bot)
+
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, args.host, args.port, shutdown_timeout=args.drain_timeout)
+    await site.start()
+
+    if not args.local:
+        await bot.set_webhook(
+            args.webhook_url + args.path,
+            secret_token=args.secret,
+            max_connections=args.max_concurrency,
+            drop_pending_updates=False
+        )
+    print(f"Webhook listening on {args.host}:{args.port}{args.path}")
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:
+            pass
+    try:
+        await stop.wait()
+    finally:
+        if not args.local:
+            await bot.delete_webhook()
+        # stops accepting connections and waits up to drain_timeout for in-flight updates
+        await runner.cleanup()
+
+async def run_ingress(bot: Bot, args: argparse.Namespace):
+    # receives updates and routes them by user to worker processes running the handlers
+    command = [
+        sys.executable, os.path.abspath(__file__), '--workers', str(args.workers),
+        '--metrics-host', args.metrics_host,
+        '--stall-threshold', str(args.stall_threshold), '--late-threshold', str(args.late_threshold)
+    ]
+    if args.metrics_required:
+        command += ['--metrics-port', str(args.metrics_port)]
+    if args.watchdog:
+        command.append('--watchdog')
+    metrics = await start_metrics(args.metrics_host, args.metrics_port, args.metrics_required)
+    shard_router = ShardRouter(command, args.workers)
+    dp = Dispatcher()
+    # registered first, so updates are counted before they leave for a worker
+    dp.update.outer_middleware(UpdateMetrics())
+    dp.update.outer_middleware(shard_router)
+    await shard_router.start()
+    print(f"Routing updates to {args.workers} workers")
+    try:
+        if args.webhook:
+            await run_webhook(bot, dp, args)
+        else:
+            await dp.start_polling(bot)
+    finally:
+        await shard_router.stop()
+        if metrics is not None:
+            await metrics.cleanup()
+
+async def main():
+    args = parse_args()
+    bot = Bot(token=TOKEN)
+    if args.workers > 1 and args.shard is None:
+        await run_ingress(bot, args)
+        return
+    if args.shard is not None:
+        # the ingress closes our stdin on shutdown; a terminal Ctrl+C must not cut the drain short
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    dp = Dispatcher(storage=create_fsm_storage(os.getenv('REMINDER_FSM', 'memory'), os.getenv('REMINDER_FSM_URL')))
+    dp.include_router(router)
+    instrument(dp)
+    metrics_port = args.metrics_port
+    if metrics_port and args.shard is not None:
+        metrics_port += 1 + args.shard
+    # before anything else starts, so a port that cannot be served stops the bot cleanly
+    metrics = await start_metrics(args.metrics_host, metrics_port, args.metrics_required)
+
+    delivery.start(bot, on_status=reminder_delivered)
+    await storage.open()
+    lease = None
+    if args.replica:
+        lease = Lease(storage.path)
+        background = asyncio.create_task(lead_scheduler(bot, lease))
+    else:
+        background = await restore_reminders(bot)
+        scheduler.start(partial(reminder_task, bot))
+    watchdog = None
+    if args.watchdog:
+        watchdog = LoopWatchdog(HEARTBEAT_INTERVAL, args.stall_threshold)
+        watchdog.start()
+        delivery.late_after = args.late_threshold
+    try:
+        if args.shard is not None:
+            await serve_updates(bot, dp, await stdin_reader())
+        elif args.webhook:
+            await run_webhook(bot, dp, args)
+        else:
+            await dp.start_polling(bot)
+    finally:
+        background.cancel()
+        await asyncio.gather(background, return_exceptions=True)
+        await scheduler.stop()
+        await delivery.stop()
+        if lease is not None:
+            # lets a standby replica take over right away instead of waiting out the TTL
+            await lease.release()
+            await lease.close()
+        await storage.flush()
+        await storage.close()
+        if watchdog is not None:
+            await watchdog.stop()
+        if metrics is not None:
+            await metrics.cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,196 @@
+import asyncio
+import heapq
+import time
+from functools import partial
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, List, Optional, Set, Tuple
+
+MAX_SLEEP = 60.0
+BURST_WINDOW = 60
+FIRE_BATCH = 1000
+# reminders per second the fire callback is expected to stage; a window holding at least this many is crowded
+# and starts count / STAGE_RATE seconds before the usual lead
+STAGE_RATE = 1000
+MAX_LEAD = 300.0
+
+
+class Scheduler:
+    def __init__(self, lead: float = 0.0, window: int = BURST_WINDOW, stage_rate: float = STAGE_RATE,
+                 max_lead: float = MAX_LEAD):
+        self.lead = lead
+        self.window = window
+        self.stage_rate = stage_rate
+        self.max_lead = max(max_lead, lead)
+        self._heap: List[list] = []
+        self._entries: Dict[Hashable, list] = {}
+        self._windows: Dict[int, int] = {}
+        # the latest window whose early staging has begun; it and everything before it are fired
+        self._opened = -1
+        self._next_wake = float('inf')
+        self._removed = 0
+        self._counter = 0
+        self.fired_up_to = 0.0
+        self._callback: Optional[Callable[[Hashable, Any], Awaitable[None]]] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._running: Set[asyncio.Task] = set()
+        self._firing: Dict[Hashable, asyncio.Task] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        # a key stays known until its callback has finished, not just until it leaves the heap
+        return key in self._entries or key in self._firing
+
+    def schedule(self, key: Hashable, due: float, data: Any = None) -> None:
+        self.cancel(key)
+        entry = self._add_entry(key, due, data)
+        heapq.heappush(self._heap, entry)
+        if self._wakeup is not None and self._stage_time(due) < self._next_wake:
+            self._wakeup.set()
+
+    def schedule_many(self, items: Iterable[Tuple[Hashable, float, Any]]) -> int:
+        count = 0
+        for key, due, data in items:
+            self.cancel(key)
+            self._heap.append(self._add_entry(key, due, data))
+            count += 1
+        heapq.heapify(self._heap)
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return count
+
+    def cancel(self, key: Hashable) -> bool:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return False
+        self._forget_window(entry[0])
+        entry[2] = entry[3] = None
+        self._removed += 1
+        if self._removed > 1024 and self._removed * 2 > len(self._heap):
+            self._compact()
+        return True
+
+    def cancel_many(self, keys: Iterable[Hashable]) -> int:
+        # one call per bulk delete; tombstone compaction stays amortised as in cancel()
+        return sum(self.cancel(key) for key in keys)
+
+    def clear(self) -> None:
+        self._heap = []
+        self._firing.clear()
+        self._entries.clear()
+        self._windows.clear()
+        self._opened = -1
+        self._removed = 0
+
+    def lead_for(self, count: int) -> float:
+        # a crowded window starts early enough for all of it to be staged by its first deadline
+        if count < self.stage_rate:
+            return self.lead
+        return min(self.lead + count / self.stage_rate, self.max_lead)
+
+    def start(self, callback: Callable[[Hashable, Any], Awaitable[None]]) -> None:
+        if self._task is not None and not self._task.done():
+            return
+        self._callback = callback
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def _add_entry(self, key: Hashable, due: float, data: Any) -> list:
+        self._counter += 1
+        entry = [due, self._counter, key, data]
+        self._entries[key] = entry
+        slot = int(due // self.window)
+        self._windows[slot] = self._windows.get(slot, 0) + 1
+        return entry
+
+    def _forget_window(self, due: float) -> None:
+        slot = int(due // self.window)
+        count = self._windows.get(slot, 0) - 1
+        if count > 0:
+            self._windows[slot] = count
+        else:
+            self._windows.pop(slot, None)
+
+    def _stage_time(self, due: float) -> float:
+        slot = int(due // self.window)
+        if slot <= self._opened:
+            return 0.0
+        lead = self.lead_for(self._windows.get(slot, 0))
+        # a crowded window is staged as a whole from its opening time
+        return slot * self.window - lead if lead > self.lead else due - lead
+
+    def _plan(self, now: float) -> float:
+        # opens every crowded window whose staging time has come and returns when the next one opens;
+        # only windows within max_lead can open early, so only those are looked at
+        next_open = float('inf')
+        first = max(int(now // self.window), self._opened + 1)
+        for slot in range(first, int((now + self.max_lead) // self.window) + 1):
+            lead = self.lead_for(self._windows.get(slot, 0))
+            if lead == self.lead:
+                continue
+            opens = slot * self.window - lead
+            if opens <= now:
+                self._opened = slot
+            else:
+                next_open = min(next_open, opens)
+        return next_open
+
+    def _compact(self) -> None:
+        self._heap = [entry for entry in self._heap if entry[2] is not None]
+        heapq.heapify(self._heap)
+        self._removed = 0
+
+    def _fire(self, key: Hashable, data: Any) -> None:
+        task = asyncio.create_task(self._callback(key, data))
+        self._running.add(task)
+        self._firing[key] = task
+        task.add_done_callback(partial(self._fired, key))
+
+    def _fired(self, key: Hashable, task: asyncio.Task) -> None:
+        self._running.discard(task)
+        if self._firing.get(key) is task:
+            del self._firing[key]
+
+    async def _run(self) -> None:
+        while True:
+            self._wakeup.clear()
+            now = time.time()
+            next_open = self._plan(now)
+            horizon = now + self.lead
+            fired = 0
+            while self._heap and (self._heap[0][0] <= horizon or self._heap[0][0] // self.window <= self._opened):
+                due, _, key, data = heapq.heappop(self._heap)
+                if key is None:
+                    self._removed -= 1
+                    continue
+                del self._entries[key]
+                self._forget_window(due)
+                # entries leave the heap in due order, so this is how far firing has got
+                self.fired_up_to = max(self.fired_up_to, due)
+                self._fire(key, data)
+                fired += 1
+                if fired % FIRE_BATCH == 0:
+                    # a crowded window is handed out in slices so handlers keep running meanwhile
+                    await asyncio.sleep(0)
+                    now = time.time()
+                    next_open = self._plan(now)
+                    horizon = now + self.lead
+
+            self._next_wake = next_open
+            if self._heap:
+                self._next_wake = min(self._next_wake, self._heap[0][0] - self.lead)
+            timeout = min(max(self._next_wake - time.time(), 0), MAX_SLEEP)
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
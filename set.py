@@ -1,1049 +1,846 @@
-import json
-import asyncio
-import re
-from datetime import datetime
-from calendar import monthcalendar
-from aiogram import types, Router, F
-from aiogram.filters import Command
-from typing import Dict, Any
-from aiogram.types import ReplyKeyboardMarkup, KeyboardButton
-
-router = Router()
-user_tasks: Dict[str, Dict[str, asyncio.Task]] = {}
-waiting_for: Dict[int, Any] = {}
-reminders_file = 'reminders.json'
-file_lock = asyncio.Lock()
-
-REMINDER_EMOJI = {
-    'default': '⏰',
-    'birthday': '🎂',
-    'meeting': '👥',
-    'holiday': '🎉',
-    'task': '📝'
-}
-
-REMINDER_TYPES = [
-    ('Обычное', 'default'),
-    ('День рождения', 'birthday'),
-    ('Встреча', 'meeting'),
-    ('Праздник', 'holiday'),
-    ('Задача', 'task')
-]
-
-def create_time_keyboard() -> types.InlineKeyboardMarkup:
-    keyboard = []
-    for hour in range(0, 24, 3):
-        row = []
-        for h in range(hour, min(hour + 3, 24)):
-            row.append(types.InlineKeyboardButton(
-                text=f"{h:02d}:00",
-                callback_data=f"time_{h:02d}_00"
-            ))
-        keyboard.append(row)
-    
-    keyboard.append([
-        types.InlineKeyboardButton(
-            text="« Назад к календарю",
-            callback_data="back_to_calendar"
-        )
-    ])
-    
-    return types.InlineKeyboardMarkup(inline_keyboard=keyboard)
-
-def create_minutes_keyboard(hour: str) -> types.InlineKeyboardMarkup:
-    keyboard = []
-    for i in range(0, 60, 15):
-        row = []
-        for j in range(0, 3):
-            minute = i + (j * 5)
-            if minute < 60:
-                row.append(types.InlineKeyboardButton(
-                    text=f"{hour}:{minute:02d}",
-                    callback_data=f"full_time_{hour}_{minute:02d}"
-                ))
-        keyboard.append(row)
-    
-    keyboard.append([
-        types.InlineKeyboardButton(
-            text="« Назад к выбору часа",
-            callback_data="back_to_hours"
-        )
-    ])
-    keyboard.append([
-        types.InlineKeyboardButton(
-            text="« Назад к календарю",
-            callback_data="back_to_calendar"
-        )
-    ])
-    
-    return types.InlineKeyboardMarkup(inline_keyboard=keyboard)
-
-def create_year_month_keyboard(current_year: int) -> types.InlineKeyboardMarkup:
-    keyboard = []
-    month_names = ['Январь', 'Февраль', 'Март', 'Апрель', 'Май', 'Июнь', 
-                   'Июль', 'Август', 'Сентябрь', 'Октябрь', 'Ноябрь', 'Декабрь']
-    
-    keyboard.append([
-        types.InlineKeyboardButton(text='⬅️', callback_data=f'prev_year_{current_year}'),
-        types.InlineKeyboardButton(text=f"📅 {current_year}", callback_data='ignore'),
-        types.InlineKeyboardButton(text='➡️', callback_data=f'next_year_{current_year}')
-    ])
-    
-    for i in range(0, 12, 3):
-        row = []
-        for j in range(3):
-            if i + j < 12:
-                month_num = i + j + 1
-                row.append(types.InlineKeyboardButton(
-                    text=month_names[i + j],
-                    callback_data=f'select_month_{current_year}_{month_num}'
-                ))
-        keyboard.append(row)
-    
-    return types.InlineKeyboardMarkup(inline_keyboard=keyboard)
-
-def create_calendar_keyboard(year: int, month: int) -> types.InlineKeyboardMarkup:
-    keyboard = []
-    month_names = [
-        'Январь', 'Февраль', 'Март', 'Апрель', 'Май', 'Июнь',
-        'Июль', 'Август', 'Сентябрь', 'Октябрь', 'Ноябрь', 'Декабрь'
-    ]
-    
-    keyboard.append([
-        types.InlineKeyboardButton(
-            text=f"📅 {month_names[month-1]} {year}",
-            callback_data=f'show_months_{year}'
-        )
-    ])
-    
-    days_of_week = ['Пн', 'Вт', 'Ср', 'Чт', 'Пт', 'Сб', 'Вс']
-    keyboard.append([
-        types.InlineKeyboardButton(text=day, callback_data='ignore')
-        for day in days_of_week
-    ])
-    
-    month_calendar = monthcalendar(year, month)
-    
-    for week in month_calendar:
-        row = []
-        for day in week:
-            if day == 0:
-                row.append(types.InlineKeyboardButton(text=' ', callback_data='ignore'))
-            else:
-                row.append(types.InlineKeyboardButton(
-                    text=str(day),
-                    callback_data=f'calendar_day_{year}_{month}_{day}'
-                ))
-        keyboard.append(row)
-    
-    nav_row = []
-    
-    prev_month = month - 1
-    prev_year = year
-    if prev_month == 0:
-        prev_month = 12
-        prev_year -= 1
-    
-    next_month = month + 1
-    next_year = year
-    if next_month == 13:
-        next_month = 1
-        next_year += 1
-    
-    nav_row.extend([
-        types.InlineKeyboardButton(
-            text='⬅️',
-            callback_data=f'prev_{prev_year}_{prev_month}'
-        ),
-        types.InlineKeyboardButton(
-            text='➡️',
-            callback_data=f'next_{next_year}_{next_month}'
-        )
-    ])
-    keyboard.append(nav_row)
-    
-    return types.InlineKeyboardMarkup(inline_keyboard=keyboard)
-
-def create_reminders_keyboard(user_id: str, action: str) -> types.InlineKeyboardMarkup:
-    keyboard = []
-    user_reminders = reminders.get(user_id, [])
-    
-    for rem in user_reminders:
-        text = rem['text'][:30] + '...' if len(rem['text']) > 30 else rem['text']
-        keyboard.append([
-            types.InlineKeyboardButton(
-                text=f"🕐 {rem['time']} - {text}",
-                callback_data=f"{action}_{rem['id']}"
-            )
-        ])
-    
-    return types.InlineKeyboardMarkup(inline_keyboard=keyboard)
-
-def create_reminder_type_keyboard() -> types.InlineKeyboardMarkup:
-    keyboard = []
-    for name, callback in REMINDER_TYPES:
-        keyboard.append([
-            types.InlineKeyboardButton(
-                text=f"{REMINDER_EMOJI[callback]} {name}",
-                callback_data=f"type_{callback}"
-            )
-        ])
-    return types.InlineKeyboardMarkup(inline_keyboard=keyboard)
-
-def create_reminder_object(time: str, text: str, rem_type: str = 'default') -> dict:
-    return {
-        'time': time,
-        'text': text,
-        'type': rem_type,
-        'id': str(datetime.now().timestamp())
-    }
-
-def load_reminders() -> Dict[str, list]:
-    try:
-        with open(reminders_file, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
-        return {}
-
-async def save_reminders(data: Dict[str, list]) -> None:
-    async with file_lock:
-        try:
-            with open(reminders_file, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=4)
-        except Exception as e:
-            print(f"Error saving reminders to file: {e}")
-
-reminders = load_reminders()
-
-main = ReplyKeyboardMarkup(
-    keyboard=[
-        [KeyboardButton(text="Установить напоминание")],
-        [KeyboardButton(text="Мои напоминания")],
-        [KeyboardButton(text="Изменить напоминание"), KeyboardButton(text="Удалить напоминание")],
-    ],
-    resize_keyboard=True,
-    input_field_placeholder='Выберите пункт меню...'
-)
-
-@router.message(Command("start"))
-async def cmd_start(message: types.Message):
-    keyboard = [
-        [
-            types.KeyboardButton(text="Установить напоминание")
-        ],
-        [
-            types.KeyboardButton(text="Мои напоминания")
-        ],
-        [
-            types.KeyboardButton(text="Изменить напоминание"),
-            types.KeyboardButton(text="Удалить напоминания")
-        ]
-    ]
-    
-    markup = types.ReplyKeyboardMarkup(
-        keyboard=keyboard,
-        resize_keyboard=True
-    )
-    
-    await message.answer(
-        "Привет! Я бот напоминаний. 🤖\n"
-        "Нужна помощь? Используйте /help для получения подробных инструкций.",
-        reply_markup=markup
-    )
-
-@router.message(Command("help"))
-async def cmd_help(message: types.Message):
-    help_text = (
-        "❓ Добро пожаловать в справочник бота!\n\n"
-        "<b>Основные команды:</b>\n"
-        "• /start - Запустить бота\n"
-        "• /help - Показать это сообщение\n\n"
-        "<b>Типы напоминаний:</b>\n"
-        f"• {REMINDER_EMOJI['default']} Обычное - повседневные дела\n"
-        f"• {REMINDER_EMOJI['birthday']} День рождения - праздники друзей\n"
-        f"• {REMINDER_EMOJI['meeting']} Встреча - деловые встречи\n"
-        f"• {REMINDER_EMOJI['holiday']} Праздник - особые события\n"
-        f"• {REMINDER_EMOJI['task']} Задача - важные дела\n\n"
-        "<b>Как установить напоминание:</b>\n"
-        "1. Нажмите \"Установить напоминание\"\n"
-        "2. Выберите тип напоминания\n"
-        "3. Укажите дату в календаре\n"
-        "4. Выберите время с помощью кнопок\n"
-        "5. Введите текст напоминания\n\n"
-        "<b>Управление напоминаниями:</b>\n"
-        "• 📋 \"Мои напоминания\" - список всех напоминаний\n"
-        "• ✏️ \"Изменить напоминание\" - редактирование\n"
-        "• 🗑 \"Удалить напоминание\" - удаление\n\n"
-        "💡 Совет дня: Используйте разные типы напоминаний для лучшей организации задач."
-    )
-    
-    await message.answer(help_text, parse_mode="HTML")
-
-@router.message(F.text == "Установить напоминание")
-async def set_reminder_start(message: types.Message):
-    user_id = message.from_user.id
-    waiting_for[user_id] = 'select_type'
-    await message.answer(
-        'Выберите тип напоминания:',
-        reply_markup=create_reminder_type_keyboard()
-    )
-
-@router.callback_query(lambda c: c.data.startswith('edit_'))
-async def process_edit_reminder(callback_query: types.CallbackQuery):
-    _, rem_id = callback_query.data.split('_')
-    user_id = str(callback_query.from_user.id)
-    
-    if user_id not in reminders:
-        await callback_query.answer("❌ У вас нет напоминаний")
-        return
-    
-    reminder = next((rem for rem in reminders[user_id] if rem['id'] == rem_id), None)
-    if not reminder:
-        await callback_query.answer("❌ Напоминание не найдено")
-        return
-    
-    now = datetime.now()
-    waiting_for[int(user_id)] = 'edit_calendar'
-    waiting_for[user_id + '_edit_id'] = rem_id
-    waiting_for[user_id + '_edit_type'] = reminder['type']
-    waiting_for[user_id + '_edit_old_reminder'] = reminder
-    
-    calendar_keyboard = create_calendar_keyboard(now.year, now.month)
-    
-    await callback_query.message.edit_text(
-        "📅 Выберите новую дату напоминания:",
-        reply_markup=calendar_keyboard
-    )
-
-@router.callback_query(lambda c: c.data == "back_to_reminders")
-async def process_back_to_reminders(callback_query: types.CallbackQuery):
-    user_id = str(callback_query.from_user.id)
-    
-    waiting_for.pop(int(user_id), None)
-    waiting_for.pop(user_id + '_edit_id', None)
-    waiting_for.pop(user_id + '_edit_type', None)
-    waiting_for.pop(user_id + '_edit_old_reminder', None)
-    
-    user_reminders = reminders.get(user_id, [])
-    
-    if not user_reminders:
-        await callback_query.message.edit_text("📭 У вас нет активных напоминаний")
-        return
-
-    response = "📋 <b>Ваши напоминания</b>\n\n"
-    
-    grouped_by_date = {}
-    for rem in user_reminders:
-        date = rem['time'].split()[0]
-        if date not in grouped_by_date:
-            grouped_by_date[date] = []
-        grouped_by_date[date].append(rem)
-
-    sorted_dates = sorted(grouped_by_date.keys(), 
-                         key=lambda x: datetime.strptime(x, "%d.%m.%Y"))
-
-    total_count = len(user_reminders)
-    response += f"Всего напоминаний: {total_count}\n\n"
-
-    keyboard = []
-    for date in sorted_dates:
-        formatted_date = datetime.strptime(date, "%d.%m.%Y").strftime("%d %B %Y")
-        month_translations = {
-            'January': 'января', 'February': 'февраля', 'March': 'марта',
-            'April': 'апреля', 'May': 'мая', 'June': 'июня',
-            'July': 'июля', 'August': 'августа', 'September': 'сентября',
-            'October': 'октября', 'November': 'ноября', 'December': 'декабря'
-        }
-        for eng, rus in month_translations.items():
-            formatted_date = formatted_date.replace(eng, rus)
-        
-        response += f"📅 <b>{formatted_date}</b>\n"
-        
-        day_reminders = sorted(grouped_by_date[date], 
-                             key=lambda x: datetime.strptime(x['time'].split()[1], "%H:%M"))
-        
-        for rem in day_reminders:
-            time = rem['time'].split()[1]
-            rem_type = rem.get('type', 'default')
-            emoji = REMINDER_EMOJI.get(rem_type, '⏰')
-            
-            type_name = next((name for name, callback in REMINDER_TYPES if callback == rem_type), 'Обычное')
-            
-            response += (
-                f"┌ <b>{time}</b>\n"
-                f"├ {emoji} <i>{type_name}</i>\n"
-                f"└ {rem['text']}\n\n"
-            )
-            
-            keyboard.append([
-                types.InlineKeyboardButton(
-                    text="✏️ Изменить",
-                    callback_data=f"edit_{rem['id']}"
-                ),
-                types.InlineKeyboardButton(
-                    text="🗑 Удалить",
-                    callback_data=f"delete_{rem['id']}"
-                )
-            ])
-
-    await callback_query.message.edit_text(
-        response,
-        reply_markup=types.InlineKeyboardMarkup(inline_keyboard=keyboard),
-        parse_mode="HTML"
-    )
-
-@router.callback_query(lambda c: c.data.startswith('calendar_day_'))
-async def process_calendar_day(callback_query: types.CallbackQuery):
-    _, _, year, month, day = callback_query.data.split('_')
-    selected_date = datetime(int(year), int(month), int(day))
-    current_date = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
-    
-    if selected_date < current_date:
-        await callback_query.answer("❌ Нельзя выбрать дату в прошлом!", show_alert=True)
-        return
-        
-    formatted_date = f"{day.zfill(2)}.{month.zfill(2)}.{year}"
-    user_id = str(callback_query.from_user.id)
-    
-    current_action = waiting_for.get(int(user_id))
-    if current_action == 'edit_calendar':
-        rem_type = waiting_for.get(user_id + '_edit_type', 'default')
-    else:
-        rem_type = current_action[1] if isinstance(current_action, tuple) else 'default'
-    
-    await callback_query.message.edit_text(
-        f"Выбрана дата: {formatted_date}\nВыберите час:",
-        reply_markup=create_time_keyboard()
-    )
-    
-    if current_action == 'edit_calendar':
-        waiting_for[int(user_id)] = ('edit_time', formatted_date, rem_type)
-    else:
-        waiting_for[int(user_id)] = ('set_time', formatted_date, rem_type)
-
-@router.callback_query(lambda c: c.data.startswith('time_'))
-async def process_time_selection(callback_query: types.CallbackQuery):
-    _, hour, _ = callback_query.data.split('_')
-    user_id = callback_query.from_user.id
-    current_action = waiting_for.get(user_id)
-    
-    if current_action and isinstance(current_action, tuple):
-        date_str = current_action[1]
-        rem_type = current_action[2] if len(current_action) > 2 else 'default'
-        waiting_for[user_id] = ('set_time', date_str, rem_type)
-        
-    await callback_query.message.edit_reply_markup(
-        reply_markup=create_minutes_keyboard(hour)
-    )
-
-@router.callback_query(lambda c: c.data == 'back_to_hours')
-async def process_back_to_hours(callback_query: types.CallbackQuery):
-    await callback_query.message.edit_reply_markup(
-        reply_markup=create_time_keyboard()
-    )
-
-@router.callback_query(lambda c: c.data.startswith('full_time_'))
-async def process_full_time_selection(callback_query: types.CallbackQuery):
-    parts = callback_query.data.split('_')
-    hour = parts[2]
-    minutes = parts[3]
-    time_str = f"{hour}:{minutes}"
-    user_id = callback_query.from_user.id
-    action = waiting_for.get(user_id)
-    
-    if not action or not isinstance(action, tuple):
-        await callback_query.answer("Ошибка: начните процесс заново")
-        return
-    
-    date_str = action[1]
-    rem_type = action[2] if len(action) > 2 else 'default'
-    
-    reminder_time = datetime.strptime(f"{date_str} {time_str}", "%d.%m.%Y %H:%M")
-    if reminder_time < datetime.now():
-        await callback_query.answer("❌ Нельзя установить напоминание в прошлом!")
-        return
-    
-    type_name = next((name for name, callback in REMINDER_TYPES if callback == rem_type), 'Обычное')
-    await callback_query.message.edit_text(
-        f"Выбраны дата и время: {date_str} {time_str}\n"
-        f"Тип: {type_name} {REMINDER_EMOJI[rem_type]}\n"
-        f"Теперь введите текст напоминания:"
-    )
-    waiting_for[user_id] = ('set_reminder_text', date_str, time_str, rem_type)
-
-@router.callback_query(lambda c: c.data.startswith('type_'))
-async def process_reminder_type(callback_query: types.CallbackQuery):
-    rem_type = callback_query.data.split('_')[1]
-    user_id = callback_query.from_user.id
-    now = datetime.now()
-    
-    waiting_for[user_id] = ('calendar', rem_type)
-    await callback_query.message.edit_text(
-        'Выберите дату:',
-        reply_markup=create_calendar_keyboard(now.year, now.month)
-    )
-
-@router.message(F.text == 'Мои напоминания')
-async def show_reminders(message: types.Message):
-    user_id = str(message.from_user.id)
-    user_reminders = reminders.get(user_id, [])
-    
-    if not user_reminders:
-        await message.answer("📭 У вас нет активных напоминаний")
-        return
-
-    grouped_by_date = {}
-    for rem in user_reminders:
-        date = rem['time'].split()[0]
-        if date not in grouped_by_date:
-            grouped_by_date[date] = []
-        grouped_by_date[date].append(rem)
-
-    sorted_dates = sorted(grouped_by_date.keys(), 
-                         key=lambda x: datetime.strptime(x, "%d.%m.%Y"))
-
-    response = "📋 <b>Ваши напоминания</b>\n\n"
-    
-    total_count = len(user_reminders)
-    response += f"Всего напоминаний: {total_count}\n\n"
-
-    for date in sorted_dates:
-        formatted_date = datetime.strptime(date, "%d.%m.%Y").strftime("%d %B %Y")
-        month_translations = {
-            'January': 'января', 'February': 'февраля', 'March': 'марта',
-            'April': 'апреля', 'May': 'мая', 'June': 'июня',
-            'July': 'июля', 'August': 'августа', 'September': 'сентября',
-            'October': 'октября', 'November': 'ноября', 'December': 'декабря'
-        }
-        for eng, rus in month_translations.items():
-            formatted_date = formatted_date.replace(eng, rus)
-        
-        response += f"📅 <b>{formatted_date}</b>\n"
-        
-        day_reminders = sorted(grouped_by_date[date], 
-                             key=lambda x: datetime.strptime(x['time'].split()[1], "%H:%M"))
-        
-        for rem in day_reminders:
-            time = rem['time'].split()[1]
-            rem_type = rem.get('type', 'default')
-            emoji = REMINDER_EMOJI.get(rem_type, '⏰')
-            
-            type_name = next((name for name, callback in REMINDER_TYPES if callback == rem_type), 'Обычное')
-            
-            response += (
-                f"┌ <b>{time}</b>\n"
-                f"├ {emoji} <i>{type_name}</i>\n"
-                f"└ {rem['text']}\n\n"
-            )
-
-    try:
-        response += (
-            "\n<i>💡 Управление напоминаниями:</i>\n"
-            "• Изменить напоминание - нажмите соответствующую кнопку\n"
-            "• Удалить напоминание - используйте кнопку удаления"
-        )
-        
-        await message.answer(response, parse_mode="HTML")
-    except Exception as e:
-        print(f"Error sending reminders: {e}")
-        await message.answer(
-            "⚠️ Не удалось отобразить полный список напоминаний.\n"
-            "Попробуйте удалить несколько старых напоминаний."
-        )
-
-@router.message(F.text == "Удалить напоминания")
-async def show_delete_reminders(message: types.Message):
-    user_id = str(message.from_user.id)
-    if user_id not in reminders or not reminders[user_id]:
-        await message.answer("📭 У вас нет активных напоминаний")
-        return
-
-    keyboard = []
-    
-    sorted_reminders = sorted(reminders[user_id], 
-                            key=lambda x: datetime.strptime(x['time'], "%d.%m.%Y %H:%M"))
-    
-    for rem in sorted_reminders:
-        date_time = rem['time']
-        text = rem['text']
-        rem_type = rem.get('type', 'default')
-        emoji = REMINDER_EMOJI.get(rem_type, '⏰')
-        
-        display_text = text[:30] + ('...' if len(text) > 30 else '')
-        
-        keyboard.append([
-            types.InlineKeyboardButton(
-                text=f"☐ {date_time} {emoji} {display_text}",
-                callback_data=f"select_del_{rem['id']}"
-            )
-        ])
-    
-    control_buttons = [
-        [
-            types.InlineKeyboardButton(text="✅ Выбрать все", callback_data="select_all_del"),
-            types.InlineKeyboardButton(text="❌ Отменить все", callback_data="deselect_all_del")
-        ],
-        [
-            types.InlineKeyboardButton(text="🗑 Удалить выбранные", callback_data="confirm_delete")
-        ]
-    ]
-    keyboard.extend(control_buttons)
-    
-    markup = types.InlineKeyboardMarkup(inline_keyboard=keyboard)
-    
-    await message.answer(
-        "🗑 <b>Множественное удаление напоминаний</b>\n\n"
-        "<i>Инструкция:</i>\n"
-        "1️⃣ Нажмите на ☐ рядом с напоминанием, чтобы выбрать его\n"
-        "2️⃣ Выберите одно или несколько напоминаний\n"
-        "3️⃣ Используйте кнопки внизу для быстрого выбора\n"
-        "4️⃣ Нажмите «🗑 Удалить выбранные» для подтверждения\n\n"
-        "<i>❗️ Удаление необратимо</i>",
-        reply_markup=markup,
-        parse_mode="HTML"
-    )
-
-@router.callback_query(lambda c: c.data.startswith('select_del_'))
-async def process_select_reminder(callback_query: types.CallbackQuery):
-    keyboard = list(callback_query.message.reply_markup.inline_keyboard)
-    
-    for row_index, row in enumerate(keyboard):
-        for btn_index, btn in enumerate(row):
-            if btn.callback_data == callback_query.data:
-                current_text = btn.text
-                new_text = current_text.replace('☐', '☑') if '☐' in current_text else current_text.replace('☑', '☐')
-                keyboard[row_index][btn_index] = types.InlineKeyboardButton(
-                    text=new_text,
-                    callback_data=btn.callback_data
-                )
-                break
-    
-    await callback_query.message.edit_reply_markup(
-        reply_markup=types.InlineKeyboardMarkup(inline_keyboard=keyboard)
-    )
-
-@router.callback_query(lambda c: c.data == "select_all_del")
-async def process_select_all(callback_query: types.CallbackQuery):
-    keyboard = list(callback_query.message.reply_markup.inline_keyboard)
-    modified = False
-    
-    for row_index, row in enumerate(keyboard):
-        for btn_index, btn in enumerate(row):
-            if btn.callback_data.startswith('select_del_'):
-                current_text = btn.text
-                if '☐' in current_text:
-                    modified = True
-                    new_text = current_text.replace('☐', '☑')
-                    keyboard[row_index][btn_index] = types.InlineKeyboardButton(
-                        text=new_text,
-                        callback_data=btn.callback_data
-                    )
-    
-    if modified:
-        await callback_query.message.edit_reply_markup(
-            reply_markup=types.InlineKeyboardMarkup(inline_keyboard=keyboard)
-        )
-    else:
-        await callback_query.answer("Все напоминания уже выбраны")
-
-@router.callback_query(lambda c: c.data == "deselect_all_del")
-async def process_deselect_all(callback_query: types.CallbackQuery):
-    keyboard = list(callback_query.message.reply_markup.inline_keyboard)
-    modified = False
-    
-    for row_index, row in enumerate(keyboard):
-        for btn_index, btn in enumerate(row):
-            if btn.callback_data.startswith('select_del_'):
-                current_text = btn.text
-                if '☑' in current_text:
-                    modified = True
-                    new_text = current_text.replace('☑', '☐')
-                    keyboard[row_index][btn_index] = types.InlineKeyboardButton(
-                        text=new_text,
-                        callback_data=btn.callback_data
-                    )
-    
-    if modified:
-        await callback_query.message.edit_reply_markup(
-            reply_markup=types.InlineKeyboardMarkup(inline_keyboard=keyboard)
-        )
-    else:
-        await callback_query.answer("Все напоминания уже сняты")
-
-@router.callback_query(lambda c: c.data == "confirm_delete")
-async def process_confirm_delete(callback_query: types.CallbackQuery):
-    user_id = str(callback_query.from_user.id)
-    keyboard = callback_query.message.reply_markup.inline_keyboard
-    
-    selected_ids = []
-    for row in keyboard:
-        for btn in row:
-            if btn.callback_data.startswith('select_del_') and '☑' in btn.text:
-                rem_id = btn.callback_data.split('_')[2]
-                selected_ids.append(rem_id)
-    
-    if not selected_ids:
-        await callback_query.answer("❌ Не выбрано ни одного напоминания")
-        return
-    
-    deleted_count = 0
-    if user_id in reminders:
-        new_reminders = []
-        for rem in reminders[user_id]:
-            if rem['id'] in selected_ids:
-                if user_id in user_tasks and rem['text'] in user_tasks[user_id]:
-                    user_tasks[user_id][rem['text']].cancel()
-                    del user_tasks[user_id][rem['text']]
-                deleted_count += 1
-            else:
-                new_reminders.append(rem)
-        
-        if new_reminders:
-            reminders[user_id] = new_reminders
-        else:
-            del reminders[user_id]
-        
-        await save_reminders(reminders)
-    
-    await callback_query.message.edit_text(
-        f"✅ Успешно удалено напоминаний: {deleted_count}\n\n"
-        f"<i>Используйте команду «Мои напоминания» для просмотра оставшихся напоминаний</i>",
-        parse_mode="HTML"
-    )
-
-@router.message(F.text == "Изменить напоминание")
-async def edit_reminder_start(message: types.Message):
-    user_id = str(message.from_user.id)
-    if user_id not in reminders or not reminders[user_id]:
-        await message.answer("📭 У вас нет активных напоминаний")
-        return
-    
-    keyboard = []
-    
-    sorted_reminders = sorted(reminders[user_id], 
-                            key=lambda x: datetime.strptime(x['time'], "%d.%m.%Y %H:%M"))
-    
-    for rem in sorted_reminders:
-        time = rem['time']
-        rem_type = rem.get('type', 'default')
-        emoji = REMINDER_EMOJI.get(rem_type, '⏰')
-        
-        keyboard.append([
-            types.InlineKeyboardButton(
-                text=f"✏️ {time} {emoji} {rem['text'][:20]}{'...' if len(rem['text']) > 20 else ''}",
-                callback_data=f"edit_{rem['id']}"
-            )
-        ])
-
-    await message.answer(
-        "Выберите напоминание для изменения:",
-        reply_markup=types.InlineKeyboardMarkup(inline_keyboard=keyboard),
-        parse_mode="HTML"
-    )
-
-@router.callback_query(lambda c: c.data.startswith(('delete_', 'edit_')))
-async def process_reminder_action(callback_query: types.CallbackQuery):
-    action, rem_id = callback_query.data.split('_')
-    user_id = str(callback_query.from_user.id)
-    
-    if user_id not in reminders:
-        await callback_query.answer("❌ У вас нет напоминаний")
-        return
-    
-    reminder = next((rem for rem in reminders[user_id] if rem['id'] == rem_id), None)
-    if not reminder:
-        await callback_query.answer("❌ Напоминание не найдено")
-        return
-    
-    if action == 'delete':
-        if user_id in user_tasks and reminder['text'] in user_tasks[user_id]:
-            user_tasks[user_id][reminder['text']].cancel()
-            del user_tasks[user_id][reminder['text']]
-        
-        reminders[user_id] = [rem for rem in reminders[user_id] if rem['id'] != rem_id]
-        if not reminders[user_id]:
-            del reminders[user_id]
-        await save_reminders(reminders)
-        await callback_query.message.edit_text("✅ Напоминание удалено")
-        
-    else:  # edit
-        now = datetime.now()
-        waiting_for[int(user_id)] = 'edit_calendar'
-        waiting_for[user_id + '_edit_id'] = rem_id
-        await callback_query.message.edit_text(
-            'Выберите новую дату:',
-            reply_markup=create_calendar_keyboard(now.year, now.month)
-        )
-    
-    await callback_query.answer()
-
-@router.callback_query(lambda c: c.data == 'ignore')
-async def process_ignore(callback_query: types.CallbackQuery):
-    await callback_query.answer()
-
-@router.callback_query(lambda c: c.data.startswith('show_months_'))
-async def process_show_months(callback_query: types.CallbackQuery):
-    try:
-        _, _, year = callback_query.data.split('_')
-        current_year = int(year)
-        new_markup = create_year_month_keyboard(current_year)
-        
-        if callback_query.message.reply_markup != new_markup:
-            await callback_query.message.edit_reply_markup(reply_markup=new_markup)
-        else:
-            await callback_query.answer()
-            
-    except Exception as e:
-        print(f"Error in show months: {e}")
-        await callback_query.answer("Ошибка при отображении месяцев")
-
-@router.callback_query(lambda c: c.data.startswith(('prev_year_', 'next_year_')))
-async def process_year_navigation(callback_query: types.CallbackQuery):
-    try:
-        _, _, year = callback_query.data.split('_')
-        year = int(year)
-        
-        if callback_query.data.startswith('prev_year_'):
-            new_year = year - 1
-        else:  # next_year_
-            new_year = year + 1
-        
-        if new_year != year:
-            await callback_query.message.edit_reply_markup(
-                reply_markup=create_year_month_keyboard(new_year)
-            )
-        else:
-            await callback_query.answer()
-            
-    except Exception as e:
-        print(f"Error in year navigation: {e}")
-        await callback_query.answer("Ошибка при навигации")
-
-@router.callback_query(lambda c: c.data.startswith('select_month_'))
-async def process_month_selection(callback_query: types.CallbackQuery):
-    try:
-        _, _, year, month = callback_query.data.split('_')
-        year, month = int(year), int(month)
-        
-        new_markup = create_calendar_keyboard(year, month)
-        
-        if callback_query.message.reply_markup != new_markup:
-            await callback_query.message.edit_reply_markup(reply_markup=new_markup)
-        else:
-            await callback_query.answer()
-            
-    except Exception as e:
-        print(f"Error in month selection: {e}")
-        await callback_query.answer("Ошибка при выборе месяца")
-
-@router.callback_query(lambda c: c.data.startswith(('prev_', 'next_')))
-async def process_calendar_navigation(callback_query: types.CallbackQuery):
-    try:
-        action, year, month = callback_query.data.split('_')
-        year, month = int(year), int(month)
-        
-        new_markup = create_calendar_keyboard(year, month)
-        
-        await callback_query.message.edit_reply_markup(reply_markup=new_markup)
-            
-    except Exception as e:
-        print(f"Error in calendar navigation: {e}")
-        await callback_query.answer("Ошибка при навигации по календарю")
-
-@router.message(F.text)
-async def handle_text(message: types.Message):
-    if message.text.startswith('/'):
-        return
-        
-    user_id = message.from_user.id
-    action = waiting_for.get(user_id)
-    
-    if not action or not isinstance(action, tuple):
-        return
-
-    if action[0] == 'set_reminder_text':
-        date_str, time_str, rem_type = action[1:4]
-        text = message.text
-        
-        reminder_time = datetime.strptime(f"{date_str} {time_str}", "%d.%m.%Y %H:%M")
-        success = await schedule_reminder(message.bot, user_id, reminder_time, text, rem_type)
-        
-        if not success:
-            await message.answer("❌ Не удалось установить напоминание")
-        
-        waiting_for.pop(user_id, None)
-        waiting_for.pop(str(user_id) + '_edit_id', None)
-        waiting_for.pop(str(user_id) + '_edit_type', None)
-
-async def send_reminder(bot, user_id: int, text: str):
-    try:
-        user_id_str = str(user_id)
-        reminder = next((rem for rem in reminders[user_id_str] if rem['text'] == text), None)
-        
-        if reminder:
-            type_name = next((name for name, callback in REMINDER_TYPES if callback == reminder['type']), 'Обычное')
-            emoji = REMINDER_EMOJI[reminder['type']]
-            
-            reminder_message = (
-                f"🔔 <b>Напоминание!</b>\n\n"
-                f"{emoji} <b>Тип:</b> {type_name}\n"
-                f"📝 <b>Сообщение:</b> {text}\n\n"
-                f"<i>Установлено на: {reminder['time']}</i>"
-            )
-            
-            await bot.send_message(user_id, reminder_message, parse_mode="HTML")
-    except Exception as e:
-        print(f"Error in send_reminder: {e}")
-        await bot.send_message(user_id, f"⏰ Напоминание: {text}")
-
-async def schedule_reminder(bot, user_id: int, reminder_time: datetime, text: str, rem_type: str = 'default') -> bool:
-    try:
-        if reminder_time < datetime.now():
-            await bot.send_message(user_id, "❌ Нельзя установить напоминание в прошлом!")
-            return False
-
-        user_id_str = str(user_id)
-        
-        old_reminder = waiting_for.get(user_id_str + '_edit_old_reminder')
-        
-        if old_reminder:
-            if user_id_str in reminders:
-                reminders[user_id_str] = [rem for rem in reminders[user_id_str] if rem['id'] != old_reminder['id']]
-            if user_id_str in user_tasks and old_reminder['text'] in user_tasks[user_id_str]:
-                user_tasks[user_id_str][old_reminder['text']].cancel()
-                del user_tasks[user_id_str][old_reminder['text']]
-        
-        delta = (reminder_time - datetime.now()).total_seconds()
-        task = asyncio.create_task(reminder_task(bot, user_id, delta, text))
-
-        if user_id_str not in user_tasks:
-            user_tasks[user_id_str] = {}
-        user_tasks[user_id_str][text] = task
-        
-        if user_id_str not in reminders:
-            reminders[user_id_str] = []
-        
-        reminder_obj = create_reminder_object(
-            time=reminder_time.strftime("%d.%m.%Y %H:%M"),
-            text=text,
-            rem_type=rem_type
-        )
-        
-        reminders[user_id_str].append(reminder_obj)
-        await save_reminders(reminders)
-
-        waiting_for.pop(user_id_str + '_edit_old_reminder', None)
-        
-        type_name = next((name for name, callback in REMINDER_TYPES if callback == rem_type), 'Обычное')
-        formatted_date = reminder_time.strftime("%d %B %Y")
-        month_translations = {
-            'January': 'января', 'February': 'февраля', 'March': 'марта',
-            'April': 'апреля', 'May': 'мая', 'June': 'июня',
-            'July': 'июля', 'August': 'августа', 'September': 'сентября',
-            'October': 'октября', 'November': 'ноября', 'December': 'декабря'
-        }
-        for eng, rus in month_translations.items():
-            formatted_date = formatted_date.replace(eng, rus)
-
-        action_text = "изменено" if old_reminder else "создано"
-        confirmation_message = (
-            f"✅ Напоминание {action_text}\n\n"
-            f"📅 <b>Дата:</b> {formatted_date}\n"
-            f"⏰ <b>Время:</b> {reminder_time.strftime('%H:%M')}\n"
-            f"{REMINDER_EMOJI[rem_type]} <b>Тип:</b> {type_name}\n"
-            f"📝 <b>Текст:</b> {text}\n\n"
-            f"<i>Я напомню вам об этом {formatted_date} в {reminder_time.strftime('%H:%M')}</i>"
-        )
-        
-        await bot.send_message(user_id, confirmation_message, parse_mode="HTML")
-        return True
-        
-    except Exception as e:
-        print(f"Error in schedule_reminder: {e}")
-        return False
-
-async def reminder_task(bot, user_id: int, delay: float, text: str):
-    try:
-        await asyncio.sleep(delay)
-        await send_reminder(bot, user_id, text)
-        
-        user_id_str = str(user_id)
-        if user_id_str in reminders:
-            reminders[user_id_str] = [rem for rem in reminders[user_id_str] if rem['text'] != text]
-            if not reminders[user_id_str]:
-                del reminders[user_id_str]
-            await save_reminders(reminders)
-
-        if user_id_str in user_tasks and text in user_tasks[user_id_str]:
-            del user_tasks[user_id_str][text]
-            
-    except Exception as e:
-        print(f"Error in reminder_task: {e}")
-
-async def edit_reminder(bot, user_id: int, rem_id: int, new_time: datetime, new_text: str):
-    user_id_str = str(user_id)
-    if user_id_str not in reminders:
-        await bot.send_message(user_id, "❌ У вас нет напоминаний")
-        return
-
-    reminder_to_edit = next((rem for rem in reminders[user_id_str] if rem['id'] == rem_id), None)
-    if not reminder_to_edit:
-        await bot.send_message(user_id, "❌ Напоминание не найдено")
-        return
-
-    if user_id_str in user_tasks and reminder_to_edit['text'] in user_tasks[user_id_str]:
-        user_tasks[user_id_str][reminder_to_edit['text']].cancel()
-        del user_tasks[user_id_str][reminder_to_edit['text']]
-
-    reminders[user_id_str] = [rem for rem in reminders[user_id_str] if rem['id'] != rem_id]
-
-    if await schedule_reminder(bot, user_id, new_time, new_text):
-        await save_reminders(reminders)
-        await bot.send_message(user_id, f"✅ Напоминание обновлено на {new_time.strftime('%d.%m.%Y %H:%M')}")
-    else:
-        await bot.send_message(user_id, "❌ Не удалось обновить напоминание")
-
-@router.message(lambda message: message.text == "Установить напоминание")
-async def set_reminder_start(message: types.Message):
-    try:
-        user_id = message.from_user.id
-        now = datetime.now()
-        waiting_for[user_id] = ('calendar', 'default')
-        
-        keyboard = create_calendar_keyboard(now.year, now.month)
-        
-        await message.answer(
-            'Выберите дату:',
-            reply_markup=keyboard
-        )
-        
-    except Exception as e:
-        print(f"Error in set_reminder_start: {e}")
-        await message.answer("Произошла ошибка при запуске установки напоминания")
-
-@router.callback_query(lambda c: c.data == "back_to_calendar")
-async def process_back_to_calendar(callback_query: types.CallbackQuery):
-    user_id = callback_query.from_user.id
-    now = datetime.now()
-    current_action = waiting_for.get(user_id)
-    
-    is_editing = isinstance(current_action, tuple) and current_action[0] in ['edit_time', 'set_time']
-    
-    if is_editing:
-        rem_type = current_action[2] if len(current_action) > 2 else 'default'
-        if len(current_action) > 3:
-            waiting_for[str(user_id) + '_edit_id'] = current_action[3]
-            waiting_for[user_id] = 'edit_calendar'
-        else:
-            waiting_for[user_id] = ('calendar', rem_type)
-    else:
-        waiting_for[user_id] = ('calendar', 'default')
-    
-    await callback_query.message.edit_text(
-        'Выберите дату:',
-        reply_markup=create_calendar_keyboard(now.year, now.month)
-    )
-
-@router.callback_query(lambda c: c.data == 'ignore')
-async def process_ignore(callback_query: types.CallbackQuery):
-    await callback_query.answer()
+import asyncio
+import os
+import re
+import time
+from functools import partial
+from datetime import datetime
+from aiogram import types, Router, F
+from aiogram.filters import Command, CommandObject
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.state import State, StatesGroup
+from typing import Dict, Any, List, Optional, Set, Tuple, Union
+
+from callbacks import CallbackTable, pack
+from delivery import DeliveryQueue
+from keyboard import (
+    REMINDER_EMOJI, create_calendar_keyboard, create_main_keyboard, create_minutes_keyboard,
+    create_reminder_type_keyboard, create_repeat_keyboard, create_time_keyboard, create_timezone_keyboard,
+    create_year_month_keyboard
+)
+from lease import LEASE_HEARTBEAT, Lease
+from metrics import STAGE_LAG
+from recurrence import make_rule, next_occurrence
+from reminder import DEAD, OUTBOX, PENDING, IdGenerator, Reminder, ReminderType
+from render import Locale, clock, get_locale, render_confirmation, render_fired, render_list
+from scheduler import Scheduler
+from storage import create_storage, format_reminder_time
+from timezones import (
+    DEFAULT_TIMEZONE, get_zone, is_ambiguous, is_skipped, is_valid_zone, local_now, local_time, local_to_epoch
+)
+
+CATCHUP_GRACE = 15 * 60
+CATCHUP_WORKERS = 10
+RESTORE_CHUNK = 10000
+PRESTAGE_LEAD = 30
+DEAD_LETTER_AFTER = 5
+RETRY_DELAY = 60
+PAGE_SIZE = 10
+# keeps a page of the longest reminders well inside Telegram's 4096-character message limit
+PAGE_TEXT_LIMIT = 200
+# a bulk-delete selection left untouched this long no longer applies to its keyboard
+DELETE_SELECTION_TTL = 600
+
+router = Router()
+callback = CallbackTable()
+scheduler = Scheduler(lead=PRESTAGE_LEAD)
+delivery = DeliveryQueue()
+shard = os.getenv('REMINDER_SHARD')
+storage = create_storage(os.getenv('REMINDER_STORAGE', 'memory'), int(shard) if shard else None)
+reminder_ids = IdGenerator(int(os.getenv('REMINDER_NODE_ID', shard or '0')))
+# (user_id, rem_id) handed to delivery and not yet reported sent or failed
+in_flight: Set[Tuple[int, int]] = set()
+# set when replicas share the storage and only the lease holder fires reminders
+scheduler_lease: Optional[Lease] = None
+
+class ReminderForm(StatesGroup):
+    # data: rem_type, date, time, repeat, and edit_id when an existing reminder is being replaced
+    choosing_type = State()
+    choosing_date = State()
+    choosing_time = State()
+    choosing_repeat = State()
+    entering_text = State()
+
+def create_reminder_object(due: int, text: str, rem_type: str = 'default', repeat: Optional[str] = None,
+                           tz: Optional[str] = None) -> Reminder:
+    return Reminder(reminder_ids.next(), due, text, ReminderType(rem_type), tz, repeat=repeat)
+
+async def user_timezone(user_id: int) -> str:
+    return await storage.get_timezone(user_id) or DEFAULT_TIMEZONE
+
+def user_locale(user: types.User) -> Locale:
+    return get_locale(user.language_code)
+
+async def reminder_locale(user_id: int) -> Locale:
+    # reminders fire outside any update, so they go by the language saved from the user's last one
+    return get_locale(await storage.get_language(user_id))
+
+async def remember_language(user: types.User):
+    if user.language_code and await storage.get_language(user.id) != user.language_code:
+        await storage.set_language(user.id, user.language_code)
+
+def is_scheduler_leader() -> bool:
+    return scheduler_lease is None or scheduler_lease.held
+
+
+@router.message(Command("start"))
+async def cmd_start(message: types.Message):
+    markup = create_main_keyboard()
+    
+    await message.answer(
+        "Привет! Я бот напоминаний. 🤖\n"
+        "Нужна помощь? Используйте /help для получения подробных инструкций.",
+        reply_markup=markup
+    )
+
+@router.message(Command("help"))
+async def cmd_help(message: types.Message):
+    await message.answer(user_locale(message.from_user).help, parse_mode="HTML")
+
+@router.message(Command("timezone"))
+@router.message(F.text == "Часовой пояс")
+async def show_timezone(message: types.Message, command: Optional[CommandObject] = None):
+    user_id = message.from_user.id
+    if command is not None and command.args:
+        tz = command.args.strip()
+        if not is_valid_zone(tz):
+            await message.answer("❌ Неизвестный часовой пояс. Укажите его в формате Europe/Moscow")
+            return
+        await storage.set_timezone(user_id, tz)
+        await remember_language(message.from_user)
+        await message.answer(f"✅ Часовой пояс изменён: {tz}\nСейчас у вас {local_now(get_zone(tz)):%H:%M}")
+        return
+
+    tz = await user_timezone(user_id)
+    await message.answer(
+        f"🌍 Ваш часовой пояс: {tz}\n"
+        f"Сейчас у вас {local_now(get_zone(tz)):%H:%M}\n\n"
+        "Выберите часовой пояс или отправьте его названием, например /timezone Europe/Berlin",
+        reply_markup=create_timezone_keyboard(tz)
+    )
+
+@callback('tz')
+async def process_timezone(callback_query: types.CallbackQuery, tz: str):
+    if not is_valid_zone(tz):
+        await callback_query.answer("❌ Неизвестный часовой пояс")
+        return
+    await storage.set_timezone(callback_query.from_user.id, tz)
+    await remember_language(callback_query.from_user)
+    await callback_query.message.edit_text(
+        f"✅ Часовой пояс изменён: {tz}\nСейчас у вас {local_now(get_zone(tz)):%H:%M}"
+    )
+
+@router.message(F.text == "Установить напоминание")
+async def set_reminder_start(message: types.Message, state: FSMContext):
+    await state.set_state(ReminderForm.choosing_type)
+    await state.set_data({})
+    await message.answer(
+        'Выберите тип напоминания:',
+        reply_markup=create_reminder_type_keyboard()
+    )
+
+@callback('edit')
+async def process_edit_reminder(callback_query: types.CallbackQuery, rem_id: int, *, state: FSMContext):
+    reminder = await storage.get(callback_query.from_user.id, rem_id)
+    if not reminder:
+        await callback_query.answer("❌ Напоминание не найдено")
+        return
+    
+    now = local_now(get_zone(await user_timezone(callback_query.from_user.id)))
+    await state.set_state(ReminderForm.choosing_date)
+    await state.set_data({'edit_id': rem_id, 'rem_type': reminder.type.value})
+    
+    calendar_keyboard = create_calendar_keyboard(now.year, now.month)
+    
+    await callback_query.message.edit_text(
+        "📅 Выберите новую дату напоминания:",
+        reply_markup=calendar_keyboard
+    )
+
+@callback('back_to_reminders')
+async def process_back_to_reminders(callback_query: types.CallbackQuery, *, state: FSMContext):
+    await state.clear()
+    await show_page(callback_query, 'manage')
+
+@callback('day')
+async def process_calendar_day(callback_query: types.CallbackQuery, year: str, month: str, day: str, *, state: FSMContext):
+    selected_date = datetime(int(year), int(month), int(day))
+    zone = get_zone(await user_timezone(callback_query.from_user.id))
+    current_date = local_now(zone).replace(hour=0, minute=0, second=0, microsecond=0)
+    
+    if selected_date < current_date:
+        await callback_query.answer("❌ Нельзя выбрать дату в прошлом!", show_alert=True)
+        return
+        
+    formatted_date = f"{day.zfill(2)}.{month.zfill(2)}.{year}"
+    
+    await callback_query.message.edit_text(
+        f"Выбрана дата: {formatted_date}\nВыберите час:",
+        reply_markup=create_time_keyboard()
+    )
+    
+    await state.set_state(ReminderForm.choosing_time)
+    await state.update_data(date=formatted_date)
+
+@callback('hour')
+async def process_time_selection(callback_query: types.CallbackQuery, hour: str):
+    await callback_query.message.edit_reply_markup(
+        reply_markup=create_minutes_keyboard(hour)
+    )
+
+@callback('back_to_hours')
+async def process_back_to_hours(callback_query: types.CallbackQuery):
+    await callback_query.message.edit_reply_markup(
+        reply_markup=create_time_keyboard()
+    )
+
+@callback('minute')
+async def process_full_time_selection(callback_query: types.CallbackQuery, hour: str, minutes: str, *, state: FSMContext):
+    time_str = f"{hour}:{minutes}"
+    data = await state.get_data()
+    
+    if 'date' not in data:
+        await callback_query.answer("Ошибка: начните процесс заново")
+        return
+    
+    date_str = data['date']
+    
+    reminder_time = datetime.strptime(f"{date_str} {time_str}", "%d.%m.%Y %H:%M")
+    if reminder_time < local_now(get_zone(await user_timezone(callback_query.from_user.id))):
+        await callback_query.answer("❌ Нельзя установить напоминание в прошлом!")
+        return
+    
+    await callback_query.message.edit_text(
+        f"Выбраны дата и время: {date_str} {time_str}\n"
+        f"Повторять напоминание?",
+        reply_markup=create_repeat_keyboard()
+    )
+    await state.set_state(ReminderForm.choosing_repeat)
+    await state.update_data(time=time_str)
+
+@callback('repeat')
+async def process_repeat_selection(callback_query: types.CallbackQuery, kind: str, *, state: FSMContext):
+    data = await state.get_data()
+    if 'time' not in data:
+        await callback_query.answer("Ошибка: начните процесс заново")
+        return
+
+    rem_type = data.get('rem_type', 'default')
+    locale = user_locale(callback_query.from_user)
+    type_name = locale.type_name(rem_type)
+    moment = datetime.strptime(f"{data['date']} {data['time']}", "%d.%m.%Y %H:%M")
+    rule = make_rule(kind, moment)
+    repeat_line = locale.repeat_line(repeat=locale.repeat_name(rule)) if rule else ""
+    await callback_query.message.edit_text(
+        f"Выбраны дата и время: {data['date']} {data['time']}\n"
+        f"Тип: {type_name} {REMINDER_EMOJI[rem_type]}\n"
+        f"{repeat_line}"
+        f"Теперь введите текст напоминания:"
+    )
+    await state.set_state(ReminderForm.entering_text)
+    await state.update_data(repeat=rule)
+
+@callback('type')
+async def process_reminder_type(callback_query: types.CallbackQuery, rem_type: str, *, state: FSMContext):
+    now = local_now(get_zone(await user_timezone(callback_query.from_user.id)))
+    
+    await state.set_state(ReminderForm.choosing_date)
+    await state.update_data(rem_type=rem_type)
+    await callback_query.message.edit_text(
+        'Выберите дату:',
+        reply_markup=create_calendar_keyboard(now.year, now.month)
+    )
+
+def shorten(text: str, limit: int) -> str:
+    return text[:limit] + ('...' if len(text) > limit else '')
+
+async def render_list_page(user: types.User, items: List[Reminder], zone, actions: bool = False):
+    total_count = await storage.count_user(user.id)
+    response = render_list(user_locale(user), items, zone, total_count, PAGE_TEXT_LIMIT, footer=not actions)
+
+    keyboard = []
+    if actions:
+        for rem in items:
+            keyboard.append([
+                types.InlineKeyboardButton(
+                    text="✏️ Изменить",
+                    callback_data=pack("edit", rem.id)
+                ),
+                types.InlineKeyboardButton(
+                    text="🗑 Удалить",
+                    callback_data=pack("delete", rem.id)
+                )
+            ])
+    return response, keyboard
+
+async def render_manage_page(user: types.User, items: List[Reminder], zone):
+    return await render_list_page(user, items, zone, actions=True)
+
+async def render_delete_page(user: types.User, items: List[Reminder], zone, selected: Set[int] = frozenset()):
+    keyboard = []
+    
+    for rem in items:
+        date_time = format_reminder_time(rem.due, zone)
+        emoji = REMINDER_EMOJI.get(rem.type, '⏰')
+        mark = '☑' if rem.id in selected else '☐'
+        dead = '⚠️ ' if rem.status == DEAD else ''
+        
+        keyboard.append([
+            types.InlineKeyboardButton(
+                text=f"{mark} {dead}{date_time} {emoji} {shorten(rem.text, 30)}",
+                callback_data=pack("select_del", rem.id)
+            )
+        ])
+    
+    keyboard.extend([
+        [
+            types.InlineKeyboardButton(text="✅ Выбрать все", callback_data=pack("select_all_del")),
+            types.InlineKeyboardButton(text="❌ Отменить все", callback_data=pack("deselect_all_del"))
+        ],
+        [
+            types.InlineKeyboardButton(text="🗑 Удалить выбранные", callback_data=pack("confirm_delete"))
+        ]
+    ])
+    
+    return (
+        "🗑 <b>Множественное удаление напоминаний</b>\n\n"
+        "<i>Инструкция:</i>\n"
+        "1️⃣ Нажмите на ☐ рядом с напоминанием, чтобы выбрать его\n"
+        "2️⃣ Выберите одно или несколько напоминаний\n"
+        "3️⃣ Используйте кнопки внизу для быстрого выбора\n"
+        "4️⃣ Нажмите «🗑 Удалить выбранные» для подтверждения\n\n"
+        "<i>❗️ Удаление необратимо</i>"
+    ), keyboard
+
+async def render_edit_page(user: types.User, items: List[Reminder], zone):
+    keyboard = []
+    
+    for rem in items:
+        time = format_reminder_time(rem.due, zone)
+        emoji = REMINDER_EMOJI.get(rem.type, '⏰')
+        dead = '⚠️ ' if rem.status == DEAD else ''
+        
+        keyboard.append([
+            types.InlineKeyboardButton(
+                text=f"✏️ {dead}{time} {emoji} {shorten(rem.text, 20)}",
+                callback_data=pack("edit", rem.id)
+            )
+        ])
+
+    return "Выберите напоминание для изменения:", keyboard
+
+PAGE_VIEWS = {
+    'list': render_list_page,
+    'manage': render_manage_page,
+    'delete': render_delete_page,
+    'edit': render_edit_page,
+}
+
+def page_navigation(view: str, items: List[Reminder], has_prev: bool, has_next: bool) -> list:
+    # cursors are the (due, id) of the page's edge reminders, so turning a page never counts from the start
+    row = []
+    if has_prev:
+        row.append(types.InlineKeyboardButton(
+            text="⬅️ Назад", callback_data=pack("page", view, "prev", items[0].due, items[0].id)
+        ))
+    if has_next:
+        row.append(types.InlineKeyboardButton(
+            text="Далее ➡️", callback_data=pack("page", view, "next", items[-1].due, items[-1].id)
+        ))
+    return [row] if row else []
+
+async def show_page(event: Union[types.Message, types.CallbackQuery], view: str,
+                    cursor: Optional[Tuple[int, int]] = None, backward: bool = False,
+                    state: Optional[FSMContext] = None):
+    # only the visible page is read from storage and rendered
+    user_id = event.from_user.id
+    send = event.message.edit_text if isinstance(event, types.CallbackQuery) else event.answer
+    items, has_prev, has_next = await storage.page_user(user_id, cursor, PAGE_SIZE, backward)
+    if not items and cursor is not None:
+        # everything past the cursor was deleted in the meantime
+        cursor = None
+        items, has_prev, has_next = await storage.page_user(user_id, None, PAGE_SIZE)
+    if not items:
+        await send("📭 У вас нет активных напоминаний")
+        return
+    if view == 'delete' and state is not None:
+        # a new page starts an empty selection: it is scoped to what the user can see
+        await save_delete_selection(state, {
+            'cursor': list(cursor) if cursor is not None else None,
+            'backward': backward,
+            'page': [rem.id for rem in items],
+            'selected': [],
+        })
+
+    zone = get_zone(await user_timezone(user_id))
+    text, keyboard = await PAGE_VIEWS[view](event.from_user, items, zone)
+    keyboard.extend(page_navigation(view, items, has_prev, has_next))
+    await send(
+        text,
+        reply_markup=types.InlineKeyboardMarkup(inline_keyboard=keyboard) if keyboard else None,
+        parse_mode="HTML"
+    )
+
+@callback('page')
+async def process_page(callback_query: types.CallbackQuery, view: str, direction: str, due: int, rem_id: int,
+                       *, state: FSMContext):
+    if view not in PAGE_VIEWS:
+        await callback_query.answer()
+        return
+    await show_page(callback_query, view, (due, rem_id), direction == 'prev', state)
+
+async def save_delete_selection(state: FSMContext, selection: Dict[str, Any]):
+    # kept in the FSM data next to any dialog in progress; page and selected hold reminder ids
+    selection['expires'] = time.time() + DELETE_SELECTION_TTL
+    await state.update_data(delete_selection=selection)
+
+async def load_delete_selection(callback_query: types.CallbackQuery, state: FSMContext) -> Optional[Dict[str, Any]]:
+    selection = (await state.get_data()).get('delete_selection')
+    if selection is None or selection['expires'] < time.time():
+        await callback_query.answer("⌛ Выбор устарел, откройте список удаления заново", show_alert=True)
+        return None
+    return selection
+
+async def drop_delete_selection(state: FSMContext):
+    data = await state.get_data()
+    if data.pop('delete_selection', None) is not None:
+        await state.set_data(data)
+
+async def refresh_delete_page(callback_query: types.CallbackQuery, selection: Dict[str, Any]):
+    # redraws just the current page's keyboard from storage and the stored selection
+    user_id = callback_query.from_user.id
+    cursor = tuple(selection['cursor']) if selection['cursor'] is not None else None
+    items, has_prev, has_next = await storage.page_user(user_id, cursor, PAGE_SIZE, selection['backward'])
+    zone = get_zone(await user_timezone(user_id))
+    _, keyboard = await render_delete_page(callback_query.from_user, items, zone, set(selection['selected']))
+    keyboard.extend(page_navigation('delete', items, has_prev, has_next))
+    await callback_query.message.edit_reply_markup(
+        reply_markup=types.InlineKeyboardMarkup(inline_keyboard=keyboard)
+    )
+
+@router.message(F.text == 'Мои напоминания')
+async def show_reminders(message: types.Message):
+    try:
+        await show_page(message, 'list')
+    except Exception as e:
+        print(f"Error sending reminders: {e}")
+        await message.answer("⚠️ Не удалось отобразить список напоминаний.")
+
+@router.message(F.text == "Удалить напоминания")
+async def show_delete_reminders(message: types.Message, state: FSMContext):
+    await show_page(message, 'delete', state=state)
+
+@callback('select_del')
+async def process_select_reminder(callback_query: types.CallbackQuery, rem_id: int, *, state: FSMContext):
+    selection = await load_delete_selection(callback_query, state)
+    if selection is None:
+        return
+    if rem_id not in selection['page']:
+        await callback_query.answer()
+        return
+
+    selected = set(selection['selected'])
+    selected ^= {rem_id}
+    selection['selected'] = list(selected)
+    await save_delete_selection(state, selection)
+    await refresh_delete_page(callback_query, selection)
+
+@callback('select_all_del')
+async def process_select_all(callback_query: types.CallbackQuery, *, state: FSMContext):
+    selection = await load_delete_selection(callback_query, state)
+    if selection is None:
+        return
+    if len(selection['selected']) == len(selection['page']):
+        await callback_query.answer("Все напоминания уже выбраны")
+        return
+
+    selection['selected'] = list(selection['page'])
+    await save_delete_selection(state, selection)
+    await refresh_delete_page(callback_query, selection)
+
+@callback('deselect_all_del')
+async def process_deselect_all(callback_query: types.CallbackQuery, *, state: FSMContext):
+    selection = await load_delete_selection(callback_query, state)
+    if selection is None:
+        return
+    if not selection['selected']:
+        await callback_query.answer("Все напоминания уже сняты")
+        return
+
+    selection['selected'] = []
+    await save_delete_selection(state, selection)
+    await refresh_delete_page(callback_query, selection)
+
+@callback('confirm_delete')
+async def process_confirm_delete(callback_query: types.CallbackQuery, *, state: FSMContext):
+    user_id = callback_query.from_user.id
+    selection = await load_delete_selection(callback_query, state)
+    if selection is None:
+        return
+    
+    selected_ids = selection['selected']
+    if not selected_ids:
+        await callback_query.answer("❌ Не выбрано ни одного напоминания")
+        return
+    
+    # one storage batch and one scheduler batch for the whole selection
+    deleted_count = await storage.remove_many(user_id, selected_ids)
+    cancel_reminders(user_id, selected_ids)
+    await drop_delete_selection(state)
+    
+    await callback_query.message.edit_text(
+        f"✅ Успешно удалено напоминаний: {deleted_count}\n\n"
+        f"<i>Используйте команду «Мои напоминания» для просмотра оставшихся напоминаний</i>",
+        parse_mode="HTML"
+    )
+
+@router.message(F.text == "Изменить напоминание")
+async def edit_reminder_start(message: types.Message):
+    await show_page(message, 'edit')
+
+@callback('delete')
+async def process_reminder_action(callback_query: types.CallbackQuery, rem_id: int):
+    user_id = callback_query.from_user.id
+    
+    reminder = await storage.get(user_id, rem_id)
+    if not reminder:
+        await callback_query.answer("❌ Напоминание не найдено")
+        return
+    
+    cancel_reminder(user_id, rem_id)
+    await storage.remove(user_id, rem_id)
+    await callback_query.message.edit_text("✅ Напоминание удалено")
+    
+    await callback_query.answer()
+
+@callback('ignore')
+async def process_ignore(callback_query: types.CallbackQuery):
+    await callback_query.answer()
+
+@callback('months')
+async def process_show_months(callback_query: types.CallbackQuery, year: str):
+    try:
+        new_markup = create_year_month_keyboard(int(year))
+        
+        if callback_query.message.reply_markup != new_markup:
+            await callback_query.message.edit_reply_markup(reply_markup=new_markup)
+        else:
+            await callback_query.answer()
+            
+    except Exception as e:
+        print(f"Error in show months: {e}")
+        await callback_query.answer("Ошибка при отображении месяцев")
+
+@callback('calendar')
+async def process_calendar_navigation(callback_query: types.CallbackQuery, year: str, month: str):
+    try:
+        new_markup = create_calendar_keyboard(int(year), int(month))
+        
+        if callback_query.message.reply_markup != new_markup:
+            await callback_query.message.edit_reply_markup(reply_markup=new_markup)
+        else:
+            await callback_query.answer()
+            
+    except Exception as e:
+        print(f"Error in calendar navigation: {e}")
+        await callback_query.answer("Ошибка при навигации по календарю")
+
+@router.message(ReminderForm.entering_text, F.text)
+async def handle_text(message: types.Message, state: FSMContext):
+    if message.text.startswith('/'):
+        return
+        
+    user_id = message.from_user.id
+    data = await state.get_data()
+    date_str, time_str = data['date'], data['time']
+    rem_type = data.get('rem_type', 'default')
+    text = message.text
+    
+    reminder_time = datetime.strptime(f"{date_str} {time_str}", "%d.%m.%Y %H:%M")
+    await remember_language(message.from_user)
+    success = await schedule_reminder(
+        message.bot, user_id, reminder_time, text, rem_type, data.get('edit_id'), data.get('repeat'),
+        user_locale(message.from_user)
+    )
+    
+    if not success:
+        await message.answer("❌ Не удалось установить напоминание")
+    
+    await state.clear()
+
+async def send_reminder(user_id: int, reminder: Reminder, release_at: Optional[float] = None):
+    locale = await reminder_locale(user_id)
+    reminder_message = render_fired(locale, reminder, get_zone(reminder.tz))
+    
+    await delivery.put(
+        user_id,
+        reminder_message,
+        parse_mode="HTML",
+        fallback=locale.fired_fallback(text=reminder.text),
+        key=(user_id, reminder.id),
+        release_at=release_at or reminder.due
+    )
+
+def cancel_reminder(user_id: int, rem_id: int):
+    scheduler.cancel(rem_id)
+    if delivery.cancel((user_id, rem_id)):
+        in_flight.discard((user_id, rem_id))
+
+def cancel_reminders(user_id: int, rem_ids: List[int]):
+    scheduler.cancel_many(rem_ids)
+    for rem_id in rem_ids:
+        if delivery.cancel((user_id, rem_id)):
+            in_flight.discard((user_id, rem_id))
+
+async def schedule_reminder(bot, user_id: int, reminder_time: datetime, text: str, rem_type: str = 'default',
+                            old_id: Optional[int] = None, repeat: Optional[str] = None,
+                            locale: Optional[Locale] = None) -> bool:
+    try:
+        # reminder_time is the wall-clock time the user picked; only the UTC epoch is stored
+        tz = await user_timezone(user_id)
+        zone = get_zone(tz)
+        due = local_to_epoch(reminder_time, zone)
+        if due < time.time():
+            await bot.send_message(user_id, "❌ Нельзя установить напоминание в прошлом!")
+            return False
+
+        old_reminder = await storage.get(user_id, old_id) if old_id is not None else None
+        
+        if old_reminder:
+            cancel_reminder(user_id, old_id)
+            await storage.remove(user_id, old_id)
+        
+        reminder_obj = create_reminder_object(
+            due=due,
+            text=text,
+            rem_type=rem_type,
+            repeat=repeat,
+            tz=tz
+        )
+        
+        await storage.add(user_id, reminder_obj)
+        if is_scheduler_leader():
+            # on other replicas the leader picks it up from storage on its next sync
+            scheduler.schedule(reminder_obj.id, reminder_obj.due, user_id)
+        
+        locale = locale or await reminder_locale(user_id)
+        note = ""
+        if is_skipped(reminder_time, zone):
+            note = locale.skipped_note(time=clock(reminder_time))
+        elif is_ambiguous(reminder_time, zone):
+            note = locale.ambiguous_note(time=clock(reminder_time))
+        # shown from the stored epoch, so a skipped time appears as the moment it actually fires
+        confirmation_message = render_confirmation(
+            locale, local_time(due, zone), rem_type, text, repeat, note, updated=old_reminder is not None
+        )
+        
+        await bot.send_message(user_id, confirmation_message, parse_mode="HTML")
+        return True
+        
+    except Exception as e:
+        print(f"Error in schedule_reminder: {e}")
+        return False
+
+async def reminder_task(bot, rem_id: int, user_id: int):
+    try:
+        if not is_scheduler_leader():
+            return
+        reminder = await storage.get(user_id, rem_id)
+        if not reminder or reminder.status not in (PENDING, OUTBOX):
+            return
+
+        # fired lead seconds early on purpose, so only the time past that counts as lag
+        STAGE_LAG.observe(max(time.time() - (reminder.due - scheduler.lead), 0.0))
+        if reminder.status == PENDING:
+            # persisted before it is queued: from here a crash means redelivery, not a lost reminder
+            reminder.status = OUTBOX
+            await storage.add(user_id, reminder)
+        in_flight.add((user_id, rem_id))
+        await send_reminder(user_id, reminder)
+            
+    except Exception as e:
+        print(f"Error in reminder_task: {e}")
+
+async def reminder_delivered(key: Tuple[int, int], status: str, attempts: int):
+    user_id, rem_id = key
+    in_flight.discard(key)
+    if status == 'sent':
+        reminder = await storage.get(user_id, rem_id)
+        if reminder is not None and reminder.repeat:
+            rearmed = await rearm_reminder(user_id, reminder)
+            if is_scheduler_leader():
+                scheduler.schedule(rearmed.id, rearmed.due, user_id)
+        else:
+            await storage.remove(user_id, rem_id)
+        # a crash before this reaches disk resends the reminder, so the window is kept to one write
+        await storage.flush()
+        return
+
+    reminder = await storage.get(user_id, rem_id)
+    if not reminder:
+        return
+    # attempts counts failed delivery rounds, each of which already retried transient errors
+    reminder.attempts += 1
+    if reminder.attempts >= DEAD_LETTER_AFTER:
+        reminder.status = DEAD
+        print(f"Reminder {rem_id} for {user_id} dead-lettered after {reminder.attempts} failed deliveries")
+    await storage.add(user_id, reminder)
+    if reminder.status == OUTBOX and is_scheduler_leader():
+        in_flight.add(key)
+        await send_reminder(user_id, reminder, time.time() + RETRY_DELAY * 2 ** (reminder.attempts - 1))
+
+async def rearm_reminder(user_id: int, reminder: Reminder) -> Reminder:
+    # only the next occurrence is stored and scheduled; the one after is computed when this one fires.
+    # a new record keeps the storage's due-ordered index intact
+    rearmed = Reminder(
+        reminder.id, next_occurrence(reminder.repeat, max(reminder.due, time.time()), reminder.tz), reminder.text,
+        reminder.type, reminder.tz, repeat=reminder.repeat
+    )
+    await storage.add(user_id, rearmed)
+    return rearmed
+
+async def catch_up_reminders(bot, overdue: List[Tuple[int, int]], workers: int = CATCHUP_WORKERS) -> None:
+    queue: asyncio.Queue = asyncio.Queue()
+    for item in overdue:
+        queue.put_nowait(item)
+
+    async def worker():
+        while not queue.empty():
+            rem_id, user_id = queue.get_nowait()
+            await reminder_task(bot, rem_id, user_id)
+
+    await asyncio.gather(*(worker() for _ in range(min(workers, len(overdue)))))
+
+async def restore_reminders(bot, grace: float = CATCHUP_GRACE, fired_up_to: Optional[int] = None) -> asyncio.Task:
+    # fired_up_to is the watermark left by a previous lease holder: anything due after it
+    # was never handed to delivery, so it is caught up however late it is
+    started = time.perf_counter()
+    now = time.time()
+    pending = []
+    overdue = []
+    expired: Dict[int, List[int]] = {}
+    missed = []
+    dead = 0
+    processed = 0
+
+    async for user_id, rem in storage.iter_all():
+        processed += 1
+        if processed % RESTORE_CHUNK == 0:
+            await asyncio.sleep(0)
+        if rem.status not in (PENDING, OUTBOX):
+            dead += 1
+            continue
+        due = rem.due
+        if due > now:
+            pending.append((rem.id, due, user_id))
+        elif rem.status == OUTBOX or now - due <= grace or (fired_up_to is not None and due > fired_up_to):
+            # outbox reminders were fired but never confirmed sent, so they are never given up as expired
+            overdue.append((rem.id, user_id))
+        elif rem.repeat:
+            # a recurring reminder skips the occurrences missed while the bot was down
+            missed.append((user_id, rem))
+        else:
+            expired.setdefault(user_id, []).append(rem.id)
+
+    for user_id, rem_ids in expired.items():
+        await storage.remove_many(user_id, rem_ids)
+    for user_id, rem in missed:
+        rearmed = await rearm_reminder(user_id, rem)
+        pending.append((rearmed.id, rearmed.due, user_id))
+    scheduler.schedule_many(pending)
+    catch_up = asyncio.create_task(catch_up_reminders(bot, overdue))
+
+    print(
+        f"Restored {len(pending)} reminders, {len(overdue)} overdue queued for catch-up, "
+        f"{sum(map(len, expired.values()))} expired dropped, {len(missed)} recurring re-armed, "
+        f"{dead} dead-lettered skipped "
+        f"in {time.perf_counter() - started:.2f}s"
+    )
+    return catch_up
+
+async def sync_reminders(after: float, until: float) -> int:
+    # reminders other replicas wrote to the shared storage since the last sync
+    found = [
+        (rem.id, rem.due, user_id) for user_id, rem in await storage.pending_between(int(after), int(until))
+        if rem.id not in scheduler and (user_id, rem.id) not in in_flight
+    ]
+    if found:
+        scheduler.schedule_many(found)
+    return len(found)
+
+async def lead_scheduler(bot, lease: Lease, heartbeat: float = LEASE_HEARTBEAT) -> None:
+    global scheduler_lease
+    scheduler_lease = lease
+    while True:
+        if not await lease.acquire():
+            await asyncio.sleep(heartbeat)
+            continue
+
+        print(f"Acquired scheduler lease as {lease.owner}, resuming after {lease.fired_up_to}")
+        scheduler.fired_up_to = lease.fired_up_to or 0
+        # restore has already queued everything due before it started, overdue ones included
+        restored = synced = time.time()
+        catch_up = await restore_reminders(bot, fired_up_to=lease.fired_up_to)
+        scheduler.start(partial(reminder_task, bot))
+        try:
+            while await lease.renew(scheduler.fired_up_to):
+                now = time.time()
+                # the overlap covers reminders committed by another replica just after the last query
+                await sync_reminders(max(synced - heartbeat, restored), now + scheduler.max_lead + heartbeat)
+                synced = now
+                await asyncio.sleep(heartbeat)
+        finally:
+            catch_up.cancel()
+            await scheduler.stop()
+            scheduler.clear()
+            # staged messages now belong to the next leader, which resends anything still pending
+            for key in list(in_flight):
+                if delivery.cancel(key):
+                    in_flight.discard(key)
+        print("Lost scheduler lease")
+
+async def edit_reminder(bot, user_id: int, rem_id: int, new_time: datetime, new_text: str):
+    reminder_to_edit = await storage.get(user_id, rem_id)
+    if not reminder_to_edit:
+        await bot.send_message(user_id, "❌ Напоминание не найдено")
+        return
+
+    cancel_reminder(user_id, rem_id)
+    await storage.remove(user_id, rem_id)
+
+    if await schedule_reminder(bot, user_id, new_time, new_text):
+        await bot.send_message(user_id, f"✅ Напоминание обновлено на {new_time.strftime('%d.%m.%Y %H:%M')}")
+    else:
+        await bot.send_message(user_id, "❌ Не удалось обновить напоминание")
+
+@router.message(lambda message: message.text == "Установить напоминание")
+async def set_reminder_start(message: types.Message, state: FSMContext):
+    try:
+        now = local_now(get_zone(await user_timezone(message.from_user.id)))
+        await state.set_state(ReminderForm.choosing_date)
+        await state.set_data({'rem_type': 'default'})
+        
+        keyboard = create_calendar_keyboard(now.year, now.month)
+        
+        await message.answer(
+            'Выберите дату:',
+            reply_markup=keyboard
+        )
+        
+    except Exception as e:
+        print(f"Error in set_reminder_start: {e}")
+        await message.answer("Произошла ошибка при запуске установки напоминания")
+
+@callback('back_to_calendar')
+async def process_back_to_calendar(callback_query: types.CallbackQuery, *, state: FSMContext):
+    now = local_now(get_zone(await user_timezone(callback_query.from_user.id)))
+    # type and edit target chosen so far are kept, only the date is picked again
+    await state.set_state(ReminderForm.choosing_date)
+    
+    await callback_query.message.edit_text(
+        'Выберите дату:',
+        reply_markup=create_calendar_keyboard(now.year, now.month)
+    )
+
+@router.callback_query()
+async def route_callback(callback_query: types.CallbackQuery, state: FSMContext):
+    await callback.dispatch(callback_query, state=state)
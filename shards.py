@@ -0,0 +1,107 @@
+import asyncio
+import os
+import sys
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+from aiogram import Bot, Dispatcher
+from aiogram.types import Update, User
+
+SHARD_CONCURRENCY = 100
+SHARD_STOP_TIMEOUT = 30
+MAX_UPDATE_SIZE = 1024 * 1024
+
+
+def shard_of(user_id: int, shards: int) -> int:
+    return user_id % shards
+
+
+class ShardRouter:
+    # ingress side: an outer update middleware that hands each update to the worker owning its user
+    def __init__(self, command: List[str], shards: int, stdout: Optional[int] = None):
+        self.command = command
+        self.shards = shards
+        self.stdout = stdout
+        self.routed = [0] * shards
+        self.dropped = 0
+        self.processes: List[asyncio.subprocess.Process] = []
+        self._locks: List[asyncio.Lock] = []
+
+    async def start(self) -> None:
+        for index in range(self.shards):
+            env = {**os.environ, 'REMINDER_SHARD': str(index)}
+            self.processes.append(await asyncio.create_subprocess_exec(
+                *self.command, '--shard', str(index),
+                stdin=asyncio.subprocess.PIPE, stdout=self.stdout, env=env
+            ))
+            self._locks.append(asyncio.Lock())
+
+    async def stop(self, timeout: float = SHARD_STOP_TIMEOUT) -> None:
+        # closing stdin lets each worker finish what it has read and shut down on its own
+        for process in self.processes:
+            if process.stdin is not None and not process.stdin.is_closing():
+                process.stdin.close()
+        try:
+            await asyncio.wait_for(asyncio.gather(*(process.wait() for process in self.processes)), timeout)
+        except asyncio.TimeoutError:
+            print(f"Shard workers did not stop within {timeout}s, killing them")
+            for process in self.processes:
+                if process.returncode is None:
+                    process.kill()
+        self.processes = []
+        self._locks = []
+
+    async def forward(self, update: Update, user: Optional[User] = None) -> None:
+        index = shard_of(user.id, self.shards) if user is not None else 0
+        line = update.model_dump_json(exclude_unset=True, by_alias=True).encode('utf-8') + b'\n'
+        stdin = self.processes[index].stdin
+        try:
+            async with self._locks[index]:
+                stdin.write(line)
+                await stdin.drain()
+        except (BrokenPipeError, ConnectionResetError) as e:
+            self.dropped += 1
+            print(f"Error forwarding update {update.update_id} to shard {index}: {e}")
+            return
+        self.routed[index] += 1
+
+    async def __call__(self, handler: Callable[[Update, Dict[str, Any]], Awaitable[Any]],
+                       event: Update, data: Dict[str, Any]) -> None:
+        await self.forward(event, data.get('event_from_user'))
+
+
+async def stdin_reader(limit: int = MAX_UPDATE_SIZE) -> asyncio.StreamReader:
+    reader = asyncio.StreamReader(limit=limit)
+    await asyncio.get_running_loop().connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), sys.stdin)
+    return reader
+
+
+async def serve_updates(bot: Bot, dp: Dispatcher, reader: asyncio.StreamReader,
+                        concurrency: int = SHARD_CONCURRENCY) -> None:
+    # worker side: one JSON update per line until the ingress closes the pipe
+    slots = asyncio.Semaphore(concurrency)
+    running: Set[asyncio.Task] = set()
+
+    async def feed(update: Update) -> None:
+        try:
+            await dp.feed_update(bot, update)
+        except Exception as e:
+            print(f"Error in shard update {update.update_id}: {e}")
+        finally:
+            slots.release()
+
+    while True:
+        line = await reader.readline()
+        if not line:
+            break
+        try:
+            update = Update.model_validate_json(line, context={'bot': bot})
+        except ValueError as e:
+            print(f"Error decoding shard update: {e}")
+            continue
+        # a full worker stops reading, the pipe fills up and the ingress waits in drain()
+        await slots.acquire()
+        task = asyncio.create_task(feed(update))
+        running.add(task)
+        task.add_done_callback(running.discard)
+
+    await asyncio.gather(*running)
@@ -0,0 +1,97 @@
+import asyncio
+import json
+import sys
+import threading
+import time
+import traceback
+from typing import Any, List, Optional
+
+from metrics import LOOP_DRIFT, LOOP_STALLS
+
+HEARTBEAT_INTERVAL = 0.1
+STALL_THRESHOLD = 0.5
+STACK_LIMIT = 30
+
+
+def log_event(event: str, **fields: Any) -> None:
+    # one JSON object per line, so stalls and late reminders can be grepped or shipped as they are
+    print(json.dumps({'time': round(time.time(), 3), 'event': event, **fields}, ensure_ascii=False, default=str),
+          flush=True)
+
+
+class LoopWatchdog:
+    # a heartbeat on the loop measures how late each wakeup is; a monitor thread notices a heartbeat that is
+    # overdue while the loop is still blocked and captures the loop thread's stack, which is gone once it resumes
+    def __init__(self, interval: float = HEARTBEAT_INTERVAL, threshold: float = STALL_THRESHOLD):
+        self.interval = interval
+        self.threshold = threshold
+        self.stalls = 0
+        self.max_drift = 0.0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread = 0
+        self._beat = 0.0
+        self._captured: Optional[dict] = None
+        self._task: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+
+    def start(self) -> None:
+        if self._task is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        self._beat = time.monotonic()
+        self._stopped.clear()
+        self._task = asyncio.create_task(self._heartbeat())
+        self._thread = threading.Thread(target=self._monitor, name='loop-watchdog', daemon=True)
+        self._thread.start()
+        print(f"Loop watchdog on: stalls over {self.threshold}s are logged with a stack")
+
+    async def stop(self) -> None:
+        self._stopped.set()
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval * 2)
+            self._thread = None
+
+    async def _heartbeat(self) -> None:
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            drift = max(now - expected, 0.0)
+            self._beat = now
+            captured, self._captured = self._captured, None
+            LOOP_DRIFT.observe(drift)
+            if drift > self.max_drift:
+                self.max_drift = drift
+            if drift > self.threshold:
+                self.stalls += 1
+                LOOP_STALLS.inc()
+                log_event('loop_stall', blocked=round(drift, 3), **(captured or {}))
+
+    def _monitor(self) -> None:
+        while not self._stopped.wait(self.interval):
+            if self._captured is not None:
+                continue
+            blocked = time.monotonic() - self._beat - self.interval
+            if blocked > self.threshold:
+                self._captured = self._capture()
+
+    def _capture(self) -> dict:
+        frame = sys._current_frames().get(self._loop_thread)
+        stack: List[str] = []
+        if frame is not None:
+            stack = [line.rstrip() for line in traceback.format_stack(frame, limit=STACK_LIMIT)]
+        try:
+            task = asyncio.current_task(self._loop)
+        except RuntimeError:
+            task = None
+        return {
+            'task': task.get_name() if task is not None else None,
+            'coroutine': getattr(task.get_coro(), '__qualname__', None) if task is not None else None,
+            'stack': stack,
+        }
@@ -0,0 +1,721 @@
+import asyncio
+import bisect
+import json
+import os
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+from metrics import PERSISTENCE_BYTES, PERSISTENCE_RECORDS, PERSISTENCE_SECONDS, PERSISTENCE_WAIT
+from reminder import PENDING, Reminder, ReminderType
+from timezones import DEFAULT_TIMEZONE, get_zone
+
+FSYNC_INTERVAL = 0.05
+COMPACT_INTERVAL = 600
+COMPACT_MIN_RECORDS = 10000
+# user ids are numeric strings in the snapshot, so this key cannot clash with one
+TIMEZONES_KEY = 'timezones'
+LANGUAGES_KEY = 'languages'
+
+
+def parse_reminder_time(value: str, cache: Optional[Dict[str, float]] = None) -> float:
+    # value is "%d.%m.%Y %H:%M" in the default zone, read the way local_to_epoch reads a picked time;
+    # hours are cached so DST shifts stay correct
+    hour_key = value[:13]
+    base = cache.get(hour_key) if cache is not None else None
+    if base is None:
+        base = datetime(
+            int(value[6:10]), int(value[3:5]), int(value[0:2]), int(value[11:13]), tzinfo=get_zone(DEFAULT_TIMEZONE)
+        ).timestamp()
+        if cache is not None:
+            cache[hour_key] = base
+    return base + int(value[14:16]) * 60
+
+
+def format_reminder_time(due: int, zone: Optional[ZoneInfo] = None) -> str:
+    return datetime.fromtimestamp(due, zone or get_zone()).strftime("%d.%m.%Y %H:%M")
+
+
+def legacy_reminder_id(value: str) -> int:
+    # ids used to be str(datetime.now().timestamp()); keep them as whole microseconds
+    return round(float(value) * 1000000)
+
+
+def upgrade_reminder(reminder: dict, cache: Optional[Dict[str, float]] = None) -> bool:
+    # older records carry a "time" string instead of epoch seconds and a float-timestamp string id
+    upgraded = False
+    if 'due' not in reminder:
+        reminder['due'] = int(parse_reminder_time(reminder.pop('time'), cache))
+        upgraded = True
+    if isinstance(reminder['id'], str):
+        reminder['id'] = legacy_reminder_id(reminder['id'])
+        upgraded = True
+    return upgraded
+
+
+def _dump(value: Any) -> str:
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':'), default=Reminder.to_dict)
+
+
+class ReminderLog:
+    def __init__(self, path: str = 'reminders.log', snapshot_path: str = 'reminders.snapshot.json',
+                 legacy_path: Optional[str] = 'reminders.json', coalesce_window: float = FSYNC_INTERVAL):
+        self.path = path
+        self.snapshot_path = snapshot_path
+        self.legacy_path = legacy_path
+        self.coalesce_window = coalesce_window
+        self.records = 0
+        self.writes = 0
+        self._file = None
+        self._pending: List[list] = []
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._snapshot: Optional[Callable[[], Dict[Any, list]]] = None
+        self._compact_task: Optional[asyncio.Task] = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='reminder-log')
+
+    async def open(self) -> Dict[str, list]:
+        return await asyncio.get_running_loop().run_in_executor(self._executor, self.load)
+
+    def load(self) -> Dict[str, list]:
+        if self.legacy_path is not None and not os.path.exists(self.snapshot_path) and os.path.exists(self.legacy_path):
+            self._migrate_legacy()
+
+        state: Dict[str, list] = {}
+        try:
+            with open(self.snapshot_path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            pass
+
+        # replayed into {id: reminder} per user, so a record costs the same however long the log is
+        timezones = state.pop(TIMEZONES_KEY, {})
+        languages = state.pop(LANGUAGES_KEY, {})
+        users = {user_id: {rem['id']: rem for rem in reminders} for user_id, reminders in state.items()}
+        self.records = 0
+        intact = size = 0
+        try:
+            with open(self.path, 'rb') as f:
+                for line in f:
+                    try:
+                        # a record only counts once its newline is on disk
+                        if not line.endswith(b'\n'):
+                            raise ValueError
+                        op, user_id, value = json.loads(line)
+                    except (ValueError, TypeError):
+                        # a torn tail from a crash mid-append; everything before it is intact
+                        break
+                    self._apply(users, timezones, languages, op, user_id, value)
+                    self.records += 1
+                    intact += len(line)
+            size = os.path.getsize(self.path)
+        except FileNotFoundError:
+            pass
+        if intact < size:
+            # cut the torn tail off, or the next append would be glued onto it and lost with it on every load
+            os.truncate(self.path, intact)
+            print(f"Truncated {size - intact} bytes of a torn record from {self.path}")
+        state = {user_id: list(reminders.values()) for user_id, reminders in users.items() if reminders}
+        if timezones:
+            state[TIMEZONES_KEY] = timezones
+        if languages:
+            state[LANGUAGES_KEY] = languages
+        return state
+
+    def put(self, user_id: int, reminder: Reminder) -> None:
+        self._append(['+', user_id, reminder.to_dict()])
+
+    def delete(self, user_id: int, rem_ids: List[int]) -> None:
+        # one record for the whole batch, so a torn tail never leaves half a bulk delete applied
+        self._append(['-', user_id, rem_ids[0] if len(rem_ids) == 1 else rem_ids])
+
+    def set_timezone(self, user_id: int, tz: str) -> None:
+        self._append(['z', user_id, tz])
+
+    def set_language(self, user_id: int, language: str) -> None:
+        self._append(['l', user_id, language])
+
+    def start(self, snapshot: Callable[[], Dict[Any, list]], compact_interval: float = COMPACT_INTERVAL) -> None:
+        self._snapshot = snapshot
+        self._compact_task = asyncio.create_task(self._compact_loop(compact_interval))
+
+    async def stop(self) -> None:
+        if self._compact_task is not None:
+            self._compact_task.cancel()
+            await asyncio.gather(self._compact_task, return_exceptions=True)
+            self._compact_task = None
+        await self.flush()
+        await asyncio.get_running_loop().run_in_executor(self._executor, self._close_file)
+        self._executor.shutdown(wait=True)
+
+    async def flush(self) -> None:
+        if self._pending:
+            self._submit()
+        # the writer thread runs jobs in order, so this returns once every earlier write is on disk
+        await asyncio.get_running_loop().run_in_executor(self._executor, lambda: None)
+
+    async def compact(self, state: Dict[Any, list]) -> None:
+        if self._pending:
+            self._submit()
+        compacted = self.records
+        await asyncio.get_running_loop().run_in_executor(self._executor, self._compact, state)
+        self.records -= compacted
+
+    @staticmethod
+    def _apply(users: Dict[str, Dict[int, dict]], timezones: Dict[str, str], languages: Dict[str, str], op: str,
+               user_id: Any, value: Any) -> None:
+        # snapshot keys are JSON object keys, so user ids are strings there
+        user_id = str(user_id)
+        if op == '+':
+            # replay may overlap a snapshot taken just before a crash, so puts must be idempotent;
+            # a re-put moves to the end, as it did when the lists were rebuilt
+            reminders = users.setdefault(user_id, {})
+            reminders.pop(value['id'], None)
+            reminders[value['id']] = value
+        elif op == '-' and user_id in users:
+            reminders = users[user_id]
+            for rem_id in value if isinstance(value, list) else (value,):
+                reminders.pop(rem_id, None)
+        elif op == 'z':
+            timezones[user_id] = value
+        elif op == 'l':
+            languages[user_id] = value
+
+    def _append(self, record: list) -> None:
+        self._pending.append(record)
+        self.records += 1
+        if self._flush_handle is None:
+            self._flush_handle = asyncio.get_running_loop().call_later(self.coalesce_window, self._submit)
+
+    def _submit(self) -> None:
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        batch, self._pending = self._pending, []
+        future = asyncio.get_running_loop().run_in_executor(self._executor, self._write_batch, batch)
+        future.add_done_callback(self._check_write)
+
+    @staticmethod
+    def _check_write(future: asyncio.Future) -> None:
+        if not future.cancelled() and future.exception() is not None:
+            print(f"Error writing reminder log: {future.exception()}")
+
+    def _write_batch(self, batch: List[list]) -> None:
+        started = time.perf_counter()
+        if self._file is None:
+            self._file = open(self.path, 'a', encoding='utf-8')
+        data = ''.join(_dump(record) + '\n' for record in batch)
+        self._file.write(data)
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self.writes += 1
+        PERSISTENCE_SECONDS.observe(time.perf_counter() - started, 'memory')
+        PERSISTENCE_RECORDS.observe(len(batch), 'memory')
+        PERSISTENCE_BYTES.observe(len(data.encode('utf-8')))
+
+    def _compact(self, state: Dict[Any, list]) -> None:
+        self._write_snapshot(state)
+        self._close_file()
+        with open(self.path, 'w', encoding='utf-8'):
+            pass
+
+    def _close_file(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _write_snapshot(self, state: Dict[Any, list]) -> None:
+        tmp_path = self.snapshot_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(_dump(state))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.snapshot_path)
+
+    def _migrate_legacy(self) -> None:
+        try:
+            with open(self.legacy_path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except json.JSONDecodeError:
+            state = {}
+        self._write_snapshot(state)
+        os.replace(self.legacy_path, self.legacy_path + '.migrated')
+
+    async def _compact_loop(self, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            if self.records < COMPACT_MIN_RECORDS:
+                continue
+            try:
+                await self.compact(self._snapshot())
+            except OSError as e:
+                print(f"Error compacting reminder log: {e}")
+
+
+class UserReminders:
+    # one user's reminders by id, plus the same records kept in due order on insert so listing never sorts
+    __slots__ = ('_by_id', '_order')
+
+    def __init__(self):
+        self._by_id: Dict[int, Reminder] = {}
+        self._order: List[Reminder] = []
+
+    def __len__(self) -> int:
+        return len(self._by_id)
+
+    def __iter__(self) -> Iterator[Reminder]:
+        return iter(self._order)
+
+    def get(self, rem_id: int) -> Optional[Reminder]:
+        return self._by_id.get(rem_id)
+
+    def put(self, reminder: Reminder) -> None:
+        self.pop(reminder.id)
+        self._by_id[reminder.id] = reminder
+        bisect.insort(self._order, reminder)
+
+    def pop(self, rem_id: int) -> Optional[Reminder]:
+        reminder = self._by_id.pop(rem_id, None)
+        if reminder is not None:
+            del self._order[bisect.bisect_left(self._order, reminder)]
+        return reminder
+
+    def first(self) -> Optional[Reminder]:
+        return self._order[0] if self._order else None
+
+    def page(self, cursor: Optional[Tuple[int, int]], limit: int,
+             backward: bool = False) -> Tuple[List[Reminder], bool, bool]:
+        # cursor is the (due, id) of the edge item of the page the user came from
+        order = self._order
+        if cursor is None:
+            start = 0
+        elif backward:
+            start = max(bisect.bisect_left(order, Reminder(cursor[1], cursor[0], '')) - limit, 0)
+        else:
+            start = bisect.bisect_right(order, Reminder(cursor[1], cursor[0], ''))
+        end = start + limit
+        return order[start:end], start > 0, end < len(order)
+
+
+class Storage:
+    # label for the persistence metrics
+    backend = ''
+
+    async def open(self) -> None:
+        pass
+
+    async def close(self) -> None:
+        pass
+
+    async def flush(self) -> None:
+        pass
+
+    async def get(self, user_id: int, rem_id: int) -> Optional[Reminder]:
+        raise NotImplementedError
+
+    async def list_user(self, user_id: int) -> List[Reminder]:
+        raise NotImplementedError
+
+    async def count_user(self, user_id: int) -> int:
+        raise NotImplementedError
+
+    async def page_user(self, user_id: int, cursor: Optional[Tuple[int, int]], limit: int,
+                        backward: bool = False) -> Tuple[List[Reminder], bool, bool]:
+        # one page of the user's reminders in due order after (or before) the (due, id) cursor,
+        # with whether there is anything on either side of it
+        raise NotImplementedError
+
+    async def add(self, user_id: int, reminder: Reminder) -> None:
+        raise NotImplementedError
+
+    async def remove(self, user_id: int, rem_id: int) -> bool:
+        return await self.remove_many(user_id, [rem_id]) > 0
+
+    async def remove_many(self, user_id: int, rem_ids: Iterable[int]) -> int:
+        raise NotImplementedError
+
+    async def pending_between(self, after: int, until: int) -> List[Tuple[int, Reminder]]:
+        raise NotImplementedError
+
+    def iter_all(self) -> AsyncIterator[Tuple[int, Reminder]]:
+        raise NotImplementedError
+
+    async def get_timezone(self, user_id: int) -> Optional[str]:
+        raise NotImplementedError
+
+    async def set_timezone(self, user_id: int, tz: str) -> None:
+        raise NotImplementedError
+
+    async def get_language(self, user_id: int) -> Optional[str]:
+        raise NotImplementedError
+
+    async def set_language(self, user_id: int, language: str) -> None:
+        raise NotImplementedError
+
+
+class MemoryStorage(Storage):
+    backend = 'memory'
+
+    def __init__(self, log: Optional[ReminderLog] = None):
+        self.log = log
+        self._by_user: Dict[int, UserReminders] = {}
+        self._timezones: Dict[int, str] = {}
+        self._languages: Dict[int, str] = {}
+
+    async def open(self) -> None:
+        if self.log is None:
+            return
+        cache: Dict[str, float] = {}
+        upgraded = 0
+        state = await self.log.open()
+        self._timezones = {int(user_id): tz for user_id, tz in state.pop(TIMEZONES_KEY, {}).items()}
+        self._languages = {int(user_id): language for user_id, language in state.pop(LANGUAGES_KEY, {}).items()}
+        for user_id, user_reminders in state.items():
+            for rem in user_reminders:
+                upgraded += upgrade_reminder(rem, cache)
+                self._insert(int(user_id), Reminder.from_dict(rem))
+        if upgraded:
+            await self.log.compact(self.snapshot())
+            print(f"Converted {upgraded} reminders to epoch due times")
+        self.log.start(self.snapshot)
+
+    async def close(self) -> None:
+        if self.log is not None:
+            await self.log.stop()
+
+    async def flush(self) -> None:
+        if self.log is not None:
+            started = time.perf_counter()
+            await self.log.flush()
+            PERSISTENCE_WAIT.observe(time.perf_counter() - started, self.backend)
+
+    def snapshot(self) -> Dict[Any, Any]:
+        state: Dict[Any, Any] = {user_id: list(user_reminders) for user_id, user_reminders in self._by_user.items()}
+        if self._timezones:
+            state[TIMEZONES_KEY] = dict(self._timezones)
+        if self._languages:
+            state[LANGUAGES_KEY] = dict(self._languages)
+        return state
+
+    async def get(self, user_id: int, rem_id: int) -> Optional[Reminder]:
+        user_reminders = self._by_user.get(user_id)
+        return user_reminders.get(rem_id) if user_reminders is not None else None
+
+    async def list_user(self, user_id: int) -> List[Reminder]:
+        user_reminders = self._by_user.get(user_id)
+        return list(user_reminders) if user_reminders is not None else []
+
+    async def count_user(self, user_id: int) -> int:
+        user_reminders = self._by_user.get(user_id)
+        return len(user_reminders) if user_reminders is not None else 0
+
+    async def page_user(self, user_id: int, cursor: Optional[Tuple[int, int]], limit: int,
+                        backward: bool = False) -> Tuple[List[Reminder], bool, bool]:
+        user_reminders = self._by_user.get(user_id)
+        if user_reminders is None:
+            return [], False, False
+        return user_reminders.page(cursor, limit, backward)
+
+    async def add(self, user_id: int, reminder: Reminder) -> None:
+        self._insert(user_id, reminder)
+        if self.log is not None:
+            started = time.perf_counter()
+            self.log.put(user_id, reminder)
+            PERSISTENCE_WAIT.observe(time.perf_counter() - started, self.backend)
+
+    async def remove_many(self, user_id: int, rem_ids: Iterable[int]) -> int:
+        user_reminders = self._by_user.get(user_id)
+        if not user_reminders:
+            return 0
+        started = time.perf_counter()
+        removed = [rem_id for rem_id in rem_ids if user_reminders.pop(rem_id) is not None]
+        if removed and self.log is not None:
+            self.log.delete(user_id, removed)
+            PERSISTENCE_WAIT.observe(time.perf_counter() - started, self.backend)
+        if not user_reminders:
+            del self._by_user[user_id]
+        return len(removed)
+
+    async def pending_between(self, after: int, until: int) -> List[Tuple[int, Reminder]]:
+        return [
+            (user_id, rem) for user_id, user_reminders in self._by_user.items() for rem in user_reminders
+            if after < rem.due <= until and rem.status == PENDING
+        ]
+
+    async def iter_all(self) -> AsyncIterator[Tuple[int, Reminder]]:
+        for user_id, user_reminders in list(self._by_user.items()):
+            for rem in list(user_reminders):
+                yield user_id, rem
+
+    async def get_timezone(self, user_id: int) -> Optional[str]:
+        return self._timezones.get(user_id)
+
+    async def set_timezone(self, user_id: int, tz: str) -> None:
+        self._timezones[user_id] = tz
+        if self.log is not None:
+            self.log.set_timezone(user_id, tz)
+
+    async def get_language(self, user_id: int) -> Optional[str]:
+        return self._languages.get(user_id)
+
+    async def set_language(self, user_id: int, language: str) -> None:
+        self._languages[user_id] = language
+        if self.log is not None:
+            self.log.set_language(user_id, language)
+
+    def _insert(self, user_id: int, reminder: Reminder) -> None:
+        user_reminders = self._by_user.get(user_id)
+        if user_reminders is None:
+            user_reminders = self._by_user[user_id] = UserReminders()
+        user_reminders.put(reminder)
+
+
+class SQLiteStorage(Storage):
+    backend = 'sqlite'
+
+    _INSERT = (
+        "INSERT OR REPLACE INTO reminders (id, user_id, due_at, tz, text, type, status, attempts, repeat) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)"
+    )
+    _SELECT = "SELECT user_id, id, due_at, tz, text, type, status, attempts, repeat FROM reminders"
+
+    def __init__(self, path: str = 'reminders.db', legacy_path: Optional[str] = 'reminders.json', batch_size: int = 10000):
+        self.path = path
+        self.legacy_path = legacy_path
+        self.batch_size = batch_size
+        self._conn: Optional[sqlite3.Connection] = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='sqlite')
+
+    async def open(self) -> None:
+        await self._call(self._open)
+
+    async def flush(self) -> None:
+        started = time.perf_counter()
+        await self._call(lambda: None)
+        PERSISTENCE_WAIT.observe(time.perf_counter() - started, self.backend)
+
+    async def close(self) -> None:
+        if self._conn is not None:
+            await self._call(self._conn.close)
+            self._conn = None
+        self._executor.shutdown(wait=True)
+
+    async def get(self, user_id: int, rem_id: int) -> Optional[Reminder]:
+        rows = await self._query(
+            self._SELECT + " WHERE id = ? AND user_id = ?",
+            (rem_id, user_id)
+        )
+        return self._row_to_reminder(rows[0])[1] if rows else None
+
+    async def list_user(self, user_id: int) -> List[Reminder]:
+        rows = await self._query(
+            self._SELECT + " WHERE user_id = ? ORDER BY due_at",
+            (user_id,)
+        )
+        return [self._row_to_reminder(row)[1] for row in rows]
+
+    async def count_user(self, user_id: int) -> int:
+        rows = await self._query("SELECT COUNT(*) FROM reminders WHERE user_id = ?", (user_id,))
+        return rows[0][0]
+
+    async def page_user(self, user_id: int, cursor: Optional[Tuple[int, int]], limit: int,
+                        backward: bool = False) -> Tuple[List[Reminder], bool, bool]:
+        return await self._call(self._page, user_id, cursor, limit, backward)
+
+    async def add(self, user_id: int, reminder: Reminder) -> None:
+        await self._execute(
+            self._INSERT,
+            [self._reminder_to_row(user_id, reminder)]
+        )
+
+    async def remove_many(self, user_id: int, rem_ids: Iterable[int]) -> int:
+        return await self._execute(
+            "DELETE FROM reminders WHERE id = ? AND user_id = ?",
+            [(rem_id, user_id) for rem_id in rem_ids]
+        )
+
+    async def pending_between(self, after: int, until: int) -> List[Tuple[int, Reminder]]:
+        rows = await self._query(
+            self._SELECT + " WHERE due_at > ? AND due_at <= ? AND status = 'pending'",
+            (after, until)
+        )
+        return [self._row_to_reminder(row) for row in rows]
+
+    async def iter_all(self) -> AsyncIterator[Tuple[int, Reminder]]:
+        last_rowid = 0
+        while True:
+            rows = await self._query(
+                "SELECT user_id, id, due_at, tz, text, type, status, attempts, repeat, rowid FROM reminders "
+                "WHERE rowid > ? ORDER BY rowid LIMIT ?",
+                (last_rowid, self.batch_size)
+            )
+            if not rows:
+                return
+            last_rowid = rows[-1][9]
+            for row in rows:
+                yield self._row_to_reminder(row)
+
+    async def get_timezone(self, user_id: int) -> Optional[str]:
+        rows = await self._query("SELECT tz FROM user_settings WHERE user_id = ?", (user_id,))
+        return rows[0][0] if rows else None
+
+    async def set_timezone(self, user_id: int, tz: str) -> None:
+        await self._execute(
+            "INSERT INTO user_settings (user_id, tz) VALUES (?, ?) "
+            "ON CONFLICT(user_id) DO UPDATE SET tz = excluded.tz",
+            [(user_id, tz)]
+        )
+
+    async def get_language(self, user_id: int) -> Optional[str]:
+        rows = await self._query("SELECT language FROM user_settings WHERE user_id = ?", (user_id,))
+        return rows[0][0] if rows else None
+
+    async def set_language(self, user_id: int, language: str) -> None:
+        await self._execute(
+            "INSERT INTO user_settings (user_id, language) VALUES (?, ?) "
+            "ON CONFLICT(user_id) DO UPDATE SET language = excluded.language",
+            [(user_id, language)]
+        )
+
+    def _page(self, user_id: int, cursor: Optional[Tuple[int, int]], limit: int,
+              backward: bool) -> Tuple[List[Reminder], bool, bool]:
+        rows = []
+        if cursor is not None and backward:
+            rows = self._conn.execute(
+                self._SELECT + " WHERE user_id = ? AND (due_at, id) < (?, ?) ORDER BY due_at DESC, id DESC LIMIT ?",
+                (user_id, cursor[0], cursor[1], limit)
+            ).fetchall()
+            rows.reverse()
+        if len(rows) < limit and backward:
+            # ran into the start of the list: show a full first page, as the memory index does
+            cursor = None
+        if cursor is None:
+            rows = self._conn.execute(
+                self._SELECT + " WHERE user_id = ? ORDER BY due_at, id LIMIT ?", (user_id, limit)
+            ).fetchall()
+        elif not backward:
+            rows = self._conn.execute(
+                self._SELECT + " WHERE user_id = ? AND (due_at, id) > (?, ?) ORDER BY due_at, id LIMIT ?",
+                (user_id, cursor[0], cursor[1], limit)
+            ).fetchall()
+        if not rows:
+            return [], False, False
+        exists = "SELECT 1 FROM reminders WHERE user_id = ? AND (due_at, id) {} (?, ?) LIMIT 1"
+        has_prev = self._conn.execute(exists.format('<'), (user_id, rows[0][2], rows[0][1])).fetchone() is not None
+        has_next = self._conn.execute(exists.format('>'), (user_id, rows[-1][2], rows[-1][1])).fetchone() is not None
+        return [self._row_to_reminder(row)[1] for row in rows], has_prev, has_next
+
+    def _open(self) -> None:
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        columns = {row[1]: row[2] for row in self._conn.execute("PRAGMA table_info(reminders)")}
+        rebuild = bool(columns) and ('time' in columns or columns['id'] != 'INTEGER')
+        if rebuild:
+            # older tables kept text ids and user ids, and a REAL due_at next to the "%d.%m.%Y %H:%M" string
+            self._conn.executescript(
+                """
+                DROP INDEX IF EXISTS reminders_user_due;
+                DROP INDEX IF EXISTS reminders_due;
+                ALTER TABLE reminders RENAME TO reminders_time;
+                """
+            )
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS reminders (
+                id INTEGER PRIMARY KEY,
+                user_id INTEGER NOT NULL,
+                due_at INTEGER NOT NULL,
+                tz TEXT,
+                text TEXT NOT NULL,
+                type TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                repeat TEXT
+            );
+            CREATE INDEX IF NOT EXISTS reminders_user_due ON reminders (user_id, due_at);
+            CREATE INDEX IF NOT EXISTS reminders_due ON reminders (due_at);
+            CREATE TABLE IF NOT EXISTS user_settings (
+                user_id INTEGER PRIMARY KEY,
+                tz TEXT,
+                language TEXT
+            );
+            """
+        )
+        if 'language' not in {row[1] for row in self._conn.execute("PRAGMA table_info(user_settings)")}:
+            self._conn.execute("ALTER TABLE user_settings ADD COLUMN language TEXT")
+        if columns and not rebuild and 'repeat' not in columns:
+            self._conn.execute("ALTER TABLE reminders ADD COLUMN repeat TEXT")
+        if rebuild:
+            tz = 'tz' if 'tz' in columns else 'NULL'
+            status = 'status' if 'status' in columns else "'pending'"
+            attempts = 'attempts' if 'attempts' in columns else '0'
+            with self._conn:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO reminders (id, user_id, due_at, tz, text, type, status, attempts) "
+                    "SELECT CASE WHEN typeof(id) = 'text' THEN CAST(ROUND(CAST(id AS REAL) * 1000000) AS INTEGER) "
+                    "ELSE id END, CAST(user_id AS INTEGER), CAST(due_at AS INTEGER), "
+                    f"{tz}, text, type, {status}, {attempts} FROM reminders_time"
+                )
+                self._conn.execute("DROP TABLE reminders_time")
+        if self.legacy_path is not None and os.path.exists(self.legacy_path):
+            self._migrate_legacy()
+
+    def _migrate_legacy(self) -> None:
+        try:
+            with open(self.legacy_path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except json.JSONDecodeError:
+            state = {}
+        cache: Dict[str, float] = {}
+        rows = []
+        for user_id, user_reminders in state.items():
+            for rem in user_reminders:
+                upgrade_reminder(rem, cache)
+                rows.append(self._reminder_to_row(int(user_id), Reminder.from_dict(rem)))
+        with self._conn:
+            self._conn.executemany(self._INSERT, rows)
+        os.replace(self.legacy_path, self.legacy_path + '.migrated')
+
+    async def _call(self, func: Callable, *args) -> Any:
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    async def _query(self, sql: str, params: tuple) -> List[tuple]:
+        return await self._call(lambda: self._conn.execute(sql, params).fetchall())
+
+    async def _execute(self, sql: str, rows: List[tuple]) -> int:
+        def run():
+            with self._conn:
+                return self._conn.executemany(sql, rows).rowcount
+        started = time.perf_counter()
+        try:
+            return await self._call(run)
+        finally:
+            elapsed = time.perf_counter() - started
+            PERSISTENCE_WAIT.observe(elapsed, self.backend)
+            PERSISTENCE_SECONDS.observe(elapsed, self.backend)
+            PERSISTENCE_RECORDS.observe(len(rows), self.backend)
+
+    @staticmethod
+    def _reminder_to_row(user_id: int, reminder: Reminder) -> tuple:
+        return (
+            reminder.id, user_id, reminder.due, reminder.tz, reminder.text,
+            reminder.type.value, reminder.status, reminder.attempts, reminder.repeat
+        )
+
+    @staticmethod
+    def _row_to_reminder(row: tuple) -> Tuple[int, Reminder]:
+        return row[0], Reminder(row[1], row[2], row[4], ReminderType(row[5]), row[3], row[6], row[7], row[8])
+
+
+def create_storage(backend: str = 'memory', shard: Optional[int] = None) -> Storage:
+    # a shard only sees its own users, so the all-users reminders.json is migrated by a single-process run
+    prefix = 'reminders' if shard is None else f'reminders.shard-{shard}'
+    legacy_path = 'reminders.json' if shard is None else None
+    if backend == 'sqlite':
+        return SQLiteStorage(f'{prefix}.db', legacy_path)
+    if backend == 'memory':
+        return MemoryStorage(ReminderLog(f'{prefix}.log', f'{prefix}.snapshot.json', legacy_path))
+    raise ValueError(f"Unknown storage backend: {backend}")
@@ -0,0 +1,90 @@
+import asyncio
+from datetime import datetime, timezone
+
+import pytest
+
+import set as handlers
+from recurrence import next_occurrence
+from render import get_locale
+from storage import MemoryStorage
+from timezones import get_zone, is_ambiguous, is_skipped, local_to_epoch
+
+# Berlin in 2030: clocks go forward at 02:00 on March 31 and back at 03:00 on October 27
+TZ = 'Europe/Berlin'
+ZONE = get_zone(TZ)
+GAP = datetime(2030, 3, 31, 2, 30)
+OVERLAP = datetime(2030, 10, 27, 2, 30)
+DAILY = "30 2 * * *"
+
+
+def utc(*fields) -> int:
+    return int(datetime(*fields, tzinfo=timezone.utc).timestamp())
+
+
+class RecordingBot:
+    def __init__(self):
+        self.sent = []
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.sent.append(text)
+
+
+@pytest.fixture
+def schedule(monkeypatch):
+    # a log-less store and a scheduler that is never started, so nothing touches disk or fires
+    monkeypatch.setattr(handlers, 'storage', MemoryStorage())
+    monkeypatch.setattr(handlers, 'scheduler', handlers.Scheduler())
+
+    def run(moment: datetime):
+        async def main():
+            bot = RecordingBot()
+            await handlers.storage.set_timezone(1, TZ)
+            assert await handlers.schedule_reminder(bot, 1, moment, 'dst')
+            reminders = await handlers.storage.list_user(1)
+            return reminders[0].due, bot.sent[0]
+        return asyncio.run(main())
+    return run
+
+
+@pytest.mark.parametrize('moment, skipped, ambiguous', [
+    (GAP, True, False),
+    (OVERLAP, False, True),
+    (datetime(2030, 6, 1, 2, 30), False, False),
+], ids=['gap', 'overlap', 'summer'])
+def test_transition_kind(moment, skipped, ambiguous):
+    assert is_skipped(moment, ZONE) is skipped
+    assert is_ambiguous(moment, ZONE) is ambiguous
+
+
+@pytest.mark.parametrize('moment, due', [
+    # the skipped 02:30 moves on by the size of the gap, to 03:30 summer time
+    (GAP, utc(2030, 3, 31, 1, 30)),
+    # the repeated 02:30 resolves to its first, summer-time reading
+    (OVERLAP, utc(2030, 10, 27, 0, 30)),
+], ids=['gap', 'overlap'])
+def test_local_to_epoch(moment, due):
+    assert local_to_epoch(moment, ZONE) == due
+
+
+@pytest.mark.parametrize('moment, due, note', [
+    (GAP, utc(2030, 3, 31, 1, 30), get_locale().skipped_note(time='02:30')),
+    (OVERLAP, utc(2030, 10, 27, 0, 30), get_locale().ambiguous_note(time='02:30')),
+], ids=['gap', 'overlap'])
+def test_schedule_reminder(schedule, moment, due, note):
+    stored, confirmation = schedule(moment)
+    assert stored == due
+    assert note in confirmation
+
+
+@pytest.mark.parametrize('after, due', [
+    # forward: the day of the gap fires at 03:30, the next day is back at 02:30 summer time
+    (utc(2030, 3, 30, 2, 0), utc(2030, 3, 31, 1, 30)),
+    (utc(2030, 3, 31, 1, 30), utc(2030, 4, 1, 0, 30)),
+    # back: the repeated hour fires once, on its first reading, then 02:30 winter time the next day
+    (utc(2030, 10, 26, 1, 0), utc(2030, 10, 27, 0, 30)),
+    (utc(2030, 10, 27, 0, 30), utc(2030, 10, 28, 1, 30)),
+    # from inside the second reading the first one is already past and is not fired again
+    (utc(2030, 10, 27, 1, 0), utc(2030, 10, 28, 1, 30)),
+], ids=['into-gap', 'after-gap', 'into-overlap', 'after-overlap', 'inside-overlap'])
+def test_next_occurrence(after, due):
+    assert next_occurrence(DAILY, after, TZ) == due
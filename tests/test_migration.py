@@ -0,0 +1,29 @@
+import time
+
+import pytest
+
+from storage import format_reminder_time, parse_reminder_time, upgrade_reminder
+
+
+@pytest.fixture
+def server_zone(monkeypatch):
+    # the process runs in a zone other than the bot's default one
+    monkeypatch.setenv('TZ', 'America/New_York')
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+
+@pytest.mark.parametrize('value', ['24.01.2030 09:30', '15.07.2030 23:59'])
+def test_legacy_time_is_read_in_default_zone(server_zone, value):
+    assert format_reminder_time(int(parse_reminder_time(value))) == value
+
+
+def test_upgrade_reminder_shares_hour_cache(server_zone):
+    cache = {}
+    first = {'id': '1893456000.5', 'time': '24.01.2030 09:30', 'text': 'a'}
+    second = {'id': '1893456000.6', 'time': '24.01.2030 09:45', 'text': 'b'}
+    assert upgrade_reminder(first, cache) and upgrade_reminder(second, cache)
+    assert second['due'] - first['due'] == 15 * 60
+    assert format_reminder_time(first['due']) == '24.01.2030 09:30'
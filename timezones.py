@@ -0,0 +1,62 @@
+import os
+from datetime import datetime
+from functools import lru_cache
+from typing import Optional
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+DEFAULT_TIMEZONE = os.getenv('REMINDER_TZ', 'Europe/Moscow')
+
+TIMEZONE_OPTIONS = [
+    ('Калининград (UTC+2)', 'Europe/Kaliningrad'),
+    ('Москва (UTC+3)', 'Europe/Moscow'),
+    ('Самара (UTC+4)', 'Europe/Samara'),
+    ('Екатеринбург (UTC+5)', 'Asia/Yekaterinburg'),
+    ('Омск (UTC+6)', 'Asia/Omsk'),
+    ('Новосибирск (UTC+7)', 'Asia/Novosibirsk'),
+    ('Иркутск (UTC+8)', 'Asia/Irkutsk'),
+    ('Якутск (UTC+9)', 'Asia/Yakutsk'),
+    ('Владивосток (UTC+10)', 'Asia/Vladivostok'),
+    ('Магадан (UTC+11)', 'Asia/Magadan'),
+    ('Камчатка (UTC+12)', 'Asia/Kamchatka'),
+]
+
+
+@lru_cache(maxsize=None)
+def get_zone(name: Optional[str] = None) -> ZoneInfo:
+    # ZoneInfo keeps its own cache too, but this also skips key validation on every render
+    return ZoneInfo(name or DEFAULT_TIMEZONE)
+
+
+def is_valid_zone(name: str) -> bool:
+    if not name:
+        return False
+    try:
+        get_zone(name)
+    except (ZoneInfoNotFoundError, ValueError):
+        return False
+    return True
+
+
+def local_now(zone: ZoneInfo) -> datetime:
+    return datetime.now(zone).replace(tzinfo=None)
+
+
+def local_time(due: int, zone: ZoneInfo) -> datetime:
+    return datetime.fromtimestamp(due, zone).replace(tzinfo=None)
+
+
+def local_to_epoch(moment: datetime, zone: ZoneInfo) -> int:
+    # fold=0 picks the earlier of two ambiguous times when clocks go back, and moves a time
+    # skipped when clocks go forward later by the size of the gap (02:30 becomes 03:30)
+    return int(moment.replace(tzinfo=zone, fold=0).timestamp())
+
+
+def is_skipped(moment: datetime, zone: ZoneInfo) -> bool:
+    return local_time(local_to_epoch(moment, zone), zone) != moment
+
+
+def is_ambiguous(moment: datetime, zone: ZoneInfo) -> bool:
+    return (
+        moment.replace(tzinfo=zone, fold=0).utcoffset() != moment.replace(tzinfo=zone, fold=1).utcoffset()
+        and not is_skipped(moment, zone)
+    )